@@ -1,16 +1,130 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import base64
-import io
+import os
+import tempfile
+import time
 
 # import your functions from scrape_katastar.py
 # make sure scrape_katastar.py is importable (PYTHONPATH or same folder)
-from scrape_katastar import scrape_katastar, write_results_to_excel
+# Only what every deployment needs is imported here; optional parts (browser pool,
+# result cache, adaptive scheduler, search index, queue) are imported in
+# start_backend() when the settings turn them on.
+from output_formats import FORMATS, MEDIA_TYPES, write_results
+from driver_pool import close_default_pool
+from batch import run_jobs, flatten
+from backends import BackendConfigError, SeleniumBackend, get_backend
+from job_manager import JobManager, QueueJobManager, FINISHED
+from metrics import METRICS, log_to
+from coalesce import CoalescingBackend, SingleFlight
 
 app = FastAPI()
 
+# One warm browser pool shared by every request
+MAX_DRIVERS = int(os.environ.get("KATASTAR_MAX_DRIVERS", "2"))
+RECYCLE_AFTER = int(os.environ.get("KATASTAR_RECYCLE_AFTER", "50"))
+# Parallel browsers per request (capped by MAX_DRIVERS) and optional jobs/minute ceiling
+DEFAULT_WORKERS = int(os.environ.get("KATASTAR_WORKERS", str(MAX_DRIVERS)))
+JOBS_PER_MINUTE = float(os.environ.get("KATASTAR_JOBS_PER_MINUTE", "0")) or None
+# "selenium" (default) or "http" for the direct JSON backend
+BACKEND = os.environ.get("KATASTAR_BACKEND", "selenium")
+# SQLite result cache shared by all requests; set KATASTAR_CACHE_PATH="" to disable
+CACHE_PATH = os.environ.get("KATASTAR_CACHE_PATH", "katastar_cache.sqlite3")
+CACHE_TTL_HOURS = float(os.environ.get("KATASTAR_CACHE_TTL_HOURS", "24"))
+# Background tabs per browser for loading right-holder pages in parallel
+HOLDER_TABS = int(os.environ.get("KATASTAR_HOLDER_TABS", "6"))
+# "lean" (block images/fonts/media/analytics, eager loads, persistent disk cache) or "full";
+# the cache directory is KATASTAR_BROWSER_CACHE
+BROWSER_PROFILE = os.environ.get("KATASTAR_BROWSER_PROFILE", "lean")
+# Batches submitted through /jobs that may scrape at the same time; the rest queue
+MAX_BATCHES = int(os.environ.get("KATASTAR_MAX_BATCHES", "2"))
+JOB_RETENTION_HOURS = float(os.environ.get("KATASTAR_JOB_RETENTION_HOURS", "24"))
+# Set KATASTAR_ADAPTIVE=1 to share one adaptive scheduler (AIMD concurrency up to
+# KATASTAR_MAX_DRIVERS, token bucket at KATASTAR_JOBS_PER_MINUTE parcels/minute,
+# circuit breaker) between all requests and batches
+ADAPTIVE = os.environ.get("KATASTAR_ADAPTIVE", "0").lower() in ("1", "true", "yes")
+# Shared work queue (SQLite path or postgresql:// URL): if set, POST /jobs only enqueues
+# and worker.py processes do the scraping; /scrape still runs in-process
+QUEUE = os.environ.get("KATASTAR_QUEUE", "")
+# Local search index every scraped result is added to (GET /search); "" disables it.
+# Batches run by queue workers are indexed by the collecting CLI, not here.
+INDEX_PATH = os.environ.get("KATASTAR_INDEX_PATH", "katastar_index.sqlite3")
+# Identical jobs from concurrent requests share one scrape; finished results answer
+# identical jobs for this many more seconds (0: only share scrapes still in flight)
+COALESCE_TTL = float(os.environ.get("KATASTAR_COALESCE_TTL", "30"))
+# Per-job JSON timing lines (phases, WebDriver commands, retries, cache hits) go here if set
+METRICS_LOG = os.environ.get("KATASTAR_METRICS_LOG", "")
+backend = None
+jobs = None
+scheduler = None
+search = None
+flights = SingleFlight(ttl=COALESCE_TTL)
+
+
+def index_results(job, region_results):
+    if search is not None:
+        search.add(region_results)
+
+
+@app.on_event("startup")
+def start_backend():
+    global backend, jobs, scheduler, search
+    if METRICS_LOG:
+        log_to(METRICS_LOG)
+    if INDEX_PATH:
+        from search_index import SearchIndex
+        search = SearchIndex(INDEX_PATH)
+    if ADAPTIVE:
+        from throttle import AdaptiveScheduler
+        scheduler = AdaptiveScheduler(max_concurrency=MAX_DRIVERS, parcels_per_minute=JOBS_PER_MINUTE)
+    if QUEUE:
+        from work_queue import open_queue
+        jobs = QueueJobManager(open_queue(QUEUE))
+    else:
+        jobs = JobManager(max_batches=MAX_BATCHES, jobs_per_minute=JOBS_PER_MINUTE,
+                          retention=JOB_RETENTION_HOURS * 3600, scheduler=scheduler, on_result=index_results)
+    if BACKEND == "http":
+        backend = get_backend("http", max_connections=MAX_DRIVERS * 4)
+    else:
+        from driver_pool import get_default_pool, get_profile
+        from result_cache import ResultCache
+        cache = ResultCache(CACHE_PATH, ttl=CACHE_TTL_HOURS * 3600) if CACHE_PATH else None
+        backend = get_backend("selenium", pool=get_default_pool(max_drivers=MAX_DRIVERS,
+                                                                max_jobs_per_driver=RECYCLE_AFTER,
+                                                                profile=get_profile(BROWSER_PROFILE)),
+                              cache=cache, holder_tabs=HOLDER_TABS)
+
+
+def backend_for(req: "BatchRequest"):
+    """
+    The shared backend, or a cache-bypassing view of it when the request asks for
+    refresh; either way coalesced with every other request's identical jobs.
+    """
+    if not req.refresh:
+        return CoalescingBackend(backend, flights)
+    if isinstance(backend, SeleniumBackend):
+        return CoalescingBackend(SeleniumBackend(pool=backend.pool, cache=backend.cache, refresh=True,
+                                                 holder_tabs=backend.holder_tabs), flights, use_recent=False)
+    return CoalescingBackend(backend, flights, use_recent=False)
+
+
+def workers_for(req: "BatchRequest") -> int:
+    return max(1, min(req.workers or DEFAULT_WORKERS, MAX_DRIVERS))
+
+
+@app.on_event("shutdown")
+def stop_backend():
+    if jobs is not None:
+        jobs.shutdown()
+    if backend is not None:
+        backend.close()
+    if search is not None:
+        search.close()
+    close_default_pool()
+
+
 # Allow local dev from Next.js
 app.add_middleware(
     CORSMiddleware,
@@ -27,31 +141,153 @@ class Job(BaseModel):
 
 class BatchRequest(BaseModel):
     jobs: List[Job]
+    workers: Optional[int] = None  # defaults to KATASTAR_WORKERS
+    refresh: bool = False  # bypass cached results
+
+# Output files up to this size stay in memory; bigger ones spill to a private temp file
+SPOOL_MAX_BYTES = int(os.environ.get("KATASTAR_SPOOL_MAX_MB", "16")) * 1024 * 1024
+
+
+def check_format(fmt: str) -> str:
+    """Rejects unknown formats (and parquet without pyarrow) before any scraping starts."""
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}.")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet output is not available (pyarrow is not installed).")
+    return fmt
+
+
+def results_response(all_results, fmt: str = "xlsx") -> StreamingResponse:
+    """
+    Streams the file as binary: written once into a per-request spooled file,
+    then sent in chunks (no shared path on disk, no base64 copy).
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        write_results(all_results, spool, fmt)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+
+    def chunks():
+        try:
+            while True:
+                chunk = spool.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            spool.close()
 
-class BatchResponse(BaseModel):
-    filename: str
-    file_b64: str  # base64-encoded xlsx
+    return StreamingResponse(chunks(), media_type=MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="results.{fmt}"'})
 
-@app.post("/scrape", response_model=BatchResponse)
-def scrape_endpoint(req: BatchRequest):
-    all_results = []
-    for j in req.jobs:
-        batch = scrape_katastar(j.region, j.parcel, j.katastar_region)
-        all_results.extend(batch)
 
+@app.post("/scrape")
+def scrape_endpoint(req: BatchRequest, fmt: str = Query("xlsx", alias="format")):
+    """Scrapes the whole batch in this request and returns the file (?format=xlsx|jsonl|csv|parquet)."""
+    check_format(fmt)
+    batch_jobs = [(j.region, j.katastar_region, j.parcel) for j in req.jobs]
+    try:
+        all_results = flatten(run_jobs(batch_jobs, workers=workers_for(req), jobs_per_minute=JOBS_PER_MINUTE,
+                                       backend=backend_for(req), scheduler=scheduler,
+                                       on_result=lambda index, job, region_results: index_results(job, region_results)))
+    except BackendConfigError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    if not all_results:
+        raise HTTPException(status_code=404, detail="No results found.")
+
+    return results_response(all_results, fmt)
+
+
+
+# -----------------------------
+# Background jobs: submit, poll, cancel, download
+# -----------------------------
+class JobSubmitted(BaseModel):
+    id: str
+    status: str
+    total: int
+
+
+def _get_batch(job_id: str):
+    batch = jobs.get(job_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return batch
+
+
+@app.post("/jobs", response_model=JobSubmitted, status_code=202)
+def submit_job(req: BatchRequest):
+    if not req.jobs:
+        raise HTTPException(status_code=400, detail="No jobs given.")
+    batch_jobs = [(j.region, j.katastar_region, j.parcel) for j in req.jobs]
+    batch = jobs.submit(batch_jobs, backend=backend_for(req), workers=workers_for(req))
+    return JobSubmitted(id=batch.id, status=batch.status, total=len(batch.jobs))
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, include_results: bool = True, since: int = 0):
+    """Progress per item; `results` appear on items as soon as they finish."""
+    snapshot = jobs.snapshot(job_id, include_results=include_results, since=max(0, since))
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return snapshot
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    _get_batch(job_id)
+    jobs.cancel(job_id)
+    return jobs.snapshot(job_id, include_results=False)
+
+
+@app.get("/jobs/{job_id}/download")
+def download_job(job_id: str, fmt: str = Query("xlsx", alias="format")):
+    """The results file (?format=xlsx|jsonl|csv|parquet) for a finished (or cancelled, with what completed) job."""
+    check_format(fmt)
+    batch = _get_batch(job_id)
+    if batch.status not in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job is still {batch.status}.")
+    all_results = batch.all_results()
     if not all_results:
         raise HTTPException(status_code=404, detail="No results found.")
+    return results_response(all_results, fmt)
+
 
-    # write to in-memory xlsx
-    buffer = io.BytesIO()
-    # reuse your writer, but it expects a filename; add a variant that accepts a workbook?
-    # simplest: temporarily write to disk, read back, then delete; or patch writer to accept a stream.
-    # Here we quick-patch by writing to disk and reading into memory:
+# -----------------------------
+# Search over everything scraped so far (no portal access)
+# -----------------------------
+@app.get("/search")
+def search_endpoint(q: str = "", municipality: Optional[str] = None, field: Optional[str] = None,
+                    limit: int = Query(50, ge=1, le=1000)):
+    """
+    Holder rows whose name, place, property sheet or municipality contain every word
+    of `q` (Cyrillic or Latin, as prefixes); `municipality` narrows to matching
+    municipalities, `field` (name|place|sheet|municipality) restricts `q` to one column.
+    """
+    if search is None:
+        raise HTTPException(status_code=503, detail="The search index is disabled (KATASTAR_INDEX_PATH is empty).")
+    if not q.strip() and not (municipality or "").strip():
+        raise HTTPException(status_code=400, detail="Give q, municipality, or both.")
+    started = time.perf_counter()
+    try:
+        rows = search.search(q, municipality=municipality, field=field, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"query": q, "municipality": municipality, "count": len(rows),
+            "took_ms": round((time.perf_counter() - started) * 1000, 2), "results": rows}
 
-    temp_filename = "results.xlsx"
-    write_results_to_excel(all_results, temp_filename)
-    with open(temp_filename, "rb") as f:
-        data = f.read()
 
-    file_b64 = base64.b64encode(data).decode("utf-8")
-    return BatchResponse(filename="results.xlsx", file_b64=file_b64)
+# -----------------------------
+# Monitoring
+# -----------------------------
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: phase durations, WebDriver commands, retries, timeouts, cache hits, jobs."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
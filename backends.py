@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pluggable scrape backends.
+
+Every backend turns one (region, katastar_region, parcel) job into the same
+`region_results` list that scrape_katastar() has always returned, so the Excel
+writer and the API do not care which one ran:
+
+    [{"region_name", "parcels": [{...parcel fields..., "Носители на право": [...]}],
+      "input_region", "input_katastar", "input_parcel", ["note"]}, ...]
+
+When the portal does not answer in time a backend raises throttle.PortalTimeoutError
+instead of returning a "not found" note, so batch.py can requeue the parcel. A backend
+that cannot work as configured (e.g. an HTTP route the portal does not have) raises
+BackendConfigError, which stops the batch instead of turning every job into an error entry.
+"""
+from typing import Dict, List, Optional
+
+from driver_pool import DriverPool, get_default_pool
+from result_cache import ResultCache
+from throttle import PortalTimeoutError
+
+
+class BackendConfigError(Exception):
+    """The backend is misconfigured; every job would fail the same way, so none is attempted further."""
+
+
+class ScrapeBackend:
+    """Interface implemented by the Selenium and HTTP backends."""
+
+    name = "base"
+
+    def scrape(self, region: str, parcel: str, katastar_region: Optional[str] = None) -> List[dict]:
+        raise NotImplementedError
+
+    def scrape_group(self, region: str, parcels: List[str],
+                     katastar_region: Optional[str] = None) -> Dict[str, List[dict]]:
+        """
+        Scrapes several parcels of one (region, katastar_region); returns {parcel: region_results}.
+        Backends that can share work between parcels (e.g. one municipality selection) override this.
+        A PortalTimeoutError carries the parcels finished before it in `completed`.
+        """
+        results: Dict[str, List[dict]] = {}
+        for parcel in parcels:
+            try:
+                results[parcel] = self.scrape(region, parcel, katastar_region)
+            except PortalTimeoutError as exc:
+                exc.completed = results
+                raise
+        return results
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SeleniumBackend(ScrapeBackend):
+    """
+    Drives the real portal UI through a pool of headless Chrome drivers,
+    answering from `cache` when possible (unless refresh=True).
+    `holder_tabs` caps the background tabs used to load right-holder pages in parallel.
+    With `snapshots` (refresh.SnapshotStore) only new or changed rows get their holders opened.
+    """
+
+    name = "selenium"
+
+    def __init__(self, pool: Optional[DriverPool] = None, cache: Optional[ResultCache] = None,
+                 refresh: bool = False, holder_tabs: int = 6, snapshots=None):
+        self.pool = pool
+        self.cache = cache
+        self.refresh = refresh
+        self.holder_tabs = holder_tabs
+        self.snapshots = snapshots
+
+    def scrape(self, region: str, parcel: str, katastar_region: Optional[str] = None) -> List[dict]:
+        return self.scrape_group(region, [parcel], katastar_region=katastar_region)[parcel]
+
+    def scrape_group(self, region: str, parcels: List[str],
+                     katastar_region: Optional[str] = None) -> Dict[str, List[dict]]:
+        from scrape_katastar import scrape_region_group
+        return scrape_region_group(region, parcels, katastar_region=katastar_region,
+                                   pool=self.pool or get_default_pool(),
+                                   cache=self.cache, refresh=self.refresh, holder_tabs=self.holder_tabs,
+                                   snapshots=self.snapshots)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+BACKENDS = ("selenium", "http")
+
+
+def get_backend(name: str = "selenium", **kwargs) -> ScrapeBackend:
+    """
+    Builds a backend by name. kwargs go to the backend constructor
+    (e.g. pool= for selenium, base_url= / max_connections= for http).
+    """
+    if name == "selenium":
+        return SeleniumBackend(**kwargs)
+    if name == "http":
+        from http_backend import HttpBackend
+        return HttpBackend(**kwargs)
+    raise ValueError(f"Unknown backend '{name}', expected one of {', '.join(BACKENDS)}")
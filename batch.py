@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Parallel execution of (region, katastar_region, parcel) jobs.
+
+Jobs are first grouped by planner.plan_jobs() so each municipality is selected
+once per group; the groups are independent, so they are spread over a thread
+pool where every worker borrows its own isolated browser from the DriverPool.
+Results are returned in input order so the Excel output looks exactly like a
+sequential run.
+
+run_jobs() plans and returns a whole batch at once; stream_jobs() does the same
+lazily, a window at a time, for inputs too large to hold in memory.
+
+Parcels whose group times out (PortalTimeoutError: the portal was slow or
+throttling) are requeued rather than reported as not found. With a
+throttle.AdaptiveScheduler, group starts also go through its AIMD concurrency
+limit, token bucket and circuit breaker.
+"""
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backends import BackendConfigError, ScrapeBackend, SeleniumBackend
+from driver_pool import DriverPool, get_default_pool
+from metrics import METRICS, count_retry, job_profile
+from planner import RegionGroup, fan_out, plan_jobs
+from scrape_katastar import _region_entry
+from throttle import AdaptiveScheduler, Outcome, PortalTimeoutError
+
+Job = Tuple[str, Optional[str], str]
+
+
+class RateLimiter:
+    """
+    Spaces job starts so that at most `jobs_per_minute` jobs begin in any minute.
+    Shared by all workers; None or 0 disables limiting.
+    """
+
+    def __init__(self, jobs_per_minute: Optional[float] = None):
+        self.interval = 60.0 / jobs_per_minute if jobs_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, jobs: int = 1):
+        """Blocks until `jobs` more job starts fit under the limit."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot) + self.interval * (jobs - 1)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _error_entry(job: Job, exc: Exception) -> dict:
+    region, katastar_region, parcel = job
+    return _region_entry("(error)", region, katastar_region, parcel,
+                         note=f"Scrape failed: {type(exc).__name__}: {exc}")
+
+
+def _timeout_entry(job: Job, attempts: int) -> dict:
+    region, katastar_region, parcel = job
+    return _region_entry("(timeout)", region, katastar_region, parcel,
+                         note=f"The portal did not answer in time ({attempts} attempts); the parcel was not checked.")
+
+
+def run_jobs(jobs: List[Job], workers: int = 1, jobs_per_minute: Optional[float] = None,
+             pool: Optional[DriverPool] = None, backend: Optional[ScrapeBackend] = None,
+             on_result: Optional[Callable[[int, Job, List[dict]], None]] = None,
+             max_parcels_per_group: Optional[int] = 25,
+             cancel: Optional[threading.Event] = None,
+             scheduler: Optional[AdaptiveScheduler] = None,
+             max_requeues: int = 3) -> List[Optional[List[dict]]]:
+    """
+    Scrapes every job with up to `workers` browsers in parallel.
+    `backend` defaults to the Selenium backend on `pool`.
+
+    Jobs sharing (region, katastar_region) run as one group in one browser session
+    (at most `max_parcels_per_group` parcels each) and duplicate jobs are scraped once.
+    Returns one region_results list per job, in the same order as `jobs`.
+    A job that raises is reported as a single entry with a 'note' instead of
+    aborting the whole batch. `on_result(index, job, region_results)` is called
+    from the worker thread as soon as each job finishes.
+    Once `cancel` is set no further groups start; jobs that never ran come back as None.
+    Parcels that time out are requeued (after an exponential backoff, back through
+    `scheduler` when given) up to `max_requeues` times before being reported as '(timeout)'.
+    If the call is interrupted (KeyboardInterrupt, an error), `cancel` is set and it returns
+    only once no worker thread touches the backend or calls on_result any more.
+    """
+    workers = max(1, workers)
+    if backend is None:
+        backend = SeleniumBackend(pool or get_default_pool(max_drivers=workers))
+    cancel = cancel if cancel is not None else threading.Event()
+    limiter = RateLimiter(jobs_per_minute)
+    groups = plan_jobs(jobs, max_parcels_per_group=max_parcels_per_group)
+    group_results: List[Optional[dict]] = [None] * len(groups)
+
+    def run_group(group_index: int):
+        group = groups[group_index]
+        by_parcel = _scrape_group(backend, group, limiter, cancel, scheduler, max_requeues)
+        if by_parcel is None:
+            return
+        group_results[group_index] = by_parcel
+        for index in group.job_indexes:
+            METRICS.inc("katastar_jobs_total", outcome=job_outcome(by_parcel[jobs[index][2]]))
+            if on_result:
+                on_result(index, jobs[index], by_parcel[jobs[index][2]])
+
+    if workers == 1:
+        for group_index in range(len(groups)):
+            run_group(group_index)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="katastar")
+        try:
+            for future in [executor.submit(run_group, i) for i in range(len(groups))]:
+                future.result()
+        except BaseException:
+            _stop(executor, cancel)
+            raise
+        executor.shutdown(wait=True)
+
+    return fan_out(jobs, groups, group_results)
+
+
+def stream_jobs(jobs: Iterable[Job], workers: int = 1, jobs_per_minute: Optional[float] = None,
+                pool: Optional[DriverPool] = None, backend: Optional[ScrapeBackend] = None,
+                max_parcels_per_group: Optional[int] = 25, window: int = 200,
+                max_pending: Optional[int] = None, cancel: Optional[threading.Event] = None,
+                precomputed: Optional[Callable[[Job], Optional[List[dict]]]] = None,
+                scheduler: Optional[AdaptiveScheduler] = None, max_requeues: int = 3,
+                on_result: Optional[Callable[[Job, List[dict]], None]] = None
+                ) -> Iterator[Tuple[Job, List[dict], bool]]:
+    """
+    Lazy, bounded-memory counterpart of run_jobs() for very large inputs.
+
+    `jobs` (any iterable, e.g. a generator over the input file) is read `window`
+    jobs at a time; each window is planned like run_jobs() plans a batch and its
+    groups are queued on the workers. At most `max_pending` jobs (default: four
+    windows) are read but not yet yielded, so when the consumer or the portal is
+    slow, input stops being read ahead and memory stays flat.
+
+    Yields (job, region_results, scraped) in input order, each as soon as it and
+    every job before it are done. Jobs for which `precomputed(job)` returns results
+    (e.g. already in a resume journal) are passed through with scraped=False.
+    Once `cancel` is set no further groups start and the stream ends.
+    `scheduler` and `max_requeues` work as in run_jobs().
+
+    `on_result(job, region_results)` is called from the worker thread as soon as each
+    scraped job finishes, in completion order, i.e. before jobs ahead of it in the input
+    are done. Use it for anything that must not wait for the in-order yield (the
+    resume journal); precomputed jobs are not passed to it.
+
+    If the stream is interrupted or closed early, `cancel` is set and close() (or the
+    exception) returns only once the groups in progress have stopped, so the caller can
+    then close the backend and whatever on_result writes to.
+    """
+    workers = max(1, workers)
+    if backend is None:
+        backend = SeleniumBackend(pool or get_default_pool(max_drivers=workers))
+    cancel = cancel if cancel is not None else threading.Event()
+    limiter = RateLimiter(jobs_per_minute)
+    window = max(1, window)
+    max_pending = max(window, max_pending or window * 4)
+    source = iter(jobs)
+    # (job, Future of its group's {parcel: region_results} or the precomputed results, scraped)
+    pending: deque = deque()
+    exhausted = False
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="katastar")
+
+    def run_group(group: RegionGroup, group_jobs: List[Job]) -> Optional[Dict[str, List[dict]]]:
+        by_parcel = _scrape_group(backend, group, limiter, cancel, scheduler, max_requeues)
+        if by_parcel is not None and on_result is not None:
+            for job in group_jobs:
+                on_result(job, [dict(entry) for entry in by_parcel[job[2]]])
+        return by_parcel
+
+    def queue_window(chunk: List[Job]):
+        ready: Dict[int, List[dict]] = {}
+        todo: List[Job] = []
+        todo_at: Dict[int, int] = {}
+        for i, job in enumerate(chunk):
+            results = precomputed(job) if precomputed else None
+            if results is not None:
+                ready[i] = results
+            else:
+                todo_at[i] = len(todo)
+                todo.append(job)
+        futures: Dict[int, Future] = {}
+        for group in plan_jobs(todo, max_parcels_per_group=max_parcels_per_group):
+            future = executor.submit(run_group, group, [todo[index] for index in group.job_indexes])
+            for index in group.job_indexes:
+                futures[index] = future
+        for i, job in enumerate(chunk):
+            if i in ready:
+                pending.append((job, ready[i], False))
+            else:
+                pending.append((job, futures[todo_at[i]], True))
+
+    try:
+        while True:
+            while not exhausted and len(pending) + window <= max_pending \
+                    and not (cancel is not None and cancel.is_set()):
+                chunk = list(islice(source, window))
+                if not chunk:
+                    exhausted = True
+                    break
+                queue_window(chunk)
+            if not pending:
+                break
+            job, result, scraped = pending.popleft()
+            if scraped:
+                by_parcel = result.result()
+                if by_parcel is None:
+                    break  # cancelled before its group started
+                result = [dict(entry) for entry in by_parcel[job[2]]]
+                METRICS.inc("katastar_jobs_total", outcome=job_outcome(result))
+            yield job, result, scraped
+    except BaseException:
+        # Interrupted (or the consumer stopped early)
+        _stop(executor, cancel)
+        raise
+    executor.shutdown(wait=True)
+
+
+def _stop(executor: ThreadPoolExecutor, cancel: threading.Event):
+    """Drops the queued groups and waits for the running ones, which see `cancel` at their next admission."""
+    cancel.set()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+@contextmanager
+def _admit(limiter: RateLimiter, scheduler: Optional[AdaptiveScheduler], parcels: int,
+           cancel: Optional[threading.Event]):
+    """Scheduler slot if there is a scheduler, else the plain rate limit; yields None if cancelled."""
+    if scheduler is not None:
+        with scheduler.slot(parcels, cancel) as outcome:
+            yield outcome
+        return
+    limiter.wait(parcels)
+    yield None if cancel is not None and cancel.is_set() else Outcome()
+
+
+def _scrape_group(backend: ScrapeBackend, group: RegionGroup, limiter: RateLimiter,
+                  cancel: Optional[threading.Event] = None, scheduler: Optional[AdaptiveScheduler] = None,
+                  max_requeues: int = 3) -> Optional[Dict[str, List[dict]]]:
+    """
+    Scrapes one planned group under the rate limit (or `scheduler`); {parcel: region_results},
+    or None if `cancel` was set before it finished.
+    Parcels left unfinished by a PortalTimeoutError go back through admission, up to
+    `max_requeues` times, before they are reported with a '(timeout)' entry.
+    """
+    results: Dict[str, List[dict]] = {}
+    remaining = list(group.parcels)
+    attempt = 0
+    while remaining:
+        if cancel is not None and cancel.is_set():
+            return None
+        if attempt:
+            # Back off before the requeued parcels go back through admission
+            delay = min(60.0, 2.0 ** attempt) * random.uniform(0.5, 1.0)
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+        with _admit(limiter, scheduler, len(remaining), cancel) as outcome:
+            if outcome is None:
+                return None
+            with job_profile(backend=backend.name, region=group.region, katastar_region=group.katastar_region,
+                             parcels=remaining, attempt=attempt + 1) as profile:
+                commands = profile.command_count()
+                results.update(_scrape_remaining(backend, group, remaining))
+                # No WebDriver command or HTTP request: answered from the cache or by a coalesced scrape
+                portal_work = profile.command_count() > commands
+            timed_out = [parcel for parcel in remaining if parcel not in results]
+            if timed_out:
+                outcome.timeout()
+            else:
+                outcome.ok(portal_work)
+        attempt += 1
+        remaining = timed_out
+        if remaining and attempt > max_requeues:
+            for parcel in remaining:
+                results[parcel] = [_timeout_entry((group.region, group.katastar_region, parcel), attempt)]
+            remaining = []
+        elif remaining:
+            count_retry("requeue")
+            METRICS.inc("katastar_requeued_total", len(remaining))
+    return results
+
+
+def _scrape_remaining(backend: ScrapeBackend, group: RegionGroup, parcels: List[str]) -> Dict[str, List[dict]]:
+    """One attempt at `parcels`; parcels missing from the result timed out."""
+    try:
+        return backend.scrape_group(group.region, parcels, katastar_region=group.katastar_region)
+    except PortalTimeoutError as exc:
+        return exc.completed
+    except BackendConfigError:
+        raise
+    except Exception:
+        # Don't let one bad parcel sink its whole group: retry the parcels one by one
+        count_retry("group")
+        results: Dict[str, List[dict]] = {}
+        for parcel in parcels:
+            try:
+                results[parcel] = backend.scrape(group.region, parcel, katastar_region=group.katastar_region)
+            except PortalTimeoutError:
+                break  # the portal is struggling; requeue this parcel and the rest
+            except BackendConfigError:
+                raise
+            except Exception as exc:
+                results[parcel] = [_error_entry((group.region, group.katastar_region, parcel), exc)]
+        return results
+
+
+def job_outcome(region_results: List[dict]) -> str:
+    """
+    'error' if the scrape failed, 'timeout' if the portal never answered,
+    'not_found' if no entry has parcels, else 'ok'.
+    """
+    if any(entry.get("region_name") == "(error)" for entry in region_results):
+        return "error"
+    if any(entry.get("region_name") == "(timeout)" for entry in region_results):
+        return "timeout"
+    if not any(entry.get("parcels") for entry in region_results):
+        return "not_found"
+    return "ok"
+
+
+def flatten(results: List[Optional[List[dict]]]) -> List[dict]:
+    """Concatenates per-job region_results into the flat list write_results_to_excel expects."""
+    return [entry for region_results in results if region_results for entry in region_results]
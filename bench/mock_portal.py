@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Local mock of e-uslugi.katastar.gov.mk for offline benchmarks.
+
+Serves a small single-page app that reproduces the selectors the scraper relies on:
+  - inputs with placeholder 'Внеси катастарска општина' and 'Внеси парцела'
+  - a MUI-style autocomplete popper (.MuiAutocomplete-popper li[role='option'],
+    .MuiAutocomplete-noOptions), filled after a debounce from XHR calls
+  - the parcels table (tr.parcels-table-body-row, 7 cells)
+  - the right-holders view (#right-holders-table-paper tbody tr, 6 cells),
+    reached by clicking the Имотен лист cell; browser Back returns to the table
+The page's XHRs go to the same JSON routes HttpBackend uses by default, so the
+http backend can be benchmarked against it as well.
+
+Any search text containing MISSING ("missing" by default) returns no suggestions.
+
+    python bench/mock_portal.py --port 8600 --latency 0.2 --rows 20 --holders 5
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.1         # seconds added to every API call
+    jitter: float = 0.0          # +/- uniform random seconds on top of latency
+    suggestions: int = 1         # municipalities offered per region search
+    rows: int = 3                # parcel rows per parcel search
+    holders: int = 2             # right-holders per parcel row
+    holder_links: bool = True    # Имотен лист cell links to /holders/<id> (parallel-tab path)
+    debounce_ms: int = 150       # autocomplete debounce in the page
+    asset_kb: int = 0            # size of a decorative image/font the page loads (page weight)
+    capacity: int = 0            # API calls served at once; more get 429 Too Many Requests (0: unlimited)
+    missing: str = "missing"
+
+
+PAGE = """<!doctype html>
+<html lang="mk">
+<head>
+<meta charset="utf-8">
+<title>Катастар (mock)</title>
+<style>
+  @font-face { font-family: MockFont; src: url('/static/font.woff2'); }
+  body { font-family: MockFont, sans-serif; }
+  .MuiAutocomplete-root { position: relative; display: inline-block; margin: 8px; }
+  .MuiAutocomplete-popper { position: absolute; background: #fff; border: 1px solid #ccc; z-index: 10; }
+  li[role=option] { list-style: none; padding: 4px 8px; cursor: pointer; }
+  .hidden { display: none; }
+</style>
+<script>window.MOCK_CONFIG = __CONFIG__;</script>
+</head>
+<body>
+<div id="search-view">
+  __HERO__
+  <div class="MuiAutocomplete-root" id="region-root">
+    <input placeholder="Внеси катастарска општина" id="region-input" autocomplete="off">
+  </div>
+  <div class="MuiAutocomplete-root" id="parcel-root">
+    <input placeholder="Внеси парцела" id="parcel-input" autocomplete="off">
+  </div>
+  <div id="parcels"></div>
+</div>
+<div id="holders-view" class="hidden"></div>
+<script>
+(function () {
+  var cfg = window.MOCK_CONFIG;
+  var state = {municipalityId: null, parcelId: null};
+
+  function getJSON(url, params, done) {
+    var xhr = new XMLHttpRequest();
+    var qs = Object.keys(params).map(function (k) {
+      return encodeURIComponent(k) + '=' + encodeURIComponent(params[k]);
+    }).join('&');
+    xhr.open('GET', url + '?' + qs);
+    xhr.onload = function () { done(JSON.parse(xhr.responseText)); };
+    xhr.send();
+  }
+
+  function closePopper(root) {
+    var old = root.querySelector('.MuiAutocomplete-popper');
+    if (old) { old.parentNode.removeChild(old); }
+  }
+
+  function showPopper(root, options, label, onPick) {
+    closePopper(root);
+    var popper = document.createElement('div');
+    popper.className = 'MuiAutocomplete-popper';
+    if (!options.length) {
+      var none = document.createElement('div');
+      none.className = 'MuiAutocomplete-noOptions';
+      none.textContent = 'No options';
+      popper.appendChild(none);
+    } else {
+      var list = document.createElement('ul');
+      list.setAttribute('role', 'listbox');
+      options.forEach(function (opt) {
+        var li = document.createElement('li');
+        li.setAttribute('role', 'option');
+        li.textContent = label(opt);
+        li.addEventListener('click', function () { closePopper(root); onPick(opt); });
+        list.appendChild(li);
+      });
+      popper.appendChild(list);
+    }
+    root.appendChild(popper);
+  }
+
+  function autocomplete(input, root, fetchOptions, label, onPick) {
+    var timer = null;
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      closePopper(root);
+      var text = input.value;
+      if (!text) { return; }
+      timer = setTimeout(function () {
+        fetchOptions(text, function (options) {
+          if (input.value === text) { showPopper(root, options, label, onPick); }
+        });
+      }, cfg.debounce_ms);
+    });
+  }
+
+  var regionInput = document.getElementById('region-input');
+  var parcelInput = document.getElementById('parcel-input');
+
+  autocomplete(regionInput, document.getElementById('region-root'),
+    function (text, done) { getJSON('/api/cadastral-municipalities', {search: text}, done); },
+    function (m) { return m.name; },
+    function (m) { regionInput.value = m.name; state.municipalityId = m.id; });
+
+  autocomplete(parcelInput, document.getElementById('parcel-root'),
+    function (text, done) {
+      if (state.municipalityId === null) { return done([]); }
+      getJSON('/api/parcels/suggestions', {municipalityId: state.municipalityId, search: text}, done);
+    },
+    function (p) { return p.number; },
+    function (p) {
+      parcelInput.value = p.number;
+      state.parcelId = p.id;
+      loadParcels();
+    });
+
+  function cell(text) {
+    var td = document.createElement('td');
+    td.textContent = text;
+    return td;
+  }
+
+  function loadParcels() {
+    getJSON('/api/parcels', {municipalityId: state.municipalityId, parcelId: state.parcelId}, function (rows) {
+      var table = document.createElement('table');
+      var body = document.createElement('tbody');
+      rows.forEach(function (row, i) {
+        var tr = document.createElement('tr');
+        tr.className = 'parcels-table-body-row';
+        tr.appendChild(cell(String(i + 1)));
+        var sheet = document.createElement('td');
+        if (cfg.holder_links) {
+          var a = document.createElement('a');
+          a.href = '/holders/' + encodeURIComponent(row.id);
+          a.textContent = row.propertySheet;
+          sheet.appendChild(a);
+        } else {
+          sheet.textContent = row.propertySheet;
+        }
+        sheet.addEventListener('click', function (ev) {
+          ev.preventDefault();
+          history.pushState({holders: row.id}, '', '/holders/' + encodeURIComponent(row.id));
+          showHolders(row.id);
+        });
+        tr.appendChild(sheet);
+        ['parcelNumber', 'culture', 'area', 'place', 'right'].forEach(function (k) { tr.appendChild(cell(row[k])); });
+        body.appendChild(tr);
+      });
+      table.appendChild(body);
+      var target = document.getElementById('parcels');
+      target.innerHTML = '';
+      target.appendChild(table);
+    });
+  }
+
+  function showHolders(rowId) {
+    document.getElementById('search-view').className = 'hidden';
+    var view = document.getElementById('holders-view');
+    view.className = '';
+    view.innerHTML = '';
+    getJSON('/api/right-holders', {parcelRowId: rowId}, function (holders) {
+      var paper = document.createElement('div');
+      paper.id = 'right-holders-table-paper';
+      var table = document.createElement('table');
+      var body = document.createElement('tbody');
+      holders.forEach(function (h) {
+        var tr = document.createElement('tr');
+        ['propertySheet', 'fullName', 'city', 'street', 'streetNumber', 'share'].forEach(function (k) {
+          tr.appendChild(cell(h[k]));
+        });
+        body.appendChild(tr);
+      });
+      table.appendChild(body);
+      paper.appendChild(table);
+      view.appendChild(paper);
+    });
+  }
+
+  function showSearch() {
+    document.getElementById('holders-view').className = 'hidden';
+    document.getElementById('search-view').className = '';
+    document.getElementById('parcels').innerHTML = '';
+    if (state.parcelId !== null) { loadParcels(); }
+  }
+
+  window.addEventListener('popstate', function () {
+    var m = location.pathname.match(/^\\/holders\\/(.+)$/);
+    if (m) { showHolders(decodeURIComponent(m[1])); } else { showSearch(); }
+  });
+
+  var deep = location.pathname.match(/^\\/holders\\/(.+)$/);
+  if (deep) { showHolders(decodeURIComponent(deep[1])); }
+})();
+</script>
+</body>
+</html>
+"""
+
+
+class MockPortal:
+    """Deterministic fake data behind the page's XHR routes."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def admit(self) -> bool:
+        """Takes an API slot, or counts a 429 when `capacity` calls are already in flight."""
+        with self._lock:
+            if self.config.capacity and self.in_flight >= self.config.capacity:
+                self.throttled += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _sleep(self):
+        c = self.config
+        delay = c.latency + (random.uniform(-c.jitter, c.jitter) if c.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def api(self, path: str, query: dict) -> Optional[list]:
+        with self._lock:
+            self.requests += 1
+        c = self.config
+        q = {k: v[0] for k, v in query.items()}
+        if path == "/api/cadastral-municipalities":
+            search = q.get("search", "")
+            if not search or c.missing in search.lower():
+                return self._respond([])
+            return self._respond([{"id": f"{search}#{i}", "name": f"{search.upper()} {i + 1} - СКОПЈЕ"}
+                                  for i in range(c.suggestions)])
+        if path == "/api/parcels/suggestions":
+            search = q.get("search", "")
+            if not search or c.missing in search.lower():
+                return self._respond([])
+            return self._respond([{"id": f"{q.get('municipalityId')}|{search}", "number": search}])
+        if path == "/api/parcels":
+            parcel_id = q.get("parcelId", "")
+            number = parcel_id.split("|")[-1]
+            return self._respond([{
+                "id": f"{parcel_id}|{r}",
+                "propertySheet": str(1000 + r),
+                "parcelNumber": f"{number}/{r + 1}",
+                "culture": "нива",
+                "area": str(100 * (r + 1)),
+                "place": "Место",
+                "right": "сопственост",
+            } for r in range(c.rows)])
+        if path == "/api/right-holders":
+            row_id = q.get("parcelRowId", "")
+            sheet = str(1000 + int(row_id.rsplit("|", 1)[-1] or 0)) if row_id else ""
+            return self._respond([{
+                "propertySheet": sheet,
+                "fullName": f"Сопственик {h + 1}",
+                "city": "Скопје",
+                "street": "Улица",
+                "streetNumber": str(h + 1),
+                "share": f"1/{c.holders}",
+            } for h in range(c.holders)])
+        return None
+
+    def _respond(self, data: list) -> list:
+        self._sleep()
+        return data
+
+    def page(self) -> bytes:
+        c = self.config
+        hero = '<img src="/static/hero.png" alt="">' if c.asset_kb else ""
+        cfg = json.dumps({"holder_links": c.holder_links, "debounce_ms": c.debounce_ms})
+        return PAGE.replace("__CONFIG__", cfg).replace("__HERO__", hero).encode("utf-8")
+
+
+def make_handler(portal: MockPortal):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Send headers and body in one segment; otherwise Nagle + delayed ACKs add ~40 ms per keep-alive request
+        wbufsize = 64 * 1024
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path.startswith("/api/"):
+                if not portal.admit():
+                    return self._send(429, "application/json", b"[]")
+                try:
+                    data = portal.api(parts.path, parse_qs(parts.query))
+                finally:
+                    portal.release()
+                if data is None:
+                    return self._send(404, "application/json", b"[]")
+                return self._send(200, "application/json; charset=utf-8",
+                                  json.dumps(data, ensure_ascii=False).encode("utf-8"))
+            if parts.path.startswith("/static/"):
+                kind = "image/png" if parts.path.endswith(".png") else "font/woff2"
+                return self._send(200, kind, b"\0" * (portal.config.asset_kb * 1024),
+                                  cache="public, max-age=86400")
+            # Every other path (/, /holders/<id>) is the single-page app
+            return self._send(200, "text/html; charset=utf-8", portal.page())
+
+        def _send(self, status: int, content_type: str, body: bytes, cache: str = "no-store"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", cache)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_mock_portal(config: Optional[MockConfig] = None, host: str = "127.0.0.1",
+                      port: int = 0) -> Tuple[ThreadingHTTPServer, MockPortal, str]:
+    """Runs the mock in a daemon thread. Returns (server, portal, base_url ending in '/')."""
+    portal = MockPortal(config or MockConfig())
+    server = ThreadingHTTPServer((host, port), make_handler(portal))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, portal, f"http://{host}:{server.server_address[1]}/"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local mock of the cadastre portal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds added to every API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds on top of --latency")
+    parser.add_argument("--suggestions", type=int, default=1, help="Municipalities per region search")
+    parser.add_argument("--rows", type=int, default=3, help="Parcel rows per parcel")
+    parser.add_argument("--holders", type=int, default=2, help="Right-holders per parcel row")
+    parser.add_argument("--no-holder-links", action="store_true",
+                        help="Render the Имотен лист cell without a link (click-only navigation)")
+    parser.add_argument("--asset-kb", type=int, default=0, help="Size of the decorative image/font the page loads")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="API calls served at once before answering 429 (default: unlimited)")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, suggestions=args.suggestions,
+                        rows=args.rows, holders=args.holders, holder_links=not args.no_holder_links,
+                        asset_kb=args.asset_kb, capacity=args.capacity)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockPortal(config)))
+    print(f"Mock portal on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
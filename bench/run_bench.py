@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks against bench/mock_portal.py.
+
+Scenarios:
+  - scrape: the Selenium backend in-process (needs Chrome), timed per phase
+            (driver acquire, region autocomplete, parcel select, table + holders extract)
+  - http:   the HttpBackend in-process, timed per portal call
+  - cli:    scrape_katastar.py as a subprocess on a generated input file
+  - api:    uvicorn api.main:app as a subprocess, one POST /scrape per job
+  - excel:  write_results_to_excel on synthetic results
+  - pageload: home page loads with the full vs the lean browser profile (needs Chrome):
+            load time, requests and bytes transferred per load
+  - throttle: the HttpBackend against a mock that answers 429 beyond --capacity concurrent
+            calls, with a fixed worker count vs the adaptive scheduler: throughput, 429s,
+            requeued parcels and jobs that still timed out
+  - startup: cold starts as fresh processes (importing the CLI, the API app and the
+            worker, --help, a search on the local index, chromedriver resolution from
+            its cache), plus which heavy modules each import pulled in
+
+Every scenario reports jobs/min (rows/min for excel), p50/p95 latency per phase and
+the peak RSS of the process tree doing the work (browsers included).
+
+    python bench/run_bench.py http cli --jobs 40 --latency 0.05 --json after.json
+    python bench/run_bench.py http --jobs 40 --compare before.json   # exit 1 on a >20% regression
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_portal import MockConfig, start_mock_portal  # noqa: E402
+
+Job = Tuple[str, Optional[str], str]
+
+REGIONS = ["Центар", "Аеродром", "Карпош", "Кисела Вода", "Бутел", "Гази Баба"]
+SCENARIOS = ("scrape", "http", "cli", "api", "excel", "pageload", "throttle", "startup")
+# Modules the startup scenario reports if a plain import pulls them in
+HEAVY_MODULES = ("selenium", "webdriver_manager", "openpyxl", "requests", "pandas", "pyarrow", "psycopg")
+
+
+# -----------------------------
+# Measurement helpers
+# -----------------------------
+class PhaseTimer:
+    """Thread-safe latency samples per phase."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self.samples[phase].append(seconds)
+
+    @contextmanager
+    def time(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started)
+
+    def wrap(self, phase: str, func):
+        def timed(*args, **kwargs):
+            with self.time(phase):
+                return func(*args, **kwargs)
+        return timed
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {phase: {"count": len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+                    for phase, values in sorted(self.samples.items())}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(round(q * (len(ordered) - 1)))] if ordered else 0.0
+
+
+def _children(pid: int) -> List[int]:
+    kids = []
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            kids = [int(p) for p in f.read().split()]
+    except (OSError, ValueError):
+        pass
+    return kids
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class RssSampler:
+    """
+    Samples the summed RSS of `pid` and all its descendants (chromedriver, Chrome)
+    every `interval` seconds and keeps the peak. Linux /proc only; elsewhere it
+    falls back to getrusage(), which only sees this process and waited-for children.
+    """
+
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.1):
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _tree_rss(self) -> int:
+        total, todo, seen = 0, [self.pid], set()
+        while todo:
+            pid = todo.pop()
+            if pid in seen:
+                continue
+            seen.add(pid)
+            total += _rss_kb(pid)
+            todo.extend(_children(pid))
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, self._tree_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak_kb:
+            import resource
+            usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            self.peak_kb = usage // 1024 if sys.platform == "darwin" else usage
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak_kb / 1024
+
+
+def make_jobs(count: int, missing_every: int = 0, regions_count: int = 3, seed: int = 1) -> List[Job]:
+    """Deterministic jobs spread over a few regions; every `missing_every`-th parcel does not exist."""
+    rng = random.Random(seed)
+    regions = REGIONS[:max(1, regions_count)]
+    jobs = []
+    for i in range(count):
+        parcel = f"missing-{i}" if missing_every and (i + 1) % missing_every == 0 else str(1000 + rng.randrange(9000))
+        jobs.append((regions[i % len(regions)], "Скопје", parcel))
+    return jobs
+
+
+def _report(name: str, units: int, seconds: float, timer: PhaseTimer, rss: RssSampler, unit: str = "jobs") -> dict:
+    return {
+        "scenario": name,
+        unit: units,
+        "seconds": round(seconds, 3),
+        f"{unit}_per_min": round(units / seconds * 60, 1) if seconds else 0.0,
+        "phases": timer.summary(),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+def _env(base_url: str, **extra) -> dict:
+    env = dict(os.environ)
+    env["KATASTAR_PORTAL_URL"] = base_url
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.update({k: str(v) for k, v in extra.items()})
+    return env
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+def bench_http(args, base_url: str) -> dict:
+    from http_backend import HttpBackend
+    from batch import run_jobs
+
+    jobs = make_jobs(args.jobs, args.missing_every, args.regions)
+    timer = PhaseTimer()
+    backend = HttpBackend(base_url=base_url)
+    for method, phase in (("region_suggestions", "region"), ("parcel_rows", "parcel"), ("holders", "holders"),
+                          ("scrape_group", "group")):
+        setattr(backend, method, timer.wrap(phase, getattr(backend, method)))
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        try:
+            run_jobs(jobs, workers=args.workers, backend=backend)
+        finally:
+            backend.close()
+        seconds = time.perf_counter() - started
+    return _report("http", len(jobs), seconds, timer, rss)
+
+
+def bench_scrape(args, base_url: str) -> dict:
+    # The pool's home_url, not driver_pool.PORTAL_URL (fixed by whichever scenario imported it first),
+    # is where every driver starts and where go_home() returns
+    import scrape_katastar
+    from backends import SeleniumBackend
+    from batch import run_jobs
+    from driver_pool import DriverPool, get_profile
+
+    jobs = make_jobs(args.jobs, args.missing_every, args.regions)
+    timer = PhaseTimer()
+    for name, phase in (("get_region_suggestions", "region"), ("select_parcel_status", "parcel"),
+                        ("extract_parcel_and_holders", "extract")):
+        setattr(scrape_katastar, name, timer.wrap(phase, getattr(scrape_katastar, name)))
+
+    with RssSampler() as rss:
+        with timer.time("startup"):
+            pool = DriverPool(max_drivers=args.workers, home_url=base_url, profile=get_profile(args.browser_profile))
+        pool.acquire = timer.wrap("acquire", pool.acquire)
+        backend = SeleniumBackend(pool=pool, holder_tabs=args.holder_tabs)
+        backend.scrape_group = timer.wrap("group", backend.scrape_group)
+        started = time.perf_counter()
+        try:
+            run_jobs(jobs, workers=args.workers, backend=backend)
+        finally:
+            backend.close()
+            pool.close()
+        seconds = time.perf_counter() - started
+    return _report("scrape", len(jobs), seconds, timer, rss)
+
+
+def bench_cli(args, base_url: str) -> dict:
+    jobs = make_jobs(args.jobs, args.missing_every, args.regions)
+    timer = PhaseTimer()
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "jobs.txt")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{r},{k},{p}\n" for r, k, p in jobs)
+        cmd = [sys.executable, os.path.join(REPO_ROOT, "scrape_katastar.py"), "-i", input_path,
+               "--no-cache", "--workers", str(args.workers), "--backend", args.cli_backend,
+               "--holder-tabs", str(args.holder_tabs), "--browser-profile", args.browser_profile]
+        if args.cli_backend == "http":
+            cmd += ["--http-base-url", base_url]
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=tmp, env=_env(base_url), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        with RssSampler(proc.pid) as rss:
+            output, _ = proc.communicate()
+        seconds = time.perf_counter() - started
+        timer.record("run", seconds)
+        if proc.returncode != 0:
+            raise RuntimeError(f"CLI exited with {proc.returncode}:\n{output.decode('utf-8', 'replace')}")
+    return _report(f"cli[{args.cli_backend}]", len(jobs), seconds, timer, rss)
+
+
+def _wait_for_port(url: str, timeout: float = 60.0):
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"API did not come up at {url}")
+
+
+def bench_api(args, base_url: str) -> dict:
+    import requests
+
+    jobs = make_jobs(args.jobs, args.missing_every, args.regions)
+    timer = PhaseTimer()
+    port = args.api_port
+    env = _env(base_url, KATASTAR_BACKEND=args.cli_backend, KATASTAR_HTTP_BASE_URL=base_url,
+               KATASTAR_CACHE_PATH="", KATASTAR_MAX_DRIVERS=args.workers, KATASTAR_WORKERS=1,
+               KATASTAR_HOLDER_TABS=args.holder_tabs, KATASTAR_BROWSER_PROFILE=args.browser_profile)
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port),
+                             "--log-level", "warning"],
+                            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with RssSampler(proc.pid) as rss:
+        try:
+            _wait_for_port(f"http://127.0.0.1:{port}/docs")
+            timer.record("startup", time.perf_counter() - started)
+
+            def post(job: Job):
+                region, katastar_region, parcel = job
+                body = {"jobs": [{"region": region, "katastar_region": katastar_region, "parcel": parcel}]}
+                with timer.time("request"):
+                    resp = requests.post(f"http://127.0.0.1:{port}/scrape", json=body, timeout=300)
+                if resp.status_code not in (200, 404):
+                    raise RuntimeError(f"/scrape returned {resp.status_code}: {resp.text[:200]}")
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                list(executor.map(post, jobs))
+            seconds = time.perf_counter() - started
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return _report(f"api[{args.cli_backend}]", len(jobs), seconds, timer, rss)
+
+
+def synthetic_results(entries: int, rows: int, holders: int) -> List[dict]:
+    return [{
+        "region_name": f"РЕГИОН {e % 7} - СКОПЈЕ",
+        "input_region": "Центар",
+        "input_katastar": "Скопје",
+        "input_parcel": str(1000 + e),
+        "parcels": [{
+            "Имотен лист": str(2000 + r), "Број/дел": f"{1000 + e}/{r}", "Култура": "нива",
+            "Површина m2": str(100 * r), "Место": "Место", "Право": "сопственост",
+            "Носители на право": [{
+                "Имотен лист": str(2000 + r), "Име и презиме": f"Сопственик {h}", "Град": "Скопје",
+                "Улица": "Улица", "Број": str(h), "Дел на посед": f"1/{holders}",
+            } for h in range(holders)],
+        } for r in range(rows)],
+    } for e in range(entries)]
+
+
+def bench_excel(args, base_url: Optional[str] = None) -> dict:
+    from scrape_katastar import write_results_to_excel
+
+    timer = PhaseTimer()
+    with timer.time("build"):
+        results = synthetic_results(args.excel_entries, args.rows, args.holders)
+    rows = sum(1 + len(e["parcels"]) + sum(len(p["Носители на право"]) for p in e["parcels"]) for e in results)
+    with tempfile.TemporaryDirectory() as tmp, RssSampler() as rss:
+        started = time.perf_counter()
+        with timer.time("write"):
+            write_results_to_excel(results, os.path.join(tmp, "results.xlsx"))
+        seconds = time.perf_counter() - started
+    return _report("excel", rows, seconds, timer, rss, unit="rows")
+
+
+def bench_pageload(args, base_url: str) -> List[dict]:
+    from dataclasses import replace
+    from driver_pool import FULL_PROFILE, LEAN_PROFILE, create_driver, page_weight
+
+    reports = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for profile in (FULL_PROFILE, replace(LEAN_PROFILE, cache_dir=cache_dir)):
+            timer = PhaseTimer()
+            requests_total = bytes_total = 0
+            with RssSampler() as rss:
+                with timer.time("startup"):
+                    driver = create_driver(profile=profile)
+                try:
+                    started = time.perf_counter()
+                    for _ in range(args.page_loads):
+                        with timer.time("load"):
+                            driver.get(base_url)
+                        weight = page_weight(driver)
+                        requests_total += weight["requests"]
+                        bytes_total += weight["bytes"]
+                    seconds = time.perf_counter() - started
+                finally:
+                    driver.quit()
+            report = _report(f"pageload[{profile.name}]", args.page_loads, seconds, timer, rss, unit="loads")
+            report["requests_per_load"] = round(requests_total / args.page_loads, 1)
+            report["kb_per_load"] = round(bytes_total / args.page_loads / 1024, 1)
+            reports.append(report)
+    full, lean = reports
+    print(f"\nlean vs full: {full['kb_per_load'] - lean['kb_per_load']:.1f} KB and "
+          f"{(full['phases']['load']['p50'] - lean['phases']['load']['p50']) * 1000:.0f} ms (p50) saved per page load")
+    return reports
+
+
+def bench_throttle(args, base_url: Optional[str] = None) -> List[dict]:
+    from batch import job_outcome, run_jobs
+    from http_backend import HttpBackend
+    from metrics import METRICS
+    from throttle import AdaptiveScheduler
+
+    jobs = make_jobs(args.jobs, args.missing_every, args.regions)
+    reports = []
+    for mode in ("fixed", "adaptive"):
+        # A mock of its own, so its 429 counter only covers this run
+        config = MockConfig(latency=args.latency, jitter=args.jitter, rows=args.rows, holders=args.holders,
+                            capacity=args.capacity)
+        server, portal, url = start_mock_portal(config)
+        timer = PhaseTimer()
+        backend = HttpBackend(base_url=url, max_connections=2)
+        backend.scrape_group = timer.wrap("group", backend.scrape_group)
+        scheduler = AdaptiveScheduler(max_concurrency=args.workers, reset_timeout=2.0) \
+            if mode == "adaptive" else None
+        METRICS.reset()
+        try:
+            with RssSampler() as rss:
+                started = time.perf_counter()
+                results = run_jobs(jobs, workers=args.workers, backend=backend, scheduler=scheduler,
+                                   max_parcels_per_group=5)
+                seconds = time.perf_counter() - started
+        finally:
+            backend.close()
+            server.shutdown()
+            server.server_close()
+        report = _report(f"throttle[{mode}]", len(jobs), seconds, timer, rss)
+        report["throttled_429"] = portal.throttled
+        report["requeued"] = int(sum(METRICS.summary()["counters"].get("katastar_requeued_total", {}).values()))
+        report["timed_out_jobs"] = sum(job_outcome(r) == "timeout" for r in results)
+        reports.append(report)
+    return reports
+
+
+def bench_startup(args, base_url: Optional[str] = None) -> dict:
+    imports = "import sys; {}; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    with tempfile.TemporaryDirectory() as tmp:
+        # A cached resolution pointing at any executable: measures the offline path, no download
+        driver_cache = os.path.join(tmp, "chromedriver.json")
+        with open(driver_cache, "w", encoding="utf-8") as f:
+            json.dump({"path": sys.executable, "version": None}, f)
+        commands = {
+            "import_cli": [sys.executable, "-c", imports.format("import scrape_katastar")],
+            "import_api": [sys.executable, "-c", imports.format("sys.path.insert(0, 'api'); import main")],
+            "import_worker": [sys.executable, "-c", imports.format("import worker")],
+            "cli_help": [sys.executable, "scrape_katastar.py", "--help"],
+            "cli_search": [sys.executable, "scrape_katastar.py", "search", "Петровски",
+                           "--index", os.path.join(tmp, "index.sqlite3")],
+            "driver_resolve": [sys.executable, "-c", "import driver_pool; driver_pool.resolve_chromedriver()"],
+        }
+        env = _env(base_url or "", KATASTAR_DRIVER_CACHE=driver_cache, CHROMEDRIVER_PATH="", CHROMEDRIVER_VERSION="")
+        timer = PhaseTimer()
+        heavy = {}
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            for _ in range(args.startup_runs):
+                for name, cmd in commands.items():
+                    with timer.time(name):
+                        proc = subprocess.run(cmd, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+                    if proc.returncode != 0:
+                        raise RuntimeError(f"{name} failed: {proc.stderr.strip()[-500:]}")
+                    if name.startswith("import_"):
+                        last_line = (proc.stdout.strip().splitlines() or [""])[-1]
+                        heavy[name] = [m for m in last_line.split(",") if m]
+            seconds = time.perf_counter() - started
+    report = _report("startup", args.startup_runs * len(commands), seconds, timer, rss, unit="starts")
+    report["heavy_modules"] = heavy
+    return report
+
+
+BENCHES = {"scrape": bench_scrape, "http": bench_http, "cli": bench_cli, "api": bench_api, "excel": bench_excel,
+           "pageload": bench_pageload, "throttle": bench_throttle, "startup": bench_startup}
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def print_report(report: dict):
+    rate_key = next(k for k in report if k.endswith("_per_min"))
+    print(f"\n== {report['scenario']}: {report[rate_key]} {rate_key.replace('_', ' ')}, "
+          f"{report['seconds']} s, peak RSS {report['peak_rss_mb']} MB")
+    if "kb_per_load" in report:
+        print(f"   {report['requests_per_load']} requests, {report['kb_per_load']} KB per load")
+    if "throttled_429" in report:
+        print(f"   {report['throttled_429']} x 429, {report['requeued']} parcels requeued, "
+              f"{report['timed_out_jobs']} jobs timed out")
+    for name, modules in report.get("heavy_modules", {}).items():
+        print(f"   {name} loads: {', '.join(modules) or 'no heavy modules'}")
+    for phase, stats in report["phases"].items():
+        print(f"   {phase:<14} n={stats['count']:<5} p50={stats['p50'] * 1000:9.1f} ms  p95={stats['p95'] * 1000:9.1f} ms")
+
+
+def compare(reports: List[dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (0.2 = 20%) in throughput, p95 latency or peak RSS."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["scenario"]: r for r in json.load(f)}
+    problems = []
+    for report in reports:
+        old = baseline.get(report["scenario"])
+        if old is None:
+            continue
+        rate_key = next(k for k in report if k.endswith("_per_min"))
+        if old.get(rate_key) and report[rate_key] < old[rate_key] * (1 - tolerance):
+            problems.append(f"{report['scenario']}: {rate_key} {old[rate_key]} -> {report[rate_key]}")
+        if old.get("peak_rss_mb") and report["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            problems.append(f"{report['scenario']}: peak RSS {old['peak_rss_mb']} -> {report['peak_rss_mb']} MB")
+        for phase, stats in report["phases"].items():
+            old_p95 = old.get("phases", {}).get(phase, {}).get("p95")
+            if old_p95 and stats["p95"] > old_p95 * (1 + tolerance):
+                problems.append(f"{report['scenario']}: {phase} p95 {old_p95 * 1000:.1f} -> {stats['p95'] * 1000:.1f} ms")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scraper benchmarks against a local mock portal")
+    parser.add_argument("scenarios", nargs="*", choices=SCENARIOS, default=["http", "excel"],
+                        help="What to run (default: http excel; scrape/cli/api[selenium] need Chrome)")
+    parser.add_argument("--jobs", type=int, default=30, help="Input items per scenario")
+    parser.add_argument("--workers", type=int, default=2, help="Parallel workers / browsers / API clients")
+    parser.add_argument("--regions", type=int, default=3, help="Distinct regions the jobs are spread over")
+    parser.add_argument("--missing-every", type=int, default=10,
+                        help="Every Nth parcel does not exist (0 = none)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock portal seconds per API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Mock portal +/- random seconds")
+    parser.add_argument("--rows", type=int, default=3, help="Parcel rows per parcel")
+    parser.add_argument("--holders", type=int, default=2, help="Right-holders per row")
+    parser.add_argument("--suggestions", type=int, default=1, help="Region suggestions per search")
+    parser.add_argument("--no-holder-links", action="store_true", help="Mock without links to holder pages")
+    parser.add_argument("--holder-tabs", type=int, default=6, help="Passed to the Selenium backend")
+    parser.add_argument("--browser-profile", choices=["lean", "full"], default="lean",
+                        help="Browser profile for the scrape scenario")
+    parser.add_argument("--asset-kb", type=int, default=200,
+                        help="Size of the image and font the mock page loads (page weight)")
+    parser.add_argument("--page-loads", type=int, default=20, help="Loads per profile in the pageload scenario")
+    parser.add_argument("--cli-backend", choices=["selenium", "http"], default="http",
+                        help="Backend for the cli and api scenarios (default: http)")
+    parser.add_argument("--capacity", type=int, default=3,
+                        help="Concurrent API calls the mock serves in the throttle scenario before answering 429")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--startup-runs", type=int, default=5, help="Cold starts per command in the startup scenario")
+    parser.add_argument("--excel-entries", type=int, default=2000, help="Region entries in the excel scenario")
+    parser.add_argument("--json", default=None, help="Write the reports to this JSON file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs --compare (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, suggestions=args.suggestions,
+                        rows=args.rows, holders=args.holders, holder_links=not args.no_holder_links,
+                        asset_kb=args.asset_kb)
+    server, portal, base_url = start_mock_portal(config)
+    reports = []
+    try:
+        for name in args.scenarios:
+            result = BENCHES[name](args, base_url)
+            for report in result if isinstance(result, list) else [result]:
+                report["portal_requests"] = portal.requests
+                portal.requests = 0
+                print_report(report)
+                reports.append(report)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        problems = compare(reports, args.compare, args.tolerance)
+        for line in problems:
+            print(f"REGRESSION {line}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Single-flight request coalescing for the API.
+
+Users often submit overlapping batches. Wrapped in a CoalescingBackend, every
+(region, katastar_region, parcel) is scraped at most once at a time: a caller
+asking for a parcel that another caller is already scraping waits for that scrape
+and gets a copy of its result, and results stay in a small in-memory map for
+`ttl` seconds so a burst of identical requests right after it is answered too.
+
+    flights = SingleFlight(ttl=30)
+    backend = CoalescingBackend(get_backend("selenium", ...), flights)
+
+All backends handed to one API process share the same SingleFlight, so /scrape
+and /jobs callers coalesce with each other. Timeouts and failures are shared with
+the callers waiting at that moment but never kept in the map.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from backends import ScrapeBackend
+from metrics import METRICS
+from throttle import PortalTimeoutError
+
+Key = Tuple[str, Optional[str], str]
+
+
+class SingleFlight:
+    """
+    In-flight scrapes and recently finished results, keyed by job.
+    - ttl: seconds a finished result answers identical jobs (0: only coalesce in-flight scrapes).
+    - max_entries: finished results kept at most (oldest dropped first).
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Key, Future] = {}
+        self._recent: "OrderedDict[Key, Tuple[float, List[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: Key, use_recent: bool = True) -> Tuple[Optional[List[dict]], Optional[Future], bool]:
+        """
+        (result, None, False) if a recent result answers `key`; (None, future, False)
+        if someone is scraping it; (None, future, True) if the caller now owns the
+        scrape and must finish() it.
+        """
+        with self._lock:
+            if use_recent:
+                recent = self._recent.get(key)
+                if recent is not None:
+                    if time.monotonic() - recent[0] < self.ttl:
+                        return recent[1], None, False
+                    del self._recent[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                return None, future, False
+            future = Future()
+            self._inflight[key] = future
+            return None, future, True
+
+    def finish(self, key: Key, future: Future, region_results: Optional[List[dict]] = None,
+               error: Optional[BaseException] = None):
+        """Resolves an owned scrape for its waiters; good results are kept for `ttl` seconds."""
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if error is None and self.ttl > 0 and not _has_placeholder(region_results):
+                self._recent[key] = (time.monotonic(), region_results)
+                self._recent.move_to_end(key)
+                while len(self._recent) > self.max_entries:
+                    self._recent.popitem(last=False)
+        if error is None:
+            future.set_result(region_results)
+        else:
+            future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._inflight), "recent": len(self._recent)}
+
+
+def _has_placeholder(region_results: Optional[List[dict]]) -> bool:
+    # "(error)", "(timeout)", ... entries say nothing about the parcel
+    return any((entry.get("region_name") or "").startswith("(") for entry in region_results or [])
+
+
+class CoalescingBackend(ScrapeBackend):
+    """
+    Wraps `inner` so identical jobs share one scrape through `flights`.
+    use_recent=False (refresh requests) still joins in-flight scrapes, which are
+    fresh anyway, but ignores the map of finished results.
+    """
+
+    def __init__(self, inner: ScrapeBackend, flights: SingleFlight, use_recent: bool = True):
+        self.inner = inner
+        self.flights = flights
+        self.use_recent = use_recent
+        self.name = inner.name
+
+    def scrape(self, region: str, parcel: str, katastar_region: Optional[str] = None) -> List[dict]:
+        return self.scrape_group(region, [parcel], katastar_region=katastar_region)[parcel]
+
+    def scrape_group(self, region: str, parcels: List[str],
+                     katastar_region: Optional[str] = None) -> Dict[str, List[dict]]:
+        results: Dict[str, List[dict]] = {}
+        owned: Dict[str, Future] = {}
+        waiting: Dict[str, Future] = {}
+        for parcel in dict.fromkeys(parcels):
+            result, future, mine = self.flights.claim((region, katastar_region, parcel), self.use_recent)
+            if result is not None:
+                results[parcel] = copy.deepcopy(result)
+                METRICS.inc("katastar_coalesced_total", source="recent")
+            elif mine:
+                owned[parcel] = future
+            else:
+                waiting[parcel] = future
+
+        # Our own scrape first: whoever waits on us never waits on a caller that waits on them
+        error: Optional[BaseException] = None
+        if owned:
+            scraped: Dict[str, List[dict]] = {}
+            try:
+                scraped = self.inner.scrape_group(region, list(owned), katastar_region=katastar_region)
+            except PortalTimeoutError as exc:
+                scraped, error = exc.completed, exc
+            except BaseException as exc:
+                error = exc
+            for parcel, future in owned.items():
+                key = (region, katastar_region, parcel)
+                if parcel in scraped:
+                    # Waiters and the map get their own copy of what we return
+                    self.flights.finish(key, future, copy.deepcopy(scraped[parcel]))
+                else:
+                    self.flights.finish(key, future, error=error or PortalTimeoutError(
+                        f"No result for parcel {parcel} from the {self.name} backend"))
+            results.update(scraped)
+            if error is not None and not isinstance(error, PortalTimeoutError):
+                raise error
+
+        timed_out = error
+        for parcel, future in waiting.items():
+            try:
+                results[parcel] = copy.deepcopy(future.result())
+                METRICS.inc("katastar_coalesced_total", source="in_flight")
+            except PortalTimeoutError as exc:
+                timed_out = timed_out or exc
+
+        if timed_out is not None:
+            # Requeue what is missing (batch.py retries it, by then with a fresh scrape)
+            raise PortalTimeoutError(str(timed_out), completed=results)
+        return results
+
+    def close(self):
+        self.inner.close()
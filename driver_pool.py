@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+Pool of warm headless Chrome drivers shared by the CLI and the FastAPI app.
+
+Starting Chrome (and resolving chromedriver) dominates the cost of a single
+(region, parcel) job, so drivers are kept alive between jobs, reset to the
+portal home page before reuse and recycled when they crash, leak memory or
+have served too many jobs.
+
+Drivers start with a BrowserProfile. The default LEAN_PROFILE blocks images,
+fonts, media and analytics through CDP, returns from driver.get() at
+DOMContentLoaded (the readiness waits take it from there) and keeps a persistent
+HTTP cache per pool slot, so the portal's scripts are not downloaded on every
+session; FULL_PROFILE is the plain browser the scraper started with.
+
+selenium and webdriver_manager are only imported once a browser is started, so
+importing this module (for PORTAL_URL or the pool class) stays cheap.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from metrics import instrument_driver, phase
+from readiness import LATENCY, install_network_tracker
+
+
+# Overridable so benchmarks can point everything at bench/mock_portal.py
+PORTAL_URL = os.environ.get("KATASTAR_PORTAL_URL", "https://e-uslugi.katastar.gov.mk/")
+
+# -----------------------------
+# chromedriver resolution
+# -----------------------------
+# An explicit chromedriver binary: no lookup at all
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH", "")
+# Pin the version webdriver_manager installs (otherwise it asks which one matches Chrome)
+CHROMEDRIVER_VERSION = os.environ.get("CHROMEDRIVER_VERSION", "")
+# Where the resolved path is remembered, so later processes start without a network lookup
+DRIVER_CACHE_PATH = os.environ.get("KATASTAR_DRIVER_CACHE",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "katastar", "chromedriver.json"))
+
+_driver_path: Optional[str] = None
+_driver_path_lock = threading.Lock()
+
+
+def _is_executable(path: Optional[str]) -> bool:
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _read_driver_cache() -> Optional[str]:
+    """The cached chromedriver path, if it still exists and matches CHROMEDRIVER_VERSION."""
+    try:
+        with open(DRIVER_CACHE_PATH, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or (cached.get("version") or "") != CHROMEDRIVER_VERSION:
+        return None
+    return cached.get("path") if _is_executable(cached.get("path")) else None
+
+
+def _write_driver_cache(path: str):
+    try:
+        os.makedirs(os.path.dirname(DRIVER_CACHE_PATH) or ".", exist_ok=True)
+        tmp = f"{DRIVER_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"path": path, "version": CHROMEDRIVER_VERSION or None, "resolved_at": time.time()}, f)
+        os.replace(tmp, DRIVER_CACHE_PATH)
+    except OSError:
+        pass  # read-only home: resolve again next time
+
+
+def resolve_chromedriver() -> str:
+    """
+    chromedriver to start Chrome with, cheapest source first: CHROMEDRIVER_PATH, the
+    path cached in DRIVER_CACHE_PATH by an earlier process, a webdriver_manager
+    install (CHROMEDRIVER_VERSION if pinned; this is the only step that may use the
+    network) and finally a chromedriver on PATH when the install fails offline.
+    """
+    if CHROMEDRIVER_PATH:
+        if not _is_executable(CHROMEDRIVER_PATH):
+            raise RuntimeError(f"CHROMEDRIVER_PATH={CHROMEDRIVER_PATH} is not an executable file")
+        return CHROMEDRIVER_PATH
+    cached = _read_driver_cache()
+    if cached:
+        return cached
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        with phase("driver_resolve"):
+            path = ChromeDriverManager(driver_version=CHROMEDRIVER_VERSION or None).install()
+    except Exception as exc:
+        path = shutil.which("chromedriver")
+        if path is None:
+            raise RuntimeError("Could not resolve chromedriver (offline?). Set CHROMEDRIVER_PATH to a "
+                               "chromedriver binary, or run `python driver_pool.py` once while online.") from exc
+    _write_driver_cache(path)
+    return path
+
+
+def forget_chromedriver() -> bool:
+    """
+    Drops the resolved path (in this process and in DRIVER_CACHE_PATH), e.g. after
+    Chrome was upgraded past it. False if CHROMEDRIVER_PATH fixes the path anyway.
+    """
+    global _driver_path
+    if CHROMEDRIVER_PATH:
+        return False
+    with _driver_path_lock:
+        _driver_path = None
+        try:
+            os.remove(DRIVER_CACHE_PATH)
+        except OSError:
+            pass
+    return True
+
+
+def _chromedriver_path() -> str:
+    """
+    Resolves chromedriver once per process instead of once per job.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = resolve_chromedriver()
+        return _driver_path
+
+
+# -----------------------------
+# Browser profiles
+# -----------------------------
+IMAGE_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp")
+FONT_PATTERNS = ("*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot")
+MEDIA_PATTERNS = ("*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m4a")
+# Analytics / tag managers / social widgets; the portal works without any of them
+THIRD_PARTY_PATTERNS = (
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*connect.facebook.com*", "*hotjar.com*", "*clarity.ms*", "*yandex.ru/metrika*",
+    "*mc.yandex.*", "*newrelic.com*", "*nr-data.net*", "*sentry.io*", "*cloudflareinsights.com*",
+)
+
+
+@dataclass
+class BrowserProfile:
+    """
+    How pooled Chrome instances are started.
+
+    - block_*: URL patterns blocked through CDP Network.setBlockedURLs (plus extra_blocked).
+    - page_load_strategy: "eager" returns from driver.get() at DOMContentLoaded; "normal" waits for every asset.
+    - cache_dir: persistent HTTP disk cache root; every live browser locks a subdirectory of its own
+      (across processes too), None uses a fresh one per session.
+    """
+    name: str = "lean"
+    block_images: bool = True
+    block_fonts: bool = True
+    block_media: bool = True
+    block_third_party: bool = True
+    extra_blocked: Tuple[str, ...] = ()
+    page_load_strategy: str = "eager"
+    cache_dir: Optional[str] = os.environ.get("KATASTAR_BROWSER_CACHE", "katastar_browser_cache") or None
+    disk_cache_mb: int = 200
+
+    def blocked_urls(self) -> List[str]:
+        patterns = list(self.extra_blocked)
+        for enabled, group in ((self.block_images, IMAGE_PATTERNS), (self.block_fonts, FONT_PATTERNS),
+                               (self.block_media, MEDIA_PATTERNS), (self.block_third_party, THIRD_PARTY_PATTERNS)):
+            if enabled:
+                patterns.extend(group)
+        return patterns
+
+
+LEAN_PROFILE = BrowserProfile()
+FULL_PROFILE = BrowserProfile(name="full", block_images=False, block_fonts=False, block_media=False,
+                              block_third_party=False, page_load_strategy="normal", cache_dir=None)
+PROFILES = {"lean": LEAN_PROFILE, "full": FULL_PROFILE}
+
+
+def get_profile(name: str) -> BrowserProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown browser profile '{name}', expected one of {', '.join(PROFILES)}") from None
+
+
+def _lock_cache_dir(root: str, slot: int):
+    """
+    (path, lock file) of the first `slot-N` directory under `root`, starting at `slot`,
+    that no other live browser holds. The API, the CLI and every worker.py process on
+    a host number their pool slots from 0, so the slot alone does not make a directory
+    private; an flock on slot-N.lock does, and it goes away with the process holding it.
+    Without fcntl (Windows) the directory is made unique by the process id instead.
+    """
+    root = os.path.abspath(root)
+    os.makedirs(root, exist_ok=True)
+    try:
+        import fcntl
+    except ImportError:
+        return os.path.join(root, f"slot-{slot}-pid{os.getpid()}"), None
+    n = slot
+    while True:
+        lock = open(os.path.join(root, f"slot-{n}.lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            n += 1
+            continue
+        return os.path.join(root, f"slot-{n}"), lock
+
+
+def _configure_tab(driver):
+    """
+    Applies the profile's URL blocking and the readiness tracker to the current tab.
+    Both are per-target CDP state, so every new window or tab needs them again.
+    """
+    blocked = getattr(driver, "katastar_blocked_urls", None)
+    if blocked:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked})
+        except Exception:
+            pass  # not a Chromium driver; run unblocked
+    install_network_tracker(driver, max_wait=LATENCY.maximum)
+
+
+def open_tab(driver):
+    """Opens a new tab, switches to it and configures it like the browser's first one."""
+    driver.switch_to.new_window("tab")
+    _configure_tab(driver)
+
+
+def create_driver(slot: int = 0, profile: Optional[BrowserProfile] = None):
+    """
+    Starts a new headless Chrome with `profile` (LEAN_PROFILE by default),
+    instrumented for the event-driven waits in readiness.py and for metrics.py
+    (every WebDriver command is counted and timed).
+    `slot` is where the search for a free disk cache subdirectory starts (see _lock_cache_dir).
+    """
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.service import Service
+
+    profile = profile or LEAN_PROFILE
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--window-size=1920,1080")
+    options.page_load_strategy = profile.page_load_strategy
+    if profile.block_images:
+        # Also stop the renderer from decoding images that slip past the URL patterns
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    cache_lock = None
+    if profile.cache_dir:
+        cache_path, cache_lock = _lock_cache_dir(profile.cache_dir, slot)
+        os.makedirs(cache_path, exist_ok=True)
+        options.add_argument(f"--disk-cache-dir={cache_path}")
+        options.add_argument(f"--disk-cache-size={profile.disk_cache_mb * 1024 * 1024}")
+    try:
+        try:
+            driver = webdriver.Chrome(service=Service(_chromedriver_path()), options=options)
+        except SessionNotCreatedException:
+            # Usually Chrome was upgraded and the cached chromedriver no longer matches it
+            if not forget_chromedriver():
+                raise
+            driver = webdriver.Chrome(service=Service(_chromedriver_path()), options=options)
+    except BaseException:
+        if cache_lock is not None:
+            cache_lock.close()
+        raise
+    # Held until DriverPool._quit(); the kernel drops it if the process dies first
+    driver.katastar_cache_lock = cache_lock
+    driver.katastar_blocked_urls = profile.blocked_urls()
+    instrument_driver(driver)
+    _configure_tab(driver)
+    return driver
+
+
+# Sum of what the current page and its subresources pulled over the network (Resource Timing)
+PAGE_WEIGHT_JS = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+var bytes = 0;
+entries.forEach(function (e) { bytes += e.transferSize || 0; });
+return {requests: entries.length, bytes: bytes};
+"""
+
+
+def page_weight(driver) -> dict:
+    """{"requests", "bytes"} transferred for the current page (cache hits count as 0 bytes)."""
+    from selenium.common.exceptions import WebDriverException
+
+    try:
+        return driver.execute_script(PAGE_WEIGHT_JS) or {"requests": 0, "bytes": 0}
+    except WebDriverException:
+        return {"requests": 0, "bytes": 0}
+
+
+class _PooledDriver:
+    """Bookkeeping for one driver owned by the pool."""
+
+    def __init__(self, driver, slot: int = 0):
+        self.driver = driver
+        self.slot = slot
+        self.jobs_served = 0
+        self.created_at = time.monotonic()
+
+
+class DriverPool:
+    """
+    Thread-safe pool of at most `max_drivers` Chrome drivers.
+
+    - acquire() hands out an idle driver (or starts one while under the cap, or blocks).
+    - Before a driver is handed out it is health-checked and reset to PORTAL_URL.
+    - release() recycles drivers that errored, served `max_jobs_per_driver` jobs,
+      or whose JS heap grew past `max_heap_mb`.
+    - driver_factory(slot=, profile=) starts a browser; `slot` (0..max_drivers-1) is unique
+      among live drivers, so per-slot resources such as the disk cache are never shared.
+    """
+
+    def __init__(self, max_drivers: int = 1, max_jobs_per_driver: int = 50,
+                 max_heap_mb: Optional[int] = 512,
+                 driver_factory: Callable = create_driver,
+                 home_url: str = PORTAL_URL,
+                 profile: Optional[BrowserProfile] = None):
+        if max_drivers < 1:
+            raise ValueError("max_drivers must be >= 1")
+        self.max_drivers = max_drivers
+        self.max_jobs_per_driver = max_jobs_per_driver
+        self.max_heap_mb = max_heap_mb
+        self.driver_factory = driver_factory
+        self.home_url = home_url
+        self.profile = profile or LEAN_PROFILE
+
+        self._idle: List[_PooledDriver] = []
+        self._busy = {}  # id(driver) -> _PooledDriver
+        self._cond = threading.Condition()
+        self._closed = False
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Returns a healthy driver sitting on the portal home page.
+        Blocks while `max_drivers` drivers are busy; raises TimeoutError after `timeout` seconds.
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            pooled = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("DriverPool is closed")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size() < self.max_drivers:
+                        # Reserve the slot while Chrome starts outside the lock
+                        pooled = _PooledDriver(None, self._free_slot())
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a free driver")
+                    self._cond.wait(remaining)
+                self._busy[id(pooled)] = pooled
+
+            if pooled.driver is None:
+                try:
+                    with phase("driver_start"):
+                        pooled.driver = self.driver_factory(slot=pooled.slot, profile=self.profile)
+                except Exception:
+                    self._forget(pooled)
+                    raise
+            elif not self._is_healthy(pooled.driver):
+                self._discard(pooled)
+                continue
+
+            try:
+                with phase("driver_reset"):
+                    self._reset(pooled.driver)
+            except WebDriverException:
+                self._discard(pooled)
+                continue
+
+            with self._cond:
+                self._busy[id(pooled.driver)] = self._busy.pop(id(pooled))
+            return pooled.driver
+
+    def release(self, driver, broken: bool = False):
+        """
+        Returns a driver to the pool. Pass broken=True if the job using it crashed,
+        so the driver is quit instead of being reused.
+        """
+        with self._cond:
+            pooled = self._busy.pop(id(driver), None)
+        if pooled is None:
+            return
+        pooled.jobs_served += 1
+
+        if broken or self._closed or self._needs_recycle(pooled):
+            self._quit(pooled.driver)
+            self._notify()
+            return
+
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def driver(self):
+        """
+        with pool.driver() as driver: ...
+        Marks the driver broken if the block raises a WebDriverException other than a wait timeout.
+        """
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+
+        with phase("driver_acquire"):
+            driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except WebDriverException as exc:
+            broken = not isinstance(exc, TimeoutException)
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        """Quits every idle driver; busy drivers are quit when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled.driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _size(self) -> int:
+        return len(self._idle) + len(self._busy)
+
+    def _free_slot(self) -> int:
+        used = {p.slot for p in self._idle} | {p.slot for p in self._busy.values()}
+        return min(set(range(self.max_drivers)) - used)
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _forget(self, pooled: _PooledDriver):
+        with self._cond:
+            self._busy.pop(id(pooled), None)
+            self._cond.notify()
+
+    def _discard(self, pooled: _PooledDriver):
+        with self._cond:
+            self._busy.pop(id(pooled), None)
+        self._quit(pooled.driver)
+        self._notify()
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        lock = getattr(driver, "katastar_cache_lock", None)
+        if lock is not None:
+            lock.close()
+
+    @staticmethod
+    def _is_healthy(driver) -> bool:
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _heap_mb(self, driver) -> Optional[float]:
+        try:
+            used = driver.execute_script(
+                "return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : null;")
+        except Exception:
+            return None
+        return None if used is None else used / (1024 * 1024)
+
+    def _needs_recycle(self, pooled: _PooledDriver) -> bool:
+        if self.max_jobs_per_driver and pooled.jobs_served >= self.max_jobs_per_driver:
+            return True
+        if self.max_heap_mb:
+            heap = self._heap_mb(pooled.driver)
+            if heap is None and not self._is_healthy(pooled.driver):
+                return True
+            if heap is not None and heap > self.max_heap_mb:
+                return True
+        return False
+
+    def _reset(self, driver):
+        """
+        Brings the driver back to a clean portal state: one window, no cookies, home page loaded.
+        """
+        handles = driver.window_handles
+        if len(handles) > 1:
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        # go_home() in scrape_katastar comes back here rather than to the module-level PORTAL_URL
+        driver.katastar_home_url = self.home_url
+        driver.get(self.home_url)
+
+
+# -----------------------------
+# Process-wide shared pool
+# -----------------------------
+_default_pool: Optional[DriverPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool(**kwargs) -> DriverPool:
+    """
+    Returns the process-wide pool, creating it on first use with `kwargs`.
+    The CLI and the API both go through this so they share the same warm drivers.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = DriverPool(**kwargs)
+        return _default_pool
+
+
+def close_default_pool():
+    global _default_pool
+    with _default_pool_lock:
+        pool, _default_pool = _default_pool, None
+    if pool is not None:
+        pool.close()
+
+
+if __name__ == "__main__":
+    # Resolve (and cache) chromedriver ahead of time, e.g. while building a worker image
+    import sys
+    try:
+        print(resolve_chromedriver())
+    except RuntimeError as exc:
+        sys.exit(str(exc))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Browser-less backend that talks to the JSON endpoints behind the portal's MUI frontend.
+
+The frontend fills its autocompletes and tables from XHR calls; this backend
+issues the same calls over one keep-alive connection pool and fans the
+per-row right-holder lookups out concurrently. Routes and JSON field names
+live in HttpEndpoints so they can be re-aligned with the portal (copy them
+from the browser devtools Network tab) without touching code:
+
+    python scrape_katastar.py -i jobs.txt --backend http --http-endpoints endpoints.json
+
+Responses can be recorded with record_to= and replayed offline by stub_portal.py.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backends import BackendConfigError, ScrapeBackend
+from driver_pool import PORTAL_URL
+from metrics import bind, count_request, count_timeout, timed
+from scrape_katastar import _region_entry
+from throttle import PortalTimeoutError
+
+# Statuses the portal answers with when it is overloaded or rate limiting us
+THROTTLED_STATUSES = (429, 502, 503, 504)
+
+
+@dataclass
+class HttpEndpoints:
+    """
+    Routes (relative to base_url) and JSON field names used by HttpBackend.
+    Each route returns a JSON list of objects. A 404 means the route is wrong
+    (BackendConfigError), except on the routes listed in empty_on_404, where the
+    portal answers "no results" that way.
+    """
+    # GET ?search=<region text>  -> [{id, name}, ...]
+    municipalities: str = "/api/cadastral-municipalities"
+    # GET ?municipalityId=<id>&search=<parcel text>  -> [{id, number}, ...]
+    parcel_suggestions: str = "/api/parcels/suggestions"
+    # GET ?municipalityId=<id>&parcelId=<id>  -> [parcel row, ...]
+    parcels: str = "/api/parcels"
+    # GET ?parcelRowId=<row id>  -> [holder row, ...]
+    right_holders: str = "/api/right-holders"
+
+    search_param: str = "search"
+    municipality_param: str = "municipalityId"
+    parcel_param: str = "parcelId"
+    row_param: str = "parcelRowId"
+
+    id_key: str = "id"
+    municipality_name_key: str = "name"
+    parcel_suggestion_key: str = "number"
+
+    empty_on_404: List[str] = field(default_factory=list)
+
+    # Output column -> JSON key
+    parcel_fields: Dict[str, str] = field(default_factory=lambda: {
+        "Имотен лист": "propertySheet",
+        "Број/дел": "parcelNumber",
+        "Култура": "culture",
+        "Површина m2": "area",
+        "Место": "place",
+        "Право": "right",
+    })
+    holder_fields: Dict[str, str] = field(default_factory=lambda: {
+        "Имотен лист": "propertySheet",
+        "Име и презиме": "fullName",
+        "Град": "city",
+        "Улица": "street",
+        "Број": "streetNumber",
+        "Дел на посед": "share",
+    })
+
+    @classmethod
+    def from_file(cls, path: str) -> "HttpEndpoints":
+        """Loads overrides from a JSON object whose keys are field names of this class."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown endpoint settings: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+def request_key(method: str, path: str, params: Optional[dict]) -> str:
+    """Canonical key for one request, shared with stub_portal.py recordings."""
+    query = urlencode(sorted((params or {}).items()))
+    return f"{method.upper()} {path}" + (f"?{query}" if query else "")
+
+
+class HttpBackend(ScrapeBackend):
+    """
+    Scrapes through the portal's JSON API with a pooled requests.Session.
+
+    - base_url: portal root (or the stub server when testing offline).
+    - max_connections: keep-alive pool size and width of the holder fan-out.
+    - record_to: if set, every response is saved there (stub_portal.py format) on close().
+    - snapshots: a refresh.SnapshotStore; holders are then only fetched for new or changed rows.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: Optional[str] = None, endpoints: Optional[HttpEndpoints] = None,
+                 max_connections: int = 8, timeout: float = 20.0, record_to: Optional[str] = None,
+                 snapshots=None):
+        self.base_url = (base_url or os.environ.get("KATASTAR_HTTP_BASE_URL") or PORTAL_URL).rstrip("/")
+        if endpoints is None and os.environ.get("KATASTAR_HTTP_ENDPOINTS"):
+            endpoints = HttpEndpoints.from_file(os.environ["KATASTAR_HTTP_ENDPOINTS"])
+        self.endpoints = endpoints or HttpEndpoints()
+        self.timeout = timeout
+        self.snapshots = snapshots
+        self.max_connections = max(1, max_connections)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_connections, pool_maxsize=self.max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/json"})
+        self._executor = ThreadPoolExecutor(max_workers=self.max_connections,
+                                            thread_name_prefix="katastar-http")
+
+        self.record_to = record_to
+        self._recorded: Dict[str, dict] = {}
+        self._record_lock = threading.Lock()
+
+    # -----------------------------
+    # HTTP plumbing
+    # -----------------------------
+    def _get(self, path: str, params: dict) -> list:
+        started = time.perf_counter()
+        try:
+            resp = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+        except (requests.Timeout, requests.ConnectionError) as exc:
+            count_timeout("http")
+            raise PortalTimeoutError(f"GET {path} failed: {exc}") from exc
+        finally:
+            count_request(path, time.perf_counter() - started)
+        if resp.status_code in THROTTLED_STATUSES:
+            count_timeout("http")
+            raise PortalTimeoutError(f"GET {path} answered {resp.status_code}")
+        if resp.status_code == 404:
+            if path not in self.endpoints.empty_on_404:
+                raise BackendConfigError(
+                    f"GET {self.base_url + path} answered 404: the route does not exist on this portal. "
+                    f"Copy the routes from the browser devtools Network tab into --http-endpoints "
+                    f"(or list the route in empty_on_404 if the portal answers 'no results' with a 404)")
+            data = []
+        else:
+            resp.raise_for_status()
+            data = resp.json()
+        if self.record_to:
+            with self._record_lock:
+                self._recorded[request_key("GET", path, params)] = {"status": resp.status_code, "body": data}
+        return data
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        if self.record_to and self._recorded:
+            existing = {}
+            if os.path.exists(self.record_to):
+                with open(self.record_to, "r", encoding="utf-8") as f:
+                    existing = json.load(f)
+            existing.update(self._recorded)
+            with open(self.record_to, "w", encoding="utf-8") as f:
+                json.dump(existing, f, ensure_ascii=False, indent=2)
+
+    # -----------------------------
+    # Portal calls
+    # -----------------------------
+    @timed("region_autocomplete")
+    def region_suggestions(self, region_text: str) -> List[dict]:
+        ep = self.endpoints
+        return self._get(ep.municipalities, {ep.search_param: region_text})
+
+    @timed("parcel_select")
+    def parcel_rows(self, municipality_id, parcel_text: str) -> Optional[List[dict]]:
+        """
+        Same choice as select_parcel(): exact or contained match, else the first suggestion.
+        Returns None when the portal offers no parcel suggestions.
+        """
+        ep = self.endpoints
+        options = self._get(ep.parcel_suggestions,
+                            {ep.municipality_param: municipality_id, ep.search_param: parcel_text})
+        if not options:
+            return None
+        target = parcel_text.strip()
+        chosen = next((o for o in options
+                       if target == str(o.get(ep.parcel_suggestion_key, "")).strip()
+                       or target in str(o.get(ep.parcel_suggestion_key, ""))), options[0])
+        rows = self._get(ep.parcels, {ep.municipality_param: municipality_id,
+                                      ep.parcel_param: chosen[ep.id_key]})
+        return rows or None
+
+    def holders(self, row: dict) -> List[dict]:
+        ep = self.endpoints
+        data = self._get(ep.right_holders, {ep.row_param: row[ep.id_key]})
+        return [{col: _text(h.get(key)) for col, key in ep.holder_fields.items()} for h in data]
+
+    @timed("extract")
+    def parcels_with_holders(self, rows: List[dict], known_holders=None) -> List[dict]:
+        """
+        Fans the right-holder lookups for all rows out over the connection pool,
+        skipping rows for which known_holders(parcel data) returns their holders.
+        """
+        ep = self.endpoints
+        result = [{col: _text(row.get(key)) for col, key in ep.parcel_fields.items()} for row in rows]
+        known = [known_holders(data) if known_holders else None for data in result]
+        todo = [i for i, holders in enumerate(known) if holders is None]
+        fetched = dict(zip(todo, self._executor.map(bind(self.holders), [rows[i] for i in todo])))
+        for i, data in enumerate(result):
+            data["Носители на право"] = known[i] if known[i] is not None else fetched[i]
+        return result
+
+    # -----------------------------
+    # Backend interface
+    # -----------------------------
+    def scrape(self, region: str, parcel: str, katastar_region: Optional[str] = None) -> List[dict]:
+        ep = self.endpoints
+        suggestions = self.region_suggestions(region)
+        if not suggestions:
+            return [_region_entry("(no suggestions)", region, katastar_region, parcel,
+                                  note=f"No region suggestions found for '{region}'.")]
+
+        if katastar_region:
+            target = katastar_region.strip().lower()
+            match = next((s for s in suggestions
+                          if target in str(s.get(ep.municipality_name_key, "")).strip().lower()), None)
+            if match is None:
+                return [_region_entry(f"(no match among suggestions for '{region}')", region, katastar_region,
+                                      parcel, note=f"Katastar region '{katastar_region}' not found in suggestions.")]
+            suggestions = [match]
+
+        def scrape_suggestion(suggestion: dict) -> dict:
+            region_name = str(suggestion.get(ep.municipality_name_key, ""))
+            entry = _region_entry(region_name, region, katastar_region, parcel)
+            rows = self.parcel_rows(suggestion[ep.id_key], parcel)
+            if rows is None:
+                entry["note"] = f"No parcel suggestions found for '{parcel}' in region '{region_name}'."
+            else:
+                known = self.snapshots.known_holders(region_name, parcel) if self.snapshots is not None else None
+                entry["parcels"] = self.parcels_with_holders(rows, known)
+            return entry
+
+        # Suggestions run one after another; each one fans its holder calls out on the pool
+        return [scrape_suggestion(s) for s in suggestions]
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Background batch jobs for the API.
+
+POST /jobs hands a batch to JobManager.submit(), which returns an id at once and
+runs the batch on a bounded pool of batch slots. Each finished item is stored as
+soon as it completes, so GET /jobs/{id} can report per-item progress and partial
+results while the rest is still running; batches can be cancelled, and finished
+batches are forgotten after `retention` seconds.
+
+QueueJobManager offers the same interface on a shared work_queue instead, for
+when worker.py processes on other machines do the scraping.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backends import ScrapeBackend
+from batch import run_jobs
+from throttle import AdaptiveScheduler
+
+Job = Tuple[str, Optional[str], str]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class BatchJob:
+    """State of one submitted batch. Mutated only under JobManager's lock."""
+
+    def __init__(self, jobs: List[Job], workers: int, backend: ScrapeBackend):
+        self.id = uuid.uuid4().hex
+        self.jobs = jobs
+        self.workers = workers
+        self.backend = backend
+        self.status = QUEUED
+        self.results: List[Optional[List[dict]]] = [None] * len(jobs)
+        self.completed = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self, include_results: bool = True, since: int = 0) -> dict:
+        """
+        Progress summary plus, per item, its status and (once done) its region_results.
+        `since` skips the first items so pollers can page through large batches.
+        """
+        items = []
+        for index in range(since, len(self.jobs)):
+            region, katastar_region, parcel = self.jobs[index]
+            done = self.results[index] is not None
+            item = {
+                "index": index,
+                "region": region,
+                "katastar_region": katastar_region,
+                "parcel": parcel,
+                "status": DONE if done else (CANCELLED if self.status == CANCELLED else self.status),
+            }
+            if include_results and done:
+                item["results"] = self.results[index]
+            items.append(item)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": len(self.jobs),
+            "completed": self.completed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "items": items,
+        }
+
+    def all_results(self) -> List[dict]:
+        """Completed region entries in input order (what the Excel writer expects)."""
+        return [entry for region_results in self.results if region_results for entry in region_results]
+
+
+class JobManager:
+    """
+    - max_batches: batches scraping at the same time; the rest wait in QUEUED.
+    - jobs_per_minute: passed to batch.run_jobs() for every batch.
+    - scheduler: an optional throttle.AdaptiveScheduler shared by all batches.
+    - retention: seconds a finished batch stays queryable.
+    - on_result: optional callable(job, region_results), called for every finished
+      item (the API adds them to the search index).
+    """
+
+    def __init__(self, max_batches: int = 2, jobs_per_minute: Optional[float] = None,
+                 retention: float = 3600, scheduler: Optional[AdaptiveScheduler] = None,
+                 on_result: Optional[Callable[[Job, List[dict]], None]] = None):
+        self.jobs_per_minute = jobs_per_minute
+        self.scheduler = scheduler
+        self.on_result = on_result
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_batches), thread_name_prefix="katastar-batch")
+        self._batches: Dict[str, BatchJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, jobs: List[Job], backend: ScrapeBackend, workers: int = 1) -> BatchJob:
+        batch = BatchJob(jobs, workers, backend)
+        with self._lock:
+            self._purge_locked()
+            self._batches[batch.id] = batch
+        self._executor.submit(self._run, batch)
+        return batch
+
+    def get(self, batch_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    def snapshot(self, batch_id: str, include_results: bool = True, since: int = 0) -> Optional[dict]:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            return None if batch is None else batch.to_dict(include_results, since)
+
+    def cancel(self, batch_id: str) -> Optional[BatchJob]:
+        """Stops scheduling new work for the batch; items already scraping finish normally."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            batch.cancel_event.set()
+            if batch.status == QUEUED:
+                batch.status = CANCELLED
+                batch.finished_at = time.time()
+            return batch
+
+    def shutdown(self):
+        with self._lock:
+            for batch in self._batches.values():
+                batch.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, batch: BatchJob):
+        with self._lock:
+            if batch.cancel_event.is_set():
+                return
+            batch.status = RUNNING
+            batch.started_at = time.time()
+
+        def on_result(index: int, job: Job, region_results: List[dict]):
+            with self._lock:
+                if batch.results[index] is None:
+                    batch.completed += 1
+                batch.results[index] = region_results
+            if self.on_result is not None:
+                self.on_result(job, region_results)
+
+        try:
+            run_jobs(batch.jobs, workers=batch.workers, jobs_per_minute=self.jobs_per_minute,
+                     backend=batch.backend, on_result=on_result, cancel=batch.cancel_event,
+                     scheduler=self.scheduler)
+        except Exception as exc:
+            with self._lock:
+                batch.status = FAILED
+                batch.error = f"{type(exc).__name__}: {exc}"
+                batch.finished_at = time.time()
+            return
+
+        with self._lock:
+            batch.status = CANCELLED if batch.cancel_event.is_set() and batch.completed < len(batch.jobs) else DONE
+            batch.finished_at = time.time()
+
+    def _purge_locked(self):
+        cutoff = time.time() - self.retention
+        for batch_id in [b.id for b in self._batches.values()
+                         if b.status in FINISHED and b.finished_at and b.finished_at < cutoff]:
+            del self._batches[batch_id]
+
+
+class QueuedBatch:
+    """Read-only view of a batch on a shared work_queue, shaped like BatchJob for the API."""
+
+    def __init__(self, batch_id: str, progress: dict, tasks: List[dict]):
+        self.id = batch_id
+        self.progress = progress
+        self.tasks = tasks
+        self.jobs = [task["job"] for task in tasks]
+        self.completed = progress["done"]
+        if progress["done"] == progress["total"]:
+            self.status = DONE
+        elif progress["cancelled"]:
+            self.status = CANCELLED if progress["leased"] == 0 else RUNNING
+        else:
+            self.status = RUNNING if progress["done"] or progress["leased"] else QUEUED
+
+    def to_dict(self, include_results: bool = True, since: int = 0) -> dict:
+        items = []
+        for task in self.tasks[since:]:
+            region, katastar_region, parcel = task["job"]
+            item = {"index": task["seq"], "region": region, "katastar_region": katastar_region, "parcel": parcel,
+                    "status": DONE if task["status"] == "done" else
+                    (CANCELLED if self.status == CANCELLED else
+                     RUNNING if task["status"] == "leased" else QUEUED),
+                    "worker": task["worker"], "attempts": task["attempts"]}
+            if include_results and task["results"] is not None:
+                item["results"] = task["results"]
+            items.append(item)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.progress["total"],
+            "completed": self.completed,
+            "error": None,
+            "created_at": self.progress["created_at"],
+            "started_at": None,
+            "finished_at": None,
+            "items": items,
+        }
+
+    def all_results(self) -> List[dict]:
+        return [entry for task in self.tasks if task["results"] for entry in task["results"]]
+
+
+class QueueJobManager:
+    """
+    JobManager's interface on top of a shared work_queue: submitted batches are only
+    enqueued, and worker.py processes (on this host or others) do the scraping.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def submit(self, jobs: List[Job], backend: Optional[ScrapeBackend] = None, workers: int = 1) -> QueuedBatch:
+        return self.get(self.queue.create_batch(jobs))
+
+    def get(self, batch_id: str) -> Optional[QueuedBatch]:
+        progress = self.queue.progress(batch_id)
+        if progress is None:
+            return None
+        return QueuedBatch(batch_id, progress, self._tasks(batch_id, progress["total"]))
+
+    def snapshot(self, batch_id: str, include_results: bool = True, since: int = 0) -> Optional[dict]:
+        batch = self.get(batch_id)
+        return None if batch is None else batch.to_dict(include_results, since)
+
+    def cancel(self, batch_id: str) -> Optional[QueuedBatch]:
+        if self.queue.progress(batch_id) is None:
+            return None
+        self.queue.cancel(batch_id)
+        return self.get(batch_id)
+
+    def shutdown(self):
+        self.queue.close()
+
+    def _tasks(self, batch_id: str, total: int, page: int = 1000) -> List[dict]:
+        tasks: List[dict] = []
+        while len(tasks) < total:
+            chunk = self.queue.tasks(batch_id, since=len(tasks), limit=page)
+            if not chunk:
+                break
+            tasks.extend(chunk)
+        return tasks
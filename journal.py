@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL journal of finished jobs, so long batch runs can resume.
+
+Each line is {"job": [region, katastar_region, parcel], "results": region_results}.
+Lines are flushed and fsynced as jobs finish, so a Chrome crash, a portal outage
+or Ctrl-C loses at most the jobs that were in flight. A torn last line from a
+hard kill is ignored on load and cut off before a resumed run appends to the journal.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+Job = Tuple[str, Optional[str], str]
+
+DEFAULT_JOURNAL_PATH = "results.journal.jsonl"
+
+
+def _drop_torn_tail(path: str, chunk: int = 64 * 1024):
+    """Truncates a journal back to its last newline, so appends never continue a torn line."""
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class JobJournal:
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH, resume: bool = False):
+        """
+        resume=False starts a fresh journal (truncating any old one);
+        resume=True keeps the existing lines and appends to them.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if resume:
+            _drop_torn_tail(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def load(path: str) -> Dict[Job, List[dict]]:
+        """Completed jobs in the journal at `path` (later lines win). Missing file -> {}."""
+        done: Dict[Job, List[dict]] = {}
+        if not os.path.exists(path):
+            return done
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    region, katastar_region, parcel = record["job"]
+                    done[(region, katastar_region, parcel)] = record["results"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn or foreign line
+        return done
+
+    def record(self, job: Job, region_results: List[dict]):
+        """Appends one finished job. Jobs that only produced a scrape error are left out so a resume retries them."""
+        if region_results and all(e.get("region_name") == "(error)" for e in region_results):
+            return
+        line = json.dumps({"job": list(job), "results": region_results}, ensure_ascii=False)
+        with self._lock:
+            if self._file.closed:
+                return  # a worker finishing after the run was interrupted and the journal closed
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JournalIndex:
+    """
+    Byte offset of each finished job's (latest) line in a journal, so a resumed
+    run can re-emit old results in input order without holding them all in memory.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.offsets: Dict[Job, int] = {}
+        self._file = None
+        if not os.path.exists(path):
+            return
+        self._file = open(path, "rb")
+        offset = 0
+        for line in self._file:
+            try:
+                region, katastar_region, parcel = json.loads(line)["job"]
+                self.offsets[(region, katastar_region, parcel)] = offset
+            except (ValueError, KeyError, TypeError):
+                pass  # torn or foreign line
+            offset += len(line)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, job) -> bool:
+        return job in self.offsets
+
+    def get(self, job: Job) -> Optional[List[dict]]:
+        """The journaled region_results of `job`, or None if it is not in the journal."""
+        offset = self.offsets.get(job)
+        if offset is None:
+            return None
+        self._file.seek(offset)
+        return json.loads(self._file.readline())["results"]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
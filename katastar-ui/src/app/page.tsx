@@ -4,7 +4,7 @@ import { useRef, useState } from "react";
 import JobRow from "@/components/JobRow";
 import Progress from "@/components/Progress";
 import { JobInput } from "@/lib/types";
-import { postScrape } from "@/lib/api";
+import { cancelJob, createJob, downloadJob, getJob } from "@/lib/api";
 import axios from "axios";
 
 // --- START: Helper Functions (Outside Component) ---
@@ -40,19 +40,16 @@ function parseInputText(text: string): JobInput[] {
   return jobs;
 }
 
-function b64ToBlob(b64Data: string, contentType = "", sliceSize = 512) {
-  const byteCharacters = atob(b64Data);
-  const byteArrays: ArrayBuffer[] = [];
+const POLL_INTERVAL_MS = 1500;
 
-  for (let offset = 0; offset < byteCharacters.length; offset += sliceSize) {
-    const slice = byteCharacters.slice(offset, offset + sliceSize);
-    const byteNumbers = new Array(slice.length).fill(0).map((_, i) => slice.charCodeAt(i));
-    const byteArray = new Uint8Array(byteNumbers);
-    byteArrays.push(byteArray.buffer);
-  }
-
-  return new Blob(byteArrays, { type: contentType });
-}
+const sleep = (ms: number, signal: AbortSignal) =>
+  new Promise<void>((resolve, reject) => {
+    const timer = window.setTimeout(resolve, ms);
+    signal.addEventListener("abort", () => {
+      window.clearTimeout(timer);
+      reject(new DOMException("Aborted", "AbortError"));
+    });
+  });
 
 // --- END: Helper Functions ---
 
@@ -77,6 +74,8 @@ export default function Page() {
   const [isFinished, setIsFinished] = useState(false);
   const intervalRef = useRef<number | null>(null);
   const abortControllerRef = useRef<AbortController | null>(null); 
+  const jobIdRef = useRef<string | null>(null);
+  const [progress, setProgress] = useState<{ completed: number; total: number } | null>(null);
 
   // ----------------------
   // TIMER FUNCTIONS
@@ -170,6 +169,10 @@ export default function Page() {
   };
 
   const handleStop = () => {
+    if (jobIdRef.current) {
+        cancelJob(jobIdRef.current).catch(console.error);
+        jobIdRef.current = null;
+    }
     if (abortControllerRef.current) {
         abortControllerRef.current.abort(); 
         abortControllerRef.current = null;
@@ -207,19 +210,39 @@ export default function Page() {
     }
     
     setLoading(true);
+    setProgress(null);
     startTimer(); 
 
     const controller = new AbortController();
     abortControllerRef.current = controller;
     
     try {
-      const res = await postScrape({ jobs: jobsToSubmit }, controller.signal);
-      
+      const submitted = await createJob({ jobs: jobsToSubmit }, controller.signal);
+      jobIdRef.current = submitted.id;
+      setProgress({ completed: 0, total: submitted.total });
+
+      // Poll until the background job finishes
+      let status = await getJob(submitted.id, controller.signal);
+      while (status.status === "queued" || status.status === "running") {
+        setProgress({ completed: status.completed, total: status.total });
+        await sleep(POLL_INTERVAL_MS, controller.signal);
+        status = await getJob(submitted.id, controller.signal);
+      }
+      setProgress({ completed: status.completed, total: status.total });
+
+      if (status.status === "failed") {
+        throw new Error(status.error || "Пребарувањето не успеа.");
+      }
+      if (status.status === "cancelled") {
+        return;
+      }
+
+      const blob = await downloadJob(submitted.id, controller.signal);
+      jobIdRef.current = null;
       abortControllerRef.current = null; 
 
-      setFilename(res.filename || "results.xlsx");
+      setFilename("results.xlsx");
 
-      const blob = b64ToBlob(res.file_b64, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet");
       const fileUrl = URL.createObjectURL(blob);
       setDownloadUrl(fileUrl);
 
@@ -231,13 +254,14 @@ export default function Page() {
          return; 
       }
       
-      alert(err?.response?.data?.detail || "Пребарувањето не успеа.");
+      alert(err?.response?.data?.detail || err?.message || "Пребарувањето не успеа.");
       setIsStopped(false); 
 
     } finally {
       setLoading(false);
       stopTimer();
       abortControllerRef.current = null;
+      jobIdRef.current = null;
     }
   };
 
@@ -393,6 +417,8 @@ export default function Page() {
           elapsedTime={elapsedTime} 
           isFinished={isFinished} 
           isStopped={isStopped}
+          completed={progress?.completed}
+          total={progress?.total}
         />
       </section>
     </main>
@@ -17,10 +17,12 @@ type Props = {
   elapsedTime: number; 
   isFinished: boolean; 
   isStopped: boolean; // Added for cancellation tracking
+  completed?: number; // items finished so far (background jobs)
+  total?: number;
 };
 
 // --- Updated Component ---
-export default function Progress({ isLoading, elapsedTime, isFinished, isStopped }: Props) {
+export default function Progress({ isLoading, elapsedTime, isFinished, isStopped, completed, total }: Props) {
   
   // 1a. If the process was explicitly stopped by the user
   if (isStopped) {
@@ -51,7 +53,10 @@ if (isLoading) {
         <div className="flex items-center justify-between gap-3">
           <div className="flex items-center gap-3">
             <span className="inline-block h-3 w-3 animate-ping rounded-full bg-indigo-500"></span>
-            <p className="font-medium">Ве молиме почекајте...</p>
+            <p className="font-medium">
+              Ве молиме почекајте...
+              {total ? ` (${completed ?? 0} / ${total})` : ""}
+            </p>
           </div>
           <p className="font-mono text-sm font-semibold">
             {formatTime(elapsedTime)}
@@ -1,5 +1,5 @@
 import axios from "axios";
-import type { ScrapeRequest, ScrapeResponse } from "./types";
+import type { JobStatus, JobSubmitted, ScrapeRequest } from "./types";
 
 // For dev: local FastAPI
 // In production: set this via env, e.g. NEXT_PUBLIC_API_BASE
@@ -12,6 +12,30 @@ export const api = axios.create({
 
 export async function postScrape(payload: ScrapeRequest, signal: AbortSignal) {
   // Pass the signal inside the request configuration
-  const res = await api.post<ScrapeResponse>("/scrape", payload, { signal });
+  const res = await api.post<Blob>("/scrape", payload, { signal, responseType: "blob" });
   return res.data;
-}
\ No newline at end of file
+}
+
+// Background jobs: submit once, then poll for progress instead of holding one long request open
+export async function createJob(payload: ScrapeRequest, signal: AbortSignal) {
+  const res = await api.post<JobSubmitted>("/jobs", payload, { signal, timeout: 30000 });
+  return res.data;
+}
+
+export async function getJob(id: string, signal: AbortSignal) {
+  const res = await api.get<JobStatus>(`/jobs/${id}`, {
+    params: { include_results: false },
+    signal,
+    timeout: 30000,
+  });
+  return res.data;
+}
+
+export async function cancelJob(id: string) {
+  await api.delete(`/jobs/${id}`, { timeout: 30000 });
+}
+
+export async function downloadJob(id: string, signal: AbortSignal) {
+  const res = await api.get<Blob>(`/jobs/${id}/download`, { responseType: "blob", signal });
+  return res.data;
+}
@@ -8,7 +8,26 @@ export type ScrapeRequest = {
   jobs: JobInput[];
 };
 
-export type ScrapeResponse = {
-  filename: string;
-  file_b64: string; // base64 excel file
+export type JobSubmitted = {
+  id: string;
+  status: string;
+  total: number;
+};
+
+export type JobItem = {
+  index: number;
+  region: string;
+  katastar_region?: string | null;
+  parcel: string;
+  status: string;
+  results?: unknown[];
+};
+
+export type JobStatus = {
+  id: string;
+  status: "queued" | "running" | "done" | "failed" | "cancelled";
+  total: number;
+  completed: number;
+  error?: string | null;
+  items: JobItem[];
 };
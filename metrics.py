@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+In-process instrumentation: per-phase durations, WebDriver command counts,
+retries, timeouts and cache hits.
+
+Everything is recorded twice:
+  - into METRICS, a process-wide registry rendered in Prometheus text format
+    (GET /metrics in the API, the --profile summary in the CLI);
+  - into the JobProfile of the job running on the current thread, which is
+    written as one JSON line to the "katastar.metrics" logger when the job ends.
+
+    with job_profile(region="Центар", parcels=["1234"]):
+        with phase("region_autocomplete"):
+            ...
+        count_retry("parcel_autocomplete")
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("katastar.metrics")
+
+# Upper bounds (seconds) of the phase duration histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HELP = {
+    "katastar_phase_seconds": "Time spent per scrape phase",
+    "katastar_webdriver_commands_total": "WebDriver commands sent, by command",
+    "katastar_webdriver_command_seconds_total": "Time spent waiting on WebDriver commands, by command",
+    "katastar_http_requests_total": "Portal JSON requests made by the http backend, by route",
+    "katastar_retries_total": "Retried attempts, by phase",
+    "katastar_timeouts_total": "Waits that ran out of time, by phase",
+    "katastar_cache_lookups_total": "Result cache lookups, by result",
+    "katastar_jobs_total": "Finished jobs, by outcome",
+    "katastar_requeued_total": "Parcels sent back to the queue after a portal timeout",
+    "katastar_throttle_events_total": "Congestion signals seen by the adaptive scheduler, by signal",
+    "katastar_circuit_opened_total": "Times the circuit breaker opened",
+    "katastar_concurrency_limit": "Current AIMD concurrency limit",
+    "katastar_holder_lookups_total": "Right-holder lookups in incremental refresh, reused from the snapshot or fetched",
+    "katastar_coalesced_total": "Parcels answered by another caller's scrape, in flight or just finished",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms with Prometheus text rendering."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [bucket counts..., count, sum, max]
+        self._histograms: Dict[str, Dict[Labels, list]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+            n = len(self.buckets)
+            state[n] += 1
+            state[n + 1] += seconds
+            state[n + 2] = max(state[n + 2], seconds)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        n = len(self.buckets)
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, state in sorted(series.items()):
+                    for bound, count in zip(self.buckets, state[:n]):
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', repr(bound)))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {state[n]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {state[n]}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {state[n + 1]:.6f}")
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """{"phases": {phase: {count, total, mean, max}}, "counters": {name: {label values: value}}}"""
+        n = len(self.buckets)
+        with self._lock:
+            phases = {}
+            for labels, state in self._histograms.get("katastar_phase_seconds", {}).items():
+                count, total, peak = state[n], state[n + 1], state[n + 2]
+                phases[dict(labels).get("phase", "")] = {
+                    "count": count, "total": total, "mean": total / count if count else 0.0, "max": peak}
+            counters = {name: {",".join(v for _, v in labels): value for labels, value in series.items()}
+                        for name, series in self._counters.items()}
+        return {"phases": phases, "counters": counters}
+
+
+METRICS = Metrics()
+
+
+class JobProfile:
+    """What one job (a region group on one worker thread) spent its time on."""
+
+    def __init__(self, **fields):
+        self.fields = fields
+        self.started = time.perf_counter()
+        self.phases: Dict[str, list] = {}      # phase -> [count, seconds]
+        self.commands: Dict[str, int] = {}
+        self.command_seconds = 0.0
+        self.retries: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.cache = {"hit": 0, "miss": 0}
+        self._lock = threading.Lock()
+
+    def add_phase(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def add(self, bucket: str, key: str, seconds: float = 0.0):
+        with self._lock:
+            counts = getattr(self, bucket)
+            counts[key] = counts.get(key, 0) + 1
+            if bucket == "commands":
+                self.command_seconds += seconds
+
+    def command_count(self) -> int:
+        """WebDriver commands and HTTP requests recorded so far."""
+        with self._lock:
+            return sum(self.commands.values())
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                **self.fields,
+                "seconds": round(time.perf_counter() - self.started, 4),
+                "phases": {k: {"count": c, "seconds": round(s, 4)} for k, (c, s) in self.phases.items()},
+                "commands": dict(self.commands),
+                "command_seconds": round(self.command_seconds, 4),
+                "retries": dict(self.retries),
+                "timeouts": dict(self.timeouts),
+                "cache": dict(self.cache),
+            }
+
+
+_local = threading.local()
+
+
+def current_profile() -> Optional[JobProfile]:
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def job_profile(**fields):
+    """
+    Collects everything recorded on this thread into a JobProfile and logs it
+    as JSON when the block ends. Nested calls reuse the outer profile.
+    """
+    outer = current_profile()
+    if outer is not None:
+        yield outer
+        return
+    profile = _local.profile = JobProfile(**fields)
+    try:
+        yield profile
+    finally:
+        _local.profile = None
+        data = profile.to_dict()
+        METRICS.observe("katastar_phase_seconds", data["seconds"], phase="job")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"event": "job", **data}, ensure_ascii=False, default=str))
+
+
+def bind(func):
+    """Wraps func so that, run on another thread, it records into the caller's current profile."""
+    profile = current_profile()
+
+    def bound(*args, **kwargs):
+        previous = current_profile()
+        _local.profile = profile
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.profile = previous
+    return bound
+
+
+@contextmanager
+def phase(name: str):
+    """Times the block as phase `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+def timed(name: str):
+    """Decorator form of phase()."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_phase(name: str, seconds: float):
+    METRICS.observe("katastar_phase_seconds", seconds, phase=name)
+    profile = current_profile()
+    if profile is not None:
+        profile.add_phase(name, seconds)
+
+
+def count_retry(phase_name: str):
+    METRICS.inc("katastar_retries_total", phase=phase_name)
+    profile = current_profile()
+    if profile is not None:
+        profile.add("retries", phase_name)
+
+
+def count_timeout(phase_name: str):
+    METRICS.inc("katastar_timeouts_total", phase=phase_name)
+    profile = current_profile()
+    if profile is not None:
+        profile.add("timeouts", phase_name)
+
+
+def count_cache(hit: bool):
+    result = "hit" if hit else "miss"
+    METRICS.inc("katastar_cache_lookups_total", result=result)
+    profile = current_profile()
+    if profile is not None:
+        profile.add("cache", result)
+
+
+def count_command(command: str, seconds: float):
+    METRICS.inc("katastar_webdriver_commands_total", command=command)
+    METRICS.inc("katastar_webdriver_command_seconds_total", seconds, command=command)
+    profile = current_profile()
+    if profile is not None:
+        profile.add("commands", command, seconds)
+
+
+def count_request(route: str, seconds: float):
+    """One JSON request of the http backend; counted with the WebDriver commands in the job profile."""
+    METRICS.inc("katastar_http_requests_total", route=route)
+    profile = current_profile()
+    if profile is not None:
+        profile.add("commands", f"GET {route}", seconds)
+
+
+def instrument_driver(driver):
+    """
+    Counts and times every WebDriver command the driver sends (find, click,
+    executeScript, get, ...) by wrapping its execute() on the instance.
+    """
+    if getattr(driver, "_katastar_instrumented", False):
+        return driver
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        started = time.perf_counter()
+        try:
+            return execute(driver_command, params)
+        finally:
+            count_command(driver_command, time.perf_counter() - started)
+
+    driver.execute = counted_execute
+    driver._katastar_instrumented = True
+    return driver
+
+
+def log_to(path: str):
+    """Appends the per-job JSON lines to `path` (one object per line)."""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+def format_summary(metrics: Metrics = METRICS) -> str:
+    """Human-readable table for the CLI's --profile."""
+    data = metrics.summary()
+    lines = ["", "Profile", "-------", f"{'phase':<22}{'count':>7}{'total s':>10}{'mean ms':>10}{'max ms':>10}"]
+    for name, s in sorted(data["phases"].items(), key=lambda kv: -kv[1]["total"]):
+        lines.append(f"{name:<22}{s['count']:>7}{s['total']:>10.2f}{s['mean'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}")
+
+    counters = data["counters"]
+    titles = [
+        ("katastar_webdriver_commands_total", "WebDriver commands"),
+        ("katastar_http_requests_total", "HTTP requests"),
+        ("katastar_retries_total", "Retries"),
+        ("katastar_timeouts_total", "Timeouts"),
+        ("katastar_cache_lookups_total", "Cache lookups"),
+        ("katastar_jobs_total", "Jobs"),
+        ("katastar_requeued_total", "Requeued parcels"),
+        ("katastar_throttle_events_total", "Throttle signals"),
+        ("katastar_holder_lookups_total", "Holder lookups"),
+        ("katastar_coalesced_total", "Coalesced parcels"),
+    ]
+    for name, title in titles:
+        series = counters.get(name)
+        if not series:
+            continue
+        total = sum(series.values())
+        top = ", ".join(f"{k}={v:g}" for k, v in sorted(series.items(), key=lambda kv: -kv[1])[:8])
+        lines.append(f"{title}: {total:g} ({top})")
+    return "\n".join(lines)
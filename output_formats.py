@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Output writers for region_results, selectable by format name.
+
+  - xlsx:    the styled hierarchical sheet (scrape_katastar.ExcelStreamWriter)
+  - jsonl:   one region entry per line, exactly as scraped (nested parcels and holders)
+  - csv:     the flat schema below, streamed row by row
+  - parquet: the flat schema below, written in row groups (needs pyarrow)
+
+The flat schema has one row per right-holder, repeating its parcel and region
+columns; a parcel without holders, or a region entry without parcels (the
+not-found notes), still gets one row with the missing columns empty.
+
+All writers share ExcelStreamWriter's interface, so callers can write entries
+as they arrive:
+
+    writer = open_writer("csv", "results.csv")   # or any binary file object
+    for entry in region_results:
+        writer.write_entry(entry)
+    writer.close()
+"""
+import csv
+import json
+from typing import Iterable, Iterator, List
+
+FORMATS = ("xlsx", "jsonl", "csv", "parquet")
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Flat column -> key in the parcel / holder dicts the scrapers produce
+PARCEL_COLUMNS = {
+    "property_sheet": "Имотен лист",
+    "parcel_number": "Број/дел",
+    "culture": "Култура",
+    "area_m2": "Површина m2",
+    "place": "Место",
+    "right": "Право",
+}
+HOLDER_COLUMNS = {
+    "holder_property_sheet": "Имотен лист",
+    "holder_name": "Име и презиме",
+    "holder_city": "Град",
+    "holder_street": "Улица",
+    "holder_number": "Број",
+    "holder_share": "Дел на посед",
+}
+FLAT_COLUMNS = (["input_region", "input_katastar", "input_parcel", "region_name"]
+                + list(PARCEL_COLUMNS) + list(HOLDER_COLUMNS) + ["note"])
+
+
+def flatten_entry(entry: dict) -> Iterator[dict]:
+    """One flat row per holder of every parcel in a region entry (see the module docstring)."""
+    base = {
+        "input_region": entry.get("input_region"),
+        "input_katastar": entry.get("input_katastar"),
+        "input_parcel": entry.get("input_parcel"),
+        "region_name": entry.get("region_name"),
+        "note": entry.get("note") or None,
+    }
+    empty_parcel = dict.fromkeys(PARCEL_COLUMNS)
+    empty_holder = dict.fromkeys(HOLDER_COLUMNS)
+    parcels = entry.get("parcels") or []
+    if not parcels:
+        yield {**base, **empty_parcel, **empty_holder}
+        return
+    for parcel in parcels:
+        parcel_cols = {col: parcel.get(key) for col, key in PARCEL_COLUMNS.items()}
+        holders = parcel.get("Носители на право") or []
+        if not holders:
+            yield {**base, **parcel_cols, **empty_holder}
+        for holder in holders:
+            yield {**base, **parcel_cols, **{col: holder.get(key) for col, key in HOLDER_COLUMNS.items()}}
+
+
+class _TextTarget:
+    """
+    UTF-8 text onto a path or a caller's binary file object (left open on close).
+    Encodes by hand rather than with io.TextIOWrapper, which older SpooledTemporaryFiles don't support.
+    """
+
+    def __init__(self, target):
+        self._owned = isinstance(target, (str, bytes)) or hasattr(target, "__fspath__")
+        self._raw = open(target, "wb") if self._owned else target
+
+    def write(self, text: str):
+        self._raw.write(text.encode("utf-8"))
+
+    def flush(self):
+        self._raw.flush()
+
+    def close(self):
+        if self._owned:
+            self._raw.close()
+        else:
+            self._raw.flush()
+
+
+class JsonlWriter:
+    """One JSON object per region entry, written as it arrives."""
+
+    def __init__(self, target):
+        self._out = _TextTarget(target)
+        self.rows_written = 0
+
+    def write_entry(self, entry: dict):
+        self._out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.rows_written += 1
+
+    def flush(self):
+        """Pushes what was written so far to the file (readers can tail it)."""
+        self._out.flush()
+
+    def close(self):
+        self._out.close()
+
+
+class CsvWriter:
+    """FLAT_COLUMNS as CSV with a header row (UTF-8, RFC 4180 quoting)."""
+
+    def __init__(self, target):
+        self._out = _TextTarget(target)
+        self._csv = csv.DictWriter(self._out, fieldnames=FLAT_COLUMNS)
+        self._csv.writeheader()
+        self.rows_written = 0
+
+    def write_entry(self, entry: dict):
+        for row in flatten_entry(entry):
+            self._csv.writerow(row)
+            self.rows_written += 1
+
+    def flush(self):
+        """Pushes what was written so far to the file (readers can tail it)."""
+        self._out.flush()
+
+    def close(self):
+        self._out.close()
+
+
+class ParquetWriter:
+    """
+    FLAT_COLUMNS as a Parquet file of nullable string columns, written in row
+    groups of `row_group_size` rows so memory stays bounded.
+    """
+
+    def __init__(self, target, row_group_size: int = 50000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from None
+        self._pa = pa
+        self.schema = pa.schema([(name, pa.string()) for name in FLAT_COLUMNS])
+        self._writer = pq.ParquetWriter(target, self.schema, compression="snappy")
+        self.row_group_size = row_group_size
+        self._rows: List[dict] = []
+        self.rows_written = 0
+
+    def write_entry(self, entry: dict):
+        for row in flatten_entry(entry):
+            self._rows.append({k: None if v is None else str(v) for k, v in row.items()})
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self.schema))
+            self.rows_written += len(self._rows)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def open_writer(fmt: str, target):
+    """Writer for `fmt` (one of FORMATS) onto a path or a writable binary file object."""
+    if fmt == "xlsx":
+        from scrape_katastar import ExcelStreamWriter
+        return ExcelStreamWriter(target)
+    if fmt == "jsonl":
+        return JsonlWriter(target)
+    if fmt == "csv":
+        return CsvWriter(target)
+    if fmt == "parquet":
+        return ParquetWriter(target)
+    raise ValueError(f"Unknown output format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def write_results(region_results: Iterable[dict], target, fmt: str = "xlsx"):
+    """Writes all region entries to `target` in `fmt`."""
+    writer = open_writer(fmt, target)
+    try:
+        for entry in region_results:
+            writer.write_entry(entry)
+    finally:
+        writer.close()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Job planner: groups (region, katastar_region, parcel) jobs so that each cadastral
+municipality is selected once and all of its parcels are scraped in the same
+browser session.
+
+    groups = plan_jobs(jobs)
+    ... scrape each group -> {parcel: region_results} ...
+    per_job = fan_out(jobs, groups, group_results)   # back in input order
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+Job = Tuple[str, Optional[str], str]
+
+
+@dataclass
+class RegionGroup:
+    """All distinct parcels asked for under one (region, katastar_region) pair."""
+    region: str
+    katastar_region: Optional[str]
+    parcels: List[str] = field(default_factory=list)
+    # Indexes into the original job list, for fanning results back out
+    job_indexes: List[int] = field(default_factory=list)
+
+    @property
+    def key(self) -> Tuple[str, Optional[str]]:
+        return self.region, self.katastar_region
+
+
+def plan_jobs(jobs: List[Job], max_parcels_per_group: Optional[int] = 25) -> List[RegionGroup]:
+    """
+    Groups jobs by (region, katastar_region) in first-seen order and dedupes parcels.
+    Large groups are split into chunks of `max_parcels_per_group` parcels so that
+    parallel workers can share one busy municipality.
+    """
+    by_key: Dict[Tuple[str, Optional[str]], RegionGroup] = {}
+    for index, (region, katastar_region, parcel) in enumerate(jobs):
+        group = by_key.get((region, katastar_region))
+        if group is None:
+            group = by_key[(region, katastar_region)] = RegionGroup(region, katastar_region)
+        if parcel not in group.parcels:
+            group.parcels.append(parcel)
+        group.job_indexes.append(index)
+
+    if not max_parcels_per_group:
+        return list(by_key.values())
+
+    groups: List[RegionGroup] = []
+    for group in by_key.values():
+        for start in range(0, len(group.parcels), max_parcels_per_group):
+            chunk = group.parcels[start:start + max_parcels_per_group]
+            wanted = set(chunk)
+            groups.append(RegionGroup(
+                group.region, group.katastar_region, chunk,
+                [i for i in group.job_indexes if jobs[i][2] in wanted]))
+    return groups
+
+
+def fan_out(jobs: List[Job], groups: List[RegionGroup],
+            group_results: List[Optional[Dict[str, List[dict]]]]) -> List[Optional[List[dict]]]:
+    """
+    Maps each group's {parcel: region_results} back onto the original job order.
+    Duplicate jobs get their own copy of the entries so later edits don't alias.
+    Jobs of groups that never ran (results None) stay None.
+    """
+    per_job: List[Optional[List[dict]]] = [None] * len(jobs)
+    for group, results in zip(groups, group_results):
+        if results is None:
+            continue
+        for index in group.job_indexes:
+            per_job[index] = [dict(entry) for entry in results[jobs[index][2]]]
+    return per_job
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Event-driven readiness checks for the portal's MUI frontend.
+
+Instead of fixed sleeps and blanket 20 s WebDriverWaits, the page is instrumented
+with a tiny tracker (in-flight XHR/fetch count plus last network/DOM activity time),
+and waits run as a single async script that resolves on the first matching DOM
+mutation, on "network settled with nothing rendered", or on timeout.
+
+Timeouts themselves adapt: LatencyTracker keeps recent latencies per phase and
+derives the timeout from their p95, so a healthy portal fails fast on genuinely
+missing parcels while a slow one gets more room.
+"""
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import count_timeout
+
+
+# Wraps XHR/fetch and observes DOM mutations; marks itself early=true when it ran
+# before the app's own scripts (installed through CDP on every new document).
+# `started` counts every request ever begun, so a wait can tell whether one began after it did.
+TRACKER_JS = """
+(function (early) {
+  if (window.__katastarNet) { return; }
+  var net = window.__katastarNet = {pending: 0, started: 0, last: Date.now(), early: !!early};
+  function begin() { net.pending++; net.started++; net.last = Date.now(); }
+  function end() { net.pending = Math.max(0, net.pending - 1); net.last = Date.now(); }
+  var send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    begin();
+    this.addEventListener('loadend', end);
+    return send.apply(this, arguments);
+  };
+  if (window.fetch) {
+    var origFetch = window.fetch;
+    window.fetch = function () {
+      begin();
+      return origFetch.apply(this, arguments).then(
+        function (r) { end(); return r; },
+        function (e) { end(); throw e; });
+    };
+  }
+  function observe() {
+    new MutationObserver(function () { net.last = Date.now(); })
+      .observe(document.documentElement, {childList: true, subtree: true});
+  }
+  if (document.documentElement) { observe(); }
+  else { document.addEventListener('DOMContentLoaded', observe); }
+})(%s);
+"""
+
+# arguments: [[selector, label], ...], timeoutMs, quietMs, since, callback
+# Resolves with the label of the first selector present, 'settled' once at least one
+# XHR/fetch started after `since` (network_mark() taken before typing; null: when the
+# wait began), all of them finished and network and DOM have been quiet for quietMs
+# (only if the tracker ran early), or 'timeout'. Quiet without any new request is not
+# 'settled': a debounced autocomplete may simply not have fired yet.
+WAIT_JS = """
+var checks = arguments[0], timeoutMs = arguments[1], quietMs = arguments[2], since = arguments[3];
+var done = arguments[arguments.length - 1];
+var start = Date.now(), finished = false, observer = null, timer = null;
+var startedBefore = since !== null ? since : (window.__katastarNet ? window.__katastarNet.started : 0);
+function finish(v) {
+  if (finished) { return; }
+  finished = true;
+  if (observer) { observer.disconnect(); }
+  clearInterval(timer);
+  done(v);
+}
+function evaluate() {
+  for (var i = 0; i < checks.length; i++) {
+    if (document.querySelector(checks[i][0])) { return finish(checks[i][1]); }
+  }
+  var net = window.__katastarNet;
+  var now = Date.now();
+  if (quietMs && net && net.early && net.started > startedBefore && net.pending === 0 &&
+      now - net.last >= quietMs) {
+    return finish('settled');
+  }
+  if (now - start >= timeoutMs) { finish('timeout'); }
+}
+observer = new MutationObserver(evaluate);
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+timer = setInterval(evaluate, 50);
+evaluate();
+"""
+
+# Quiet period after the last request finished (and the DOM stopped changing) before a wait settles
+DEFAULT_QUIET_MS = 400
+
+
+def install_network_tracker(driver, max_wait: float = 30.0):
+    """
+    Registers the tracker for every future document (CDP, Chrome only) and
+    installs it into the current one. Safe to call more than once.
+    Also raises the async script timeout so wait_for_any() can wait up to `max_wait`.
+    """
+    driver.set_script_timeout(max_wait + 5)
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": TRACKER_JS % "true"})
+    except Exception:
+        pass  # not a Chromium driver; the late tracker below still helps
+    try:
+        driver.execute_script(TRACKER_JS % "false")
+    except Exception:
+        pass
+
+
+def network_mark(driver) -> Optional[int]:
+    """
+    How many requests the page has started so far. Take it before typing and pass it
+    to wait_for_any(since=...) so a request fired while the keys were sent still counts.
+    """
+    try:
+        return driver.execute_script("return window.__katastarNet ? window.__katastarNet.started : 0;")
+    except Exception:
+        return None
+
+
+def wait_for_any(driver, checks: Sequence[Tuple[str, str]], timeout: float,
+                 quiet_ms: int = DEFAULT_QUIET_MS, phase: str = "wait", since: Optional[int] = None) -> str:
+    """
+    Blocks (in one WebDriver round-trip) until one of `checks` [(css selector, label), ...]
+    is present, returning its label; 'settled' if a request made after `since` (a
+    network_mark(); by default when the wait began) finished and the page went quiet
+    without any of them; 'timeout' otherwise, also when no request was made at all, so
+    callers retry instead of reporting "not found". Timeouts are counted in metrics under `phase`.
+    """
+    from selenium.common.exceptions import TimeoutException
+
+    try:
+        state = driver.execute_async_script(WAIT_JS, [list(c) for c in checks], int(timeout * 1000), quiet_ms,
+                                            since)
+    except TimeoutException:
+        state = "timeout"
+    if state == "timeout":
+        count_timeout(phase)
+    return state
+
+
+class LatencyTracker:
+    """
+    Rolling latency samples per phase; timeout(phase) = clamp(p95 * factor, min, max),
+    or `default` until `min_samples` observations exist.
+    """
+
+    def __init__(self, default: float = 20.0, minimum: float = 2.0, maximum: float = 30.0,
+                 factor: float = 3.0, window: int = 200, min_samples: int = 10):
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(phase, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, phase: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples: List[float] = sorted(self._samples.get(phase, ()))
+        if not samples:
+            return None
+        return samples[int(round(q * (len(samples) - 1)))]
+
+    def timeout(self, phase: str, attempt: int = 1) -> float:
+        """Timeout for `phase`; doubles for every retry so transient slowness is not fatal."""
+        with self._lock:
+            count = len(self._samples.get(phase, ()))
+        if count < self.min_samples:
+            base = self.default
+        else:
+            base = min(self.maximum, max(self.minimum, self.percentile(phase, 0.95) * self.factor))
+        return min(self.maximum, base * (2 ** (attempt - 1)))
+
+
+# Shared by all drivers in the process: they all talk to the same portal
+LATENCY = LatencyTracker()
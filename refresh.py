@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Incremental refresh: re-check a known list of parcels cheaply.
+
+The last result for every (region suggestion, parcel) is kept as a snapshot. On a
+refresh the scrapers still read each parcels table, but they open the right-holders
+view only for rows that are new or changed: a row whose table columns (Имотен лист,
+Број/дел, Култура, Површина m2, Место, Право) fingerprint the same as in the snapshot
+keeps the snapshot's holders. A holder change that leaves every table column as it
+was therefore goes unnoticed until the row changes (or a run without --incremental).
+
+    snapshots = SnapshotStore("katastar_snapshots.sqlite3")
+    backend = get_backend("http", snapshots=snapshots)      # or selenium
+    for job, region_results in ...:
+        for change in snapshots.update(job, region_results):
+            report.write(change)
+
+Unlike the result cache, snapshots never expire: they are the baseline the next
+run is compared with.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import METRICS
+from scrape_katastar import PARCEL_FIELDS
+
+Job = Tuple[str, Optional[str], str]
+
+DEFAULT_SNAPSHOT_PATH = "katastar_snapshots.sqlite3"
+
+# The parcels table columns and the row key that identifies a row across runs
+ROW_FIELDS = PARCEL_FIELDS
+ROW_KEY = "Број/дел"
+HOLDERS = "Носители на право"
+
+NEW = "new"
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+GONE = "gone"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    region_name  TEXT NOT NULL,
+    parcel       TEXT NOT NULL,
+    fingerprint  TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    checked_at   REAL NOT NULL,
+    changed_at   REAL NOT NULL,
+    PRIMARY KEY (region_name, parcel)
+);
+"""
+
+
+def row_fingerprint(row: dict) -> str:
+    """Hash of a parcels table row's columns (holders excluded)."""
+    values = [str(row.get(field) or "").strip() for field in ROW_FIELDS]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def table_fingerprint(rows: List[dict]) -> str:
+    """Order-independent hash of a whole parcels table."""
+    return hashlib.sha1("".join(sorted(row_fingerprint(r) for r in rows)).encode("ascii")).hexdigest()
+
+
+def count_holder_lookup(reused: bool):
+    METRICS.inc("katastar_holder_lookups_total", result="reused" if reused else "fetched")
+
+
+class SnapshotStore:
+    """
+    The last stored parcels table per (region suggestion, parcel), with its table
+    fingerprint and when it was last checked and last changed. known_holders() feeds
+    the scrapers, update() diffs a fresh result against it and replaces it.
+    """
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, region_name: str, parcel: str) -> Optional[dict]:
+        """The stored {"parcels": [...], ["note"]} for a region suggestion and parcel, or None."""
+        stored = self._stored(region_name, parcel)
+        return None if stored is None else json.loads(stored[1])
+
+    def _stored(self, region_name: str, parcel: str) -> Optional[Tuple[str, str]]:
+        """(table fingerprint, payload JSON) as stored, or None."""
+        with self._lock:
+            return self._conn.execute("SELECT fingerprint, payload FROM snapshots WHERE region_name = ? AND parcel = ?",
+                                      (region_name, parcel)).fetchone()
+
+    def known_holders(self, region_name: str, parcel: str) -> Callable[[dict], Optional[List[dict]]]:
+        """
+        For the scrapers: maps a freshly read table row to the holders the snapshot
+        has for an identical row, or None if the row is new or changed.
+        """
+        snapshot = self.get(region_name, parcel)
+        by_fingerprint: Dict[str, List[dict]] = {}
+        for row in (snapshot or {}).get("parcels", []):
+            if HOLDERS in row:
+                by_fingerprint[row_fingerprint(row)] = row[HOLDERS]
+
+        def lookup(row: dict) -> Optional[List[dict]]:
+            holders = by_fingerprint.get(row_fingerprint(row))
+            count_holder_lookup(holders is not None)
+            return None if holders is None else [dict(h) for h in holders]
+        return lookup
+
+    def update(self, job: Job, region_results: List[dict]) -> List[dict]:
+        """
+        Compares a job's fresh region_results with the snapshots, stores them as the
+        new snapshots and returns one change record per region suggestion entry:
+
+            {"input_region", "input_katastar", "input_parcel", "region_name",
+             "status": new|unchanged|changed|gone, "added": [rows], "removed": [rows],
+             "modified": [{"key", "before", "after"}], "holders_changed": [keys], "note"}
+
+        Placeholder entries ("(error)", "(timeout)", ...) are reported but never stored.
+        """
+        region, katastar_region, parcel = job
+        changes = []
+        now = time.time()
+        for entry in region_results:
+            name = entry.get("region_name") or ""
+            change = {"input_region": region, "input_katastar": katastar_region, "input_parcel": parcel,
+                      "region_name": name, "status": UNCHANGED, "added": [], "removed": [], "modified": [],
+                      "holders_changed": [], "note": entry.get("note")}
+            changes.append(change)
+            if name.startswith("("):
+                change["status"] = None  # nothing was compared
+                continue
+            rows = entry.get("parcels") or []
+            payload = {"parcels": rows}
+            if entry.get("note"):
+                payload["note"] = entry["note"]
+            fingerprint = table_fingerprint(rows)
+            text = json.dumps(payload, ensure_ascii=False)
+
+            stored = self._stored(name, parcel)
+            if stored is None:
+                change["status"] = NEW
+                change["added"] = [_table_columns(r) for r in rows]
+            elif stored[0] == fingerprint:
+                # Same table columns row for row: only the holders can differ, and only if the payload does
+                if stored[1] != text:
+                    old = {str(r.get(ROW_KEY)): r.get(HOLDERS) for r in json.loads(stored[1]).get("parcels") or []}
+                    change["holders_changed"] = [str(r.get(ROW_KEY)) for r in rows
+                                                 if old.get(str(r.get(ROW_KEY))) != r.get(HOLDERS)]
+                    if change["holders_changed"]:
+                        change["status"] = CHANGED
+            else:
+                before = json.loads(stored[1])
+                _diff(before.get("parcels") or [], rows, change)
+                if rows or before.get("parcels"):
+                    if not rows:
+                        change["status"] = GONE
+                    elif change["added"] or change["removed"] or change["modified"] or change["holders_changed"]:
+                        change["status"] = CHANGED
+
+            with self._lock:
+                changed = change["status"] in (NEW, CHANGED, GONE)
+                self._conn.execute(
+                    "INSERT INTO snapshots (region_name, parcel, fingerprint, payload, checked_at, changed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (region_name, parcel) DO UPDATE SET "
+                    "fingerprint = excluded.fingerprint, payload = excluded.payload, "
+                    "checked_at = excluded.checked_at, "
+                    "changed_at = CASE WHEN ? THEN excluded.changed_at ELSE snapshots.changed_at END",
+                    (name, parcel, fingerprint, text, now, now, changed))
+                self._conn.commit()
+        return changes
+
+
+def _table_columns(row: dict) -> dict:
+    return {field: row.get(field) for field in ROW_FIELDS}
+
+
+def _diff(before: List[dict], after: List[dict], change: dict):
+    """Fills added/removed/modified/holders_changed, matching rows by Број/дел."""
+    old = {str(r.get(ROW_KEY)): r for r in before}
+    new = {str(r.get(ROW_KEY)): r for r in after}
+    for key, row in new.items():
+        previous = old.get(key)
+        if previous is None:
+            change["added"].append(_table_columns(row))
+        elif row_fingerprint(previous) != row_fingerprint(row):
+            change["modified"].append({"key": key, "before": _table_columns(previous), "after": _table_columns(row)})
+        elif previous.get(HOLDERS) != row.get(HOLDERS):
+            change["holders_changed"].append(key)
+    change["removed"] = [_table_columns(row) for key, row in old.items() if key not in new]
+
+
+class ChangeReport:
+    """Change records as JSON lines, only the entries that are not unchanged (unless `include_unchanged`)."""
+
+    def __init__(self, path: str, include_unchanged: bool = False):
+        self._file = open(path, "w", encoding="utf-8")
+        self.include_unchanged = include_unchanged
+        self.counts: Dict[str, int] = {}
+
+    def write(self, change: dict):
+        status = change["status"] or "skipped"
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status != UNCHANGED or self.include_unchanged:
+            self._file.write(json.dumps(change, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+    def summary(self) -> str:
+        return ", ".join(f"{count} {status}" for status, count in sorted(self.counts.items())) or "nothing checked"
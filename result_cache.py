@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed cache of scrape results.
+
+Two tables:
+  - suggestions: region text -> the region suggestion texts the portal offered
+  - parcels:     (region suggestion text, parcel) -> parcel rows with their holders (or the not-found note)
+
+With both cached, scrape_katastar() can rebuild a job's region_results without a browser.
+Entries expire after `ttl` seconds; when the parcels table grows past `max_bytes`
+the least recently used entries are evicted.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+
+DEFAULT_CACHE_PATH = "katastar_cache.sqlite3"
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suggestions (
+    region     TEXT PRIMARY KEY,
+    names      TEXT NOT NULL,
+    stored_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parcels (
+    region_name  TEXT NOT NULL,
+    parcel       TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    stored_at    REAL NOT NULL,
+    accessed_at  REAL NOT NULL,
+    PRIMARY KEY (region_name, parcel)
+);
+CREATE INDEX IF NOT EXISTS parcels_accessed ON parcels (accessed_at);
+"""
+
+
+def _norm(s: str) -> str:
+    return s.strip().lower()
+
+
+class ResultCache:
+    """
+    Thread-safe; one connection guarded by a lock is plenty for the write rates a scraper produces.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _fresh_after(self) -> float:
+        return time.time() - self.ttl if self.ttl else float("-inf")
+
+    # -----------------------------
+    # Region suggestions
+    # -----------------------------
+    def get_suggestions(self, region: str) -> Optional[List[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT names FROM suggestions WHERE region = ? AND stored_at >= ?",
+                (region, self._fresh_after())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put_suggestions(self, region: str, names: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO suggestions (region, names, stored_at) VALUES (?, ?, ?)",
+                (region, json.dumps(names, ensure_ascii=False), time.time()))
+            self._conn.commit()
+
+    # -----------------------------
+    # Parcels + holders
+    # -----------------------------
+    def get_parcel(self, region_name: str, parcel: str) -> Optional[dict]:
+        """Returns {'parcels': [...]} or {'parcels': [], 'note': ...}, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM parcels WHERE region_name = ? AND parcel = ? AND stored_at >= ?",
+                (region_name, parcel, self._fresh_after())).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE parcels SET accessed_at = ? WHERE region_name = ? AND parcel = ?",
+                (now, region_name, parcel))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put_parcel(self, region_name: str, parcel: str, parcels: List[dict], note: Optional[str] = None):
+        payload = {"parcels": parcels}
+        if note:
+            payload["note"] = note
+        text = json.dumps(payload, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parcels (region_name, parcel, payload, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (region_name, parcel, text, len(text.encode("utf-8")), now, now))
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        self._conn.execute("DELETE FROM parcels WHERE stored_at < ?", (self._fresh_after(),))
+        self._conn.execute("DELETE FROM suggestions WHERE stored_at < ?", (self._fresh_after(),))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM parcels").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for region_name, parcel, size in self._conn.execute(
+                "SELECT region_name, parcel, size FROM parcels ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM parcels WHERE region_name = ? AND parcel = ?", (region_name, parcel))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    # -----------------------------
+    # Whole jobs
+    # -----------------------------
+    def lookup(self, region: str, parcel: str, katastar_region: Optional[str] = None) -> Optional[List[dict]]:
+        """
+        Rebuilds the region_results scrape_katastar() would return, or None if anything is missing.
+        Mirrors the branching (and notes) of the live scrape.
+        """
+        from scrape_katastar import _region_entry  # not at the top: scrape_katastar imports this module
+
+        names = self.get_suggestions(region)
+        if names is None:
+            return None
+
+        if not names:
+            return [_region_entry("(no suggestions)", region, katastar_region, parcel,
+                                  note=f"No region suggestions found for '{region}'.")]
+
+        if katastar_region:
+            target = _norm(katastar_region)
+            match = next((n for n in names if target in _norm(n)), None)
+            if match is None:
+                return [_region_entry(f"(no match among suggestions for '{region}')", region, katastar_region,
+                                      parcel, note=f"Katastar region '{katastar_region}' not found in suggestions.")]
+            names = [match]
+
+        region_results = []
+        for name in names:
+            cached = self.get_parcel(name, parcel)
+            if cached is None:
+                return None
+            e = _region_entry(name, region, katastar_region, parcel)
+            e.update(cached)
+            region_results.append(e)
+        return region_results
+
+    def store(self, parcel: str, region_results: List[dict]):
+        """Caches every real region suggestion entry of a freshly scraped job."""
+        for e in region_results:
+            name = e.get("region_name") or ""
+            if name.startswith("("):
+                continue  # placeholder rows ("(no suggestions)", "(error)", ...) are not per-suggestion data
+            self.put_parcel(name, parcel, e.get("parcels", []), e.get("note"))
@@ -1,84 +1,123 @@
 #!/usr/bin/env python3
 import sys
 import argparse
+import itertools
+import os
 import re
-from typing import List, Tuple, Optional
-
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
+from typing import Dict, Iterator, List, Tuple, Optional
 import time
 
-from webdriver_manager.chrome import ChromeDriverManager
-
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+# selenium and openpyxl are imported where they are used, so reading input files,
+# the queue/search subcommands and the HTTP backend start without loading them
+from driver_pool import DriverPool, PORTAL_URL, get_default_pool, close_default_pool, open_tab
+from result_cache import ResultCache
+from metrics import count_cache, count_retry, phase, timed
+from readiness import LATENCY, network_mark, wait_for_any
+from throttle import PortalTimeoutError
 
 
 # -----------------------------
 # Selenium helpers
 # -----------------------------
-def get_region_suggestions(driver, wait, region_text):
+REGION_INPUT_SELECTOR = "input[placeholder='Внеси катастарска општина']"
+PARCEL_INPUT_SELECTOR = "input[placeholder='Внеси парцела']"
+PARCEL_ROW_SELECTOR = "tr.parcels-table-body-row"
+# Rows not yet tagged by mark_parcel_rows_seen(), i.e. rendered for the current parcel
+FRESH_PARCEL_ROW_SELECTOR = "tr.parcels-table-body-row:not([data-katastar-seen])"
+REGION_OPTION_SELECTOR = "li[role='option']"
+PARCEL_OPTION_SELECTOR = ".MuiAutocomplete-popper [role='option']"
+NO_OPTIONS_SELECTOR = ".MuiAutocomplete-noOptions"
+
+
+@timed("region_autocomplete")
+def get_region_suggestions(driver, wait, region_text, attempts=2):
     """
     Types region_text into the 'Внеси катастарска општина' input and returns all visible suggestions <li role='option'>.
-    If none show up within timeout, returns [].
+    Returns [] as soon as the autocomplete says there are none (or the page settles
+    without any); raises PortalTimeoutError if nothing shows up within the adaptive timeout.
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
     region_input = wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "input[placeholder='Внеси катастарска општина']")))
+        (By.CSS_SELECTOR, REGION_INPUT_SELECTOR)))
     region_input.clear()
+    # Before typing: a portal without a debounce starts the lookup while the keys are sent
+    mark = network_mark(driver)
     region_input.send_keys(region_text)
 
-    try:
-        wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "li[role='option']")))
-    except TimeoutException:
+    started = time.monotonic()
+    for attempt in range(1, attempts + 1):
+        if attempt > 1:
+            count_retry("region_autocomplete")
+        state = wait_for_any(driver, [(REGION_OPTION_SELECTOR, "options"), (NO_OPTIONS_SELECTOR, "no-options")],
+                             LATENCY.timeout("region_autocomplete", attempt), phase="region_autocomplete",
+                             since=mark)
+        if state != "timeout":
+            break
+    if state == "timeout":
+        raise PortalTimeoutError(f"Region suggestions for '{region_text}' did not load in time")
+    if state != "options":
         return []
+    LATENCY.record("region_autocomplete", time.monotonic() - started)
 
-    return driver.find_elements(By.CSS_SELECTOR, "li[role='option']")
+    return driver.find_elements(By.CSS_SELECTOR, REGION_OPTION_SELECTOR)
 
-def select_parcel(driver, wait, parcel_text, attempts=3):
+def select_parcel(driver, wait, parcel_text, attempts=3, rows_selector=None):
     """
     Type parcel_text into 'Внеси парцела', then select a matching option from the MUI popper.
     Retries a few times because suggestions can be delayed/debounced.
     Returns True if a suggestion was selected or ENTER accepted; False otherwise.
+    rows_selector overrides which parcel rows count as "the table is there"
+    (used to ignore rows left over from the previous parcel in the same session).
+    """
+    return select_parcel_status(driver, wait, parcel_text, attempts, rows_selector) == "selected"
+
+
+@timed("parcel_select")
+def select_parcel_status(driver, wait, parcel_text, attempts=3, rows_selector=None) -> str:
     """
+    Same as select_parcel(), but tells the two kinds of failure apart:
+      'selected'   - the parcels table for parcel_text is on screen
+      'no-options' - the autocomplete settled with nothing to offer (the parcel does not exist)
+      'failed'     - nothing conclusive before the adaptive timeouts ran out
+    """
+    from selenium.common.exceptions import StaleElementReferenceException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support import expected_conditions as EC
+
+    rows_selector = rows_selector or PARCEL_ROW_SELECTOR
     for attempt in range(1, attempts + 1):
+        if attempt > 1:
+            count_retry("parcel_select")
         # Focus + type
         parcel_input = wait.until(EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, "input[placeholder='Внеси парцела']")))
+            (By.CSS_SELECTOR, PARCEL_INPUT_SELECTOR)))
         parcel_input.send_keys(Keys.CONTROL, "a")
         parcel_input.send_keys(Keys.DELETE)
+        mark = network_mark(driver)
         parcel_input.send_keys(parcel_text)
 
-        # Give MUI a breath to render the popper
-        time.sleep(0.25)
-
-        # Wait for the popper with options
-        try:
-            # The popper wrapper
-            popper = wait.until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, ".MuiAutocomplete-popper")))
-            # Now the listbox options inside the popper
-            options = wait.until(EC.presence_of_all_elements_located(
-                (By.CSS_SELECTOR, ".MuiAutocomplete-popper [role='option']")))
-        except TimeoutException:
+        # Wait for the popper options, the "no options" notice, or the page going quiet
+        started = time.monotonic()
+        state = wait_for_any(driver, [(PARCEL_OPTION_SELECTOR, "options"), (NO_OPTIONS_SELECTOR, "no-options")],
+                             LATENCY.timeout("parcel_autocomplete", attempt), phase="parcel_autocomplete",
+                             since=mark)
+        if state in ("no-options", "settled"):
+            return "no-options"
+        if state == "timeout":
             # Retry by clearing + retyping on next loop
             if attempt == attempts:
                 # last resort: press Enter and hope it accepts
                 parcel_input.send_keys(Keys.ENTER)
-                time.sleep(0.3)
                 # Check if we navigated to parcels page (table present)
-                try:
-                    wait.until(EC.presence_of_element_located(
-                        (By.CSS_SELECTOR, "tr.parcels-table-body-row")))
-                    return True
-                except TimeoutException:
-                    return False
+                state = wait_for_any(driver, [(rows_selector, "rows")], LATENCY.timeout("parcel_table", attempt),
+                                     phase="parcel_table")
+                return "selected" if state == "rows" else "failed"
             continue
+        LATENCY.record("parcel_autocomplete", time.monotonic() - started)
+        options = driver.find_elements(By.CSS_SELECTOR, PARCEL_OPTION_SELECTOR)
 
         # Pick the best option:
         # 1) exact or contains match (strip spaces), else just first option
@@ -96,6 +135,8 @@ def select_parcel(driver, wait, parcel_text, attempts=3):
 
         if chosen is None and options:
             chosen = options[0]
+        if chosen is None:
+            continue
 
         # Click via JS to avoid overlay issues
         try:
@@ -106,56 +147,229 @@ def select_parcel(driver, wait, parcel_text, attempts=3):
             parcel_input.send_keys(Keys.ENTER)
 
         # After selection, wait for parcels table to be present
-        try:
-            wait.until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "tr.parcels-table-body-row")))
-            return True
-        except TimeoutException:
-            # Maybe it didn’t take; try again
-            if attempt == attempts:
-                return False
-            time.sleep(0.3)
-
-    return False
-
+        started = time.monotonic()
+        state = wait_for_any(driver, [(rows_selector, "rows")], LATENCY.timeout("parcel_table", attempt),
+                             phase="parcel_table")
+        if state == "rows":
+            LATENCY.record("parcel_table", time.monotonic() - started)
+            return "selected"
+        # Maybe it didn’t take; try again
+
+    return "failed"
+
+
+PARCEL_FIELDS = ["Имотен лист", "Број/дел", "Култура", "Површина m2", "Место", "Право"]  # td[1..6]
+HOLDER_FIELDS = ["Имотен лист", "Име и презиме", "Град", "Улица", "Број", "Дел на посед"]  # td[0..5]
+HOLDER_TABLE_SELECTOR = "#right-holders-table-paper"
+HOLDER_ROW_SELECTOR = "#right-holders-table-paper tbody tr"
+
+# Every row's <td> texts in one round-trip (whitespace normalised like WebElement.text)
+TABLE_CELLS_JS = """
+return Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (row) {
+  return Array.prototype.map.call(row.querySelectorAll('td'), function (td) {
+    return (td.innerText || '').replace(/\\u00a0/g, ' ').trim();
+  });
+});
+"""
+
+# Scrolls to and clicks td[arguments[2]] of row arguments[1]; false if it is not there
+CLICK_ROW_CELL_JS = """
+var row = document.querySelectorAll(arguments[0])[arguments[1]];
+var cell = row && row.querySelectorAll('td')[arguments[2]];
+if (!cell) { return false; }
+cell.scrollIntoView({block: 'center'});
+cell.click();
+return true;
+"""
+
+
+def read_table(driver, row_selector: str, first_column: int, fields: List[str]) -> Optional[List[dict]]:
     """
-    Enters parcel_text into 'Внеси парцела', clicks a suggestion if present.
-    Returns True if a suggestion was clicked; otherwise False.
+    Reads a whole table with a single execute_script call.
+    Returns None if the markup no longer looks like we expect (so callers fall back to per-element reads).
     """
-    parcel_input = wait.until(EC.element_to_be_clickable(
-        (By.CSS_SELECTOR, "input[placeholder='Внеси парцела']")))
-    parcel_input.clear()
-    parcel_input.send_keys(parcel_text)
+    from selenium.common.exceptions import WebDriverException
 
     try:
-        wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "li[role='option']")))
-    except TimeoutException:
-        return False
+        rows = driver.execute_script(TABLE_CELLS_JS, row_selector)
+    except WebDriverException:
+        return None
+    if not isinstance(rows, list):
+        return None
+    result = []
+    for cells in rows:
+        if not isinstance(cells, list) or len(cells) < first_column + len(fields):
+            return None
+        result.append(dict(zip(fields, cells[first_column:first_column + len(fields)])))
+    return result
 
-    suggestions = driver.find_elements(By.CSS_SELECTOR, "li[role='option']")
-    chosen = None
-    for s in suggestions:
-        if parcel_text in s.text:
-            chosen = s
-            break
-    if chosen is None:
-        chosen = suggestions[0]
 
-    driver.execute_script("arguments[0].click();", chosen)
-    return True
+def _open_holders(driver, wait, original_handle):
+    """After clicking a parcel row: wait for the holders view, switching to its tab if it opened one."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
 
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, HOLDER_TABLE_SELECTOR)))
 
-def extract_parcel_and_holders(driver, wait):
+    if len(driver.window_handles) > 1:
+        for handle in driver.window_handles:
+            if handle != original_handle:
+                driver.switch_to.window(handle)
+                break
+
+    return wait.until(EC.presence_of_all_elements_located(
+        (By.CSS_SELECTOR, HOLDER_ROW_SELECTOR)))
+
+
+def _close_holders(driver, wait, original_handle):
+    """Returns from the holders view to the parcels table."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    if len(driver.window_handles) > 1:
+        driver.close()
+        driver.switch_to.window(original_handle)
+    else:
+        driver.back()
+    wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, PARCEL_ROW_SELECTOR)))
+
+
+def _holders_per_element(holder_rows) -> List[dict]:
+    from selenium.webdriver.common.by import By
+
+    holders = []
+    for hrow in holder_rows:
+        hc = hrow.find_elements(By.TAG_NAME, "td")
+        holders.append({
+            "Имотен лист": hc[0].text,
+            "Име и презиме": hc[1].text,
+            "Град": hc[2].text,
+            "Улица": hc[3].text,
+            "Број": hc[4].text,
+            "Дел на посед": hc[5].text,
+        })
+    return holders
+
+
+# Detail URL behind each parcel row (a link in the Имотен лист cell or a data-href), or null
+HOLDER_URLS_JS = """
+return Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (row) {
+  var cell = row.querySelectorAll('td')[1];
+  var link = (cell && cell.querySelector('a[href]')) || row.querySelector('a[href]');
+  if (link && link.href && link.href.indexOf('javascript:') !== 0) { return link.href; }
+  var href = row.getAttribute('data-href') || (cell && cell.getAttribute('data-href'));
+  return href ? new URL(href, location.href).href : null;
+});
+"""
+
+
+@timed("extract")
+def extract_parcel_and_holders(driver, wait, bulk=True, holder_tabs=6, known_holders=None):
     """
     On the parcel results page, extract the parcels table and for each parcel open the right-holders details.
     Returns a list of {parcel fields..., 'Носители на право': [holders...]} dicts.
+    With bulk=True each table is read with one execute_script call instead of a
+    round-trip per cell; if the markup doesn't match, the per-element path is used.
+    When the rows link to their holder pages, up to `holder_tabs` of them are loaded
+    side by side in background tabs instead of clicking in and navigating back per row;
+    rows whose tab doesn't show a holders table are still done by clicking.
+    known_holders(row) (see refresh.SnapshotStore) may supply a row's holders from an
+    earlier snapshot; only the rows it returns None for are opened.
     """
-    wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "tr.parcels-table-body-row")))
-    rows_count = len(driver.find_elements(By.CSS_SELECTOR, "tr.parcels-table-body-row"))
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, PARCEL_ROW_SELECTOR)))
+    parcels = read_table(driver, PARCEL_ROW_SELECTOR, 1, PARCEL_FIELDS) if bulk else None
+    if parcels is None:
+        return _extract_parcel_and_holders_per_element(driver, wait)
+
+    holders_by_row: Dict[int, List[dict]] = {}
+    if known_holders is not None:
+        for i, data in enumerate(parcels):
+            holders = known_holders(data)
+            if holders is not None:
+                holders_by_row[i] = holders
+    todo = [i for i in range(len(parcels)) if i not in holders_by_row]
+    if holder_tabs and holder_tabs > 1 and len(todo) > 1:
+        urls = driver.execute_script(HOLDER_URLS_JS, PARCEL_ROW_SELECTOR)
+        if isinstance(urls, list) and len(urls) == len(parcels) and all(urls):
+            opened = _holders_in_tabs(driver, wait, [urls[i] for i in todo], holder_tabs)
+            holders_by_row.update((todo[j], holders) for j, holders in opened.items())
+
+    for i, data in enumerate(parcels):
+        if i in holders_by_row:
+            data["Носители на право"] = holders_by_row[i]
+            continue
+
+        original_handle = driver.current_window_handle
+        if not driver.execute_script(CLICK_ROW_CELL_JS, PARCEL_ROW_SELECTOR, i, 1):
+            # The table changed under us; redo the whole table the slow, careful way
+            return _extract_parcel_and_holders_per_element(driver, wait)
+
+        with phase("holder_click"):
+            holder_rows = _open_holders(driver, wait, original_handle)
+            holders = read_table(driver, HOLDER_ROW_SELECTOR, 0, HOLDER_FIELDS)
+            data["Носители на право"] = holders if holders is not None else _holders_per_element(holder_rows)
+
+            _close_holders(driver, wait, original_handle)
+
+    return parcels
+
+
+@timed("holder_tabs")
+def _holders_in_tabs(driver, wait, urls: List[str], max_tabs: int) -> Dict[int, List[dict]]:
+    """
+    Loads holder pages in batches of `max_tabs` background tabs, all navigating at once,
+    then reads each tab's holders table. Returns {row index: holders} for the rows that worked.
+    """
+    from selenium.webdriver.common.by import By
+
+    original_handle = driver.current_window_handle
+    holders_by_row: Dict[int, List[dict]] = {}
+    try:
+        for start in range(0, len(urls), max_tabs):
+            opened = []
+            for i in range(start, min(start + max_tabs, len(urls))):
+                open_tab(driver)
+                # Assigning location returns immediately, so the tabs load concurrently
+                driver.execute_script("window.location.href = arguments[0];", urls[i])
+                opened.append((i, driver.current_window_handle))
+
+            for i, handle in opened:
+                driver.switch_to.window(handle)
+                state = wait_for_any(driver, [(HOLDER_ROW_SELECTOR, "rows")],
+                                     LATENCY.timeout("parcel_table", attempt=2), quiet_ms=0,
+                                     phase="holder_tab")
+                if state == "rows":
+                    holders = read_table(driver, HOLDER_ROW_SELECTOR, 0, HOLDER_FIELDS)
+                    if holders is None:
+                        holders = _holders_per_element(driver.find_elements(By.CSS_SELECTOR, HOLDER_ROW_SELECTOR))
+                    holders_by_row[i] = holders
+                driver.close()
+    finally:
+        for handle in driver.window_handles:
+            if handle != original_handle:
+                driver.switch_to.window(handle)
+                driver.close()
+        driver.switch_to.window(original_handle)
+    return holders_by_row
+
+
+def _extract_parcel_and_holders_per_element(driver, wait):
+    """
+    The original extraction: one WebDriver call per row and cell. Slower, but
+    tolerant of markup the bulk reader doesn't recognise.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, PARCEL_ROW_SELECTOR)))
+    rows_count = len(driver.find_elements(By.CSS_SELECTOR, PARCEL_ROW_SELECTOR))
     result = []
 
     for i in range(rows_count):
-        parcel_rows = driver.find_elements(By.CSS_SELECTOR, "tr.parcels-table-body-row")
+        parcel_rows = driver.find_elements(By.CSS_SELECTOR, PARCEL_ROW_SELECTOR)
         row = parcel_rows[i]
         cells = row.find_elements(By.TAG_NAME, "td")
 
@@ -172,37 +386,11 @@ def extract_parcel_and_holders(driver, wait):
         driver.execute_script("arguments[0].scrollIntoView({block:'center'});", cells[1])
         driver.execute_script("arguments[0].click();", cells[1])
 
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "#right-holders-table-paper")))
-
-        if len(driver.window_handles) > 1:
-            for handle in driver.window_handles:
-                if handle != original_handle:
-                    driver.switch_to.window(handle)
-                    break
-
-        holder_rows = wait.until(EC.presence_of_all_elements_located(
-            (By.CSS_SELECTOR, "#right-holders-table-paper tbody tr")))
-        holders = []
-        for hrow in holder_rows:
-            hc = hrow.find_elements(By.TAG_NAME, "td")
-            holders.append({
-                "Имотен лист": hc[0].text,
-                "Име и презиме": hc[1].text,
-                "Град": hc[2].text,
-                "Улица": hc[3].text,
-                "Број": hc[4].text,
-                "Дел на посед": hc[5].text,
-            })
-        data["Носители на право"] = holders
-
-        if len(driver.window_handles) > 1:
-            driver.close()
-            driver.switch_to.window(original_handle)
-        else:
-            driver.back()
+        holder_rows = _open_holders(driver, wait, original_handle)
+        data["Носители на право"] = _holders_per_element(holder_rows)
 
+        _close_holders(driver, wait, original_handle)
         result.append(data)
-        wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "tr.parcels-table-body-row")))
 
     return result
 
@@ -210,65 +398,81 @@ def extract_parcel_and_holders(driver, wait):
 # -----------------------------
 # Excel writer (single sheet, hierarchical)
 # -----------------------------
-def write_results_to_excel(region_results, filename="results.xlsx"):
+EXCEL_HEADER = [
+    "Input Region", "Input KatastarRegion (optional)", "Input Parcel",
+    "Kat. Odd. (Region Suggestion)",
+    "Имотен лист", "Број/дел", "Култура", "Површина m2", "Место", "Право",
+    "Име и презиме", "Град", "Улица", "Број", "Дел на посед",
+    "Note"
+]
+
+
+class ExcelStreamWriter:
     """
-    Single-sheet, hierarchical view with indentation and wrapping.
+    Single-sheet, hierarchical view with indentation and wrapping, written with a
+    write-only openpyxl workbook so memory stays flat however many rows there are.
     Region rows are bold and shaded; parcel rows indented; holder rows more indented.
-    Includes input_katastar and not-found messages.
+
+    Column widths are tracked as rows arrive. openpyxl has to emit them before the
+    first row, so the first `width_sample_rows` rows are held back; past that,
+    rows stream straight out and the widths are whatever the sample needed.
+
+        writer = ExcelStreamWriter("results.xlsx")   # or any binary file object
+        for entry in region_results:
+            writer.write_entry(entry)
+        writer.close()
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "results"
-
-    # Header row
-    ws.append([
-        "Input Region", "Input KatastarRegion (optional)", "Input Parcel",
-        "Kat. Odd. (Region Suggestion)",
-        "Имотен лист", "Број/дел", "Култура", "Површина m2", "Место", "Право",
-        "Име и презиме", "Град", "Улица", "Број", "Дел на посед",
-        "Note"
-    ])
-    header_font = Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.alignment = Alignment(wrap_text=True)
-
-    # Styles
-    region_font = Font(bold=True)
-    region_fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
-    region_alignment = Alignment(wrap_text=True)
-    parcel_alignment = Alignment(indent=1, wrap_text=True)
-    holder_alignment = Alignment(indent=2, wrap_text=True)
-
-    row_num = 2
-    for entry in region_results:
+
+    def __init__(self, target, width_sample_rows: int = 5000):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font, PatternFill
+
+        self.target = target
+        self.width_sample_rows = width_sample_rows
+        self.wb = Workbook(write_only=True)
+        self._cell_type = WriteOnlyCell
+        self.ws = self.wb.create_sheet("results")
+        self.widths = [0] * len(EXCEL_HEADER)
+        self._pending = []
+        self._streaming = False
+        self.rows_written = 0
+
+        # Styles
+        self.header_font = Font(bold=True)
+        self.header_alignment = Alignment(wrap_text=True)
+        self.region_font = Font(bold=True)
+        self.region_fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
+        self.region_alignment = Alignment(wrap_text=True)
+        self.parcel_alignment = Alignment(indent=1, wrap_text=True)
+        self.holder_alignment = Alignment(indent=2, wrap_text=True)
+
+        self._append(EXCEL_HEADER, "header")
+
+    def write_entry(self, entry: dict):
+        """Writes one region entry (its region row, then parcel and holder rows)."""
         region_name = entry["region_name"]
         input_region = entry.get("input_region")
-        input_katastar = entry.get("input_katastar")  # NEW
+        input_katastar = entry.get("input_katastar")
         input_parcel = entry.get("input_parcel")
         note = entry.get("note", "")
 
         # Region row
-        ws.append([
+        self._append([
             input_region, input_katastar, input_parcel,
             region_name,
             "", "", "", "", "", "",
             "", "", "", "", "",
             note
-        ])
-        for cell in ws[row_num]:
-            cell.font = region_font
-            cell.fill = region_fill
-            cell.alignment = region_alignment
-        row_num += 1
+        ], "region")
 
         # If we had a "not found" case for this region suggestion, no parcels
         if note:
-            continue
+            return
 
         # Parcel rows + holders
         for parcel in entry["parcels"]:
-            ws.append([
+            self._append([
                 "", "", "",      # keep region context empty, use indent
                 "",              # region suggestion column empty for parcel rows
                 parcel["Имотен лист"],
@@ -279,14 +483,10 @@ def write_results_to_excel(region_results, filename="results.xlsx"):
                 parcel["Право"],
                 "", "", "", "", "",  # holder columns empty for parcel line
                 ""
-            ])
-            # Indent the first 10 columns of the parcel row
-            for cell in ws[row_num][0:10]:
-                cell.alignment = parcel_alignment
-            row_num += 1
+            ], "parcel")
 
             for holder in parcel["Носители на право"]:
-                ws.append([
+                self._append([
                     "", "", "", "",  # keep context empty
                     "", "", "", "", "", "",  # parcel columns empty for holder line
                     holder["Име и презиме"],
@@ -295,30 +495,82 @@ def write_results_to_excel(region_results, filename="results.xlsx"):
                     holder["Број"],
                     holder["Дел на посед"],
                     ""
-                ])
-                for cell in ws[row_num]:
-                    cell.alignment = holder_alignment
-                row_num += 1
-
-    # Autosize columns
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            if cell.value:
-                text = str(cell.value)
-                # For wrapped cells, a reasonable width; still base on longest line
-                longest_line = max(len(line) for line in text.splitlines())
-                max_length = max(max_length, longest_line)
-        ws.column_dimensions[column].width = min(max_length + 2, 60)  # cap width to keep sheet readable
-
-    wb.save(filename)
+                ], "holder")
+
+    def close(self):
+        if not self._streaming:
+            self._start_streaming()
+        self.wb.save(self.target)
+
+    def _append(self, values, kind: str):
+        if not self._streaming:
+            # Longest line per column; wrapped cells are sized by their longest line
+            for i, value in enumerate(values):
+                if value:
+                    longest_line = max(len(line) for line in str(value).splitlines())
+                    if longest_line > self.widths[i]:
+                        self.widths[i] = longest_line
+            self._pending.append((values, kind))
+            if len(self._pending) >= self.width_sample_rows:
+                self._start_streaming()
+        else:
+            self._write_row(values, kind)
+
+    def _start_streaming(self):
+        from openpyxl.utils import get_column_letter
+
+        for i, width in enumerate(self.widths):
+            # cap width to keep sheet readable
+            self.ws.column_dimensions[get_column_letter(i + 1)].width = min(width + 2, 60)
+        self._streaming = True
+        pending, self._pending = self._pending, []
+        for values, kind in pending:
+            self._write_row(values, kind)
+
+    def _write_row(self, values, kind: str):
+        if kind == "header":
+            cells = [self._cell(v, font=self.header_font, alignment=self.header_alignment) for v in values]
+        elif kind == "region":
+            cells = [self._cell(v, font=self.region_font, fill=self.region_fill, alignment=self.region_alignment)
+                     for v in values]
+        elif kind == "parcel":
+            # Indent the first 10 columns of the parcel row
+            cells = [self._cell(v, alignment=self.parcel_alignment) if i < 10 else v for i, v in enumerate(values)]
+        else:
+            cells = [self._cell(v, alignment=self.holder_alignment) for v in values]
+        self.ws.append(cells)
+        self.rows_written += 1
+
+    def _cell(self, value, font=None, fill=None, alignment=None):
+        cell = self._cell_type(self.ws, value=value)
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        if alignment is not None:
+            cell.alignment = alignment
+        return cell
+
+
+def write_results_to_excel(region_results, filename="results.xlsx"):
+    """
+    Single-sheet, hierarchical view with indentation and wrapping.
+    Region rows are bold and shaded; parcel rows indented; holder rows more indented.
+    Includes input_katastar and not-found messages.
+    `filename` may also be a writable binary file object (e.g. a SpooledTemporaryFile).
+    """
+    writer = ExcelStreamWriter(filename)
+    for entry in region_results:
+        writer.write_entry(entry)
+    writer.close()
 
 
 # -----------------------------
 # Core scrape flow (with optional katastar region)
 # -----------------------------
-def scrape_katastar(region: str, parcel: str, katastar_region: Optional[str] = None):
+def scrape_katastar(region: str, parcel: str, katastar_region: Optional[str] = None,
+                    pool: Optional[DriverPool] = None, cache: Optional[ResultCache] = None,
+                    refresh: bool = False, holder_tabs: int = 6):
     """
     - If katastar_region is provided:
         * Type only 'region' to get suggestions.
@@ -326,123 +578,233 @@ def scrape_katastar(region: str, parcel: str, katastar_region: Optional[str] = N
         * If none match, return a single entry with a 'note' explaining not found.
     - If katastar_region is NOT provided:
         * Iterate all suggestions (existing behavior) and scrape each.
+    The browser is borrowed from `pool` (the shared default pool if None) and
+    handed back already sitting on the portal home page.
+    With a `cache`, a job whose suggestions and parcels are all cached is answered
+    without touching a browser; refresh=True skips the lookup but still stores the result.
+    holder_tabs is passed to extract_parcel_and_holders() (0 or 1 disables parallel holder tabs).
     """
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--window-size=1920,1080")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-    wait = WebDriverWait(driver, 20)
+    return scrape_region_group(region, [parcel], katastar_region=katastar_region,
+                               pool=pool, cache=cache, refresh=refresh, holder_tabs=holder_tabs)[parcel]
+
 
-    region_results = []
+def scrape_region_group(region: str, parcels: List[str], katastar_region: Optional[str] = None,
+                        pool: Optional[DriverPool] = None, cache: Optional[ResultCache] = None,
+                        refresh: bool = False, holder_tabs: int = 6, snapshots=None) -> Dict[str, List[dict]]:
+    """
+    Scrapes several parcels of the same (region, katastar_region) in one browser session:
+    the municipality is typed and selected once, then every parcel is searched in turn.
+    Returns {parcel: region_results}, each exactly what scrape_katastar() returns for it.
+    With `snapshots` (a refresh.SnapshotStore) holders are only opened for table rows
+    that are new or changed since the snapshot.
+    If the portal stops answering, PortalTimeoutError is raised with the parcels that
+    did finish (cached ones included) in its `completed`.
+    """
+    from selenium.common.exceptions import TimeoutException
+
+    results: Dict[str, List[dict]] = {}
+    if cache is not None and not refresh:
+        for parcel in parcels:
+            cached = cache.lookup(region, parcel, katastar_region)
+            count_cache(cached is not None)
+            if cached is not None:
+                results[parcel] = cached
+    missing = [p for p in parcels if p not in results]
+    if not missing:
+        return results
+
+    pool = pool or get_default_pool()
     try:
-        driver.get("https://e-uslugi.katastar.gov.mk/")
-
-        suggestions = get_region_suggestions(driver, wait, region)
-        if not suggestions:
-            # No suggestions at all for base region
-            region_results.append({
-                "region_name": "(no suggestions)",
-                "parcels": [],
-                "input_region": region,
-                "input_katastar": katastar_region,
-                "input_parcel": parcel,
-                "note": f"No region suggestions found for '{region}'."
-            })
-            return region_results
-
-        # Normalize texts for matching
-        def norm(s: str) -> str:
-            return s.strip().lower()
-
-        if katastar_region:
-            target = norm(katastar_region)
-            # Refresh suggestions after typing region
-            suggestions = get_region_suggestions(driver, wait, region)
-            # Find a suggestion that contains the katastar part (e.g. '... - СКОПЈЕ')
-            match_el = None
-            match_text = None
-            for el in suggestions:
-                text = el.text or ""
-                if target in norm(text):
-                    match_el = el
-                    match_text = text
-                    break
+        with pool.driver() as driver:
+            scraped = _scrape_group_with_driver(driver, region, missing, katastar_region, cache=cache,
+                                                holder_tabs=holder_tabs, snapshots=snapshots)
+    except (PortalTimeoutError, TimeoutException) as exc:
+        completed = getattr(exc, "completed", {})
+        if cache is not None:
+            for parcel, region_results in completed.items():
+                cache.store(parcel, region_results)
+        raise PortalTimeoutError(str(exc).strip() or type(exc).__name__,
+                                 completed={**results, **completed}) from exc
+
+    if cache is not None:
+        for parcel, region_results in scraped.items():
+            cache.store(parcel, region_results)
+    results.update(scraped)
+    return results
+
+
+def _region_entry(region_name: str, region: str, katastar_region: Optional[str], parcel: str,
+                  note: Optional[str] = None) -> dict:
+    entry = {
+        "region_name": region_name,
+        "parcels": [],
+        "input_region": region,
+        "input_katastar": katastar_region,
+        "input_parcel": parcel
+    }
+    if note:
+        entry["note"] = note
+    return entry
+
+
+def go_home(driver):
+    """Reloads the portal home page (a fresh search form): the pool's home_url, else PORTAL_URL."""
+    with phase("navigate"):
+        driver.get(getattr(driver, "katastar_home_url", PORTAL_URL))
+
+
+def select_region(driver, wait, region: str, region_name: str, index: int) -> bool:
+    """
+    Types region and clicks the suggestion whose text is region_name
+    (falling back to position `index`, like the original per-index loop).
+    """
+    suggestions = get_region_suggestions(driver, wait, region)
+    chosen = next((el for el in suggestions if el.text == region_name), None)
+    if chosen is None and index < len(suggestions):
+        chosen = suggestions[index]
+    if chosen is None:
+        return False
+    driver.execute_script("arguments[0].click();", chosen)
+    return True
 
-            if not match_el:
-                # None matched — record a not-found entry
-                region_results.append({
-                    "region_name": f"(no match among suggestions for '{region}')",
-                    "parcels": [],
-                    "input_region": region,
-                    "input_katastar": katastar_region,
-                    "input_parcel": parcel,
-                    "note": f"Katastar region '{katastar_region}' not found in suggestions."
-                })
-                return region_results
-
-            # Click only the matched suggestion, then proceed as usual
-            region_name = match_text
-            driver.execute_script("arguments[0].click();", match_el)
-            region_entry = {
-                "region_name": region_name,
-                "parcels": [],
-                "input_region": region,
-                "input_katastar": katastar_region,
-                "input_parcel": parcel
-            }
-
-            if select_parcel(driver, wait, parcel):
-                region_entry["parcels"] = extract_parcel_and_holders(driver, wait)
-            else:
-                region_entry["note"] = f"No parcel suggestions found for '{parcel}' in region '{region_name}'."
 
-            region_results.append(region_entry)
-            return region_results
+def region_still_selected(driver, region_name: str) -> bool:
+    """
+    True if the search form is on screen with region_name still chosen, so the next
+    parcel can be typed without reloading the portal. Never waits.
+    """
+    from selenium.webdriver.common.by import By
 
-        else:
-            # No katastar filter: iterate through ALL suggestions (existing behavior)
-            for idx in range(len(suggestions)):
-                suggestions = get_region_suggestions(driver, wait, region)
-                current = suggestions[idx]
-                region_name = current.text
-                driver.execute_script("arguments[0].click();", current)
-
-                region_entry = {
-                    "region_name": region_name,
-                    "parcels": [],
-                    "input_region": region,
-                    "input_katastar": None,
-                    "input_parcel": parcel
-                }
-
-                if select_parcel(driver, wait, parcel):
-                    region_entry["parcels"] = extract_parcel_and_holders(driver, wait)
-                else:
-                    region_entry["note"] = f"No parcel suggestions found for '{parcel}' in region '{region_name}'."
+    region_inputs = driver.find_elements(By.CSS_SELECTOR, REGION_INPUT_SELECTOR)
+    if not region_inputs or not driver.find_elements(By.CSS_SELECTOR, PARCEL_INPUT_SELECTOR):
+        return False
+    return (region_inputs[0].get_attribute("value") or "").strip() == region_name.strip()
 
-                region_results.append(region_entry)
-                driver.get("https://e-uslugi.katastar.gov.mk/")
 
-            return region_results
+def mark_parcel_rows_seen(driver):
+    """Tags the rows on screen so the next parcel's table can be told apart from them."""
+    driver.execute_script(
+        "document.querySelectorAll(arguments[0]).forEach(function (r) {"
+        " r.setAttribute('data-katastar-seen', '1'); });", PARCEL_ROW_SELECTOR)
 
-    finally:
-        driver.quit()
+
+def _scrape_group_with_driver(driver, region: str, parcels: List[str], katastar_region: Optional[str],
+                              cache: Optional[ResultCache] = None,
+                              holder_tabs: int = 6, snapshots=None) -> Dict[str, List[dict]]:
+    """
+    Runs one region group on a driver that is already on the portal home page.
+    A wait that runs out (the portal is slow or throttling, not "not found") raises
+    PortalTimeoutError carrying the parcels finished for every target so far.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    # Generic waits (inputs, holder tables) get twice the adaptive table timeout as headroom
+    wait = WebDriverWait(driver, LATENCY.timeout("parcel_table", attempt=2))
+    results: Dict[str, List[dict]] = {parcel: [] for parcel in parcels}
+
+    suggestions = get_region_suggestions(driver, wait, region)
+    names = [el.text for el in suggestions]
+    if cache is not None:
+        cache.put_suggestions(region, names)
+    if not suggestions:
+        # No suggestions at all for base region
+        for parcel in parcels:
+            results[parcel].append(_region_entry(
+                "(no suggestions)", region, katastar_region, parcel,
+                note=f"No region suggestions found for '{region}'."))
+        return results
+
+    # Normalize texts for matching
+    def norm(s: str) -> str:
+        return s.strip().lower()
+
+    if katastar_region:
+        # Find a suggestion that contains the katastar part (e.g. '... - СКОПЈЕ')
+        target = norm(katastar_region)
+        match_index = next((i for i, text in enumerate(names) if target in norm(text or "")), None)
+        if match_index is None:
+            # None matched — record a not-found entry
+            for parcel in parcels:
+                results[parcel].append(_region_entry(
+                    f"(no match among suggestions for '{region}')", region, katastar_region, parcel,
+                    note=f"Katastar region '{katastar_region}' not found in suggestions."))
+            return results
+        # Scrape only the matched suggestion
+        targets = [(match_index, names[match_index])]
+    else:
+        # No katastar filter: iterate through ALL suggestions (existing behavior)
+        targets = list(enumerate(names))
+
+    # Parcels scraped for every target, i.e. finished if a later wait runs out
+    done: List[str] = []
+    try:
+        for position, (idx, region_name) in enumerate(targets):
+            if position == 0:
+                # The suggestions typed above are still open; click straight away
+                driver.execute_script("arguments[0].click();", suggestions[idx])
+                selected = True
+            else:
+                go_home(driver)
+                selected = select_region(driver, wait, region, region_name, idx)
+
+            for parcel_index, parcel in enumerate(parcels):
+                entry = _region_entry(region_name, region, katastar_region, parcel)
+                results[parcel].append(entry)
+
+                reused = parcel_index > 0 and selected and region_still_selected(driver, region_name)
+                if parcel_index > 0 and not reused:
+                    go_home(driver)
+                    selected = select_region(driver, wait, region, region_name, idx)
+                if not selected:
+                    # A UI hiccup, not an answer about the parcel: requeue rather than report it
+                    raise PortalTimeoutError(
+                        f"Region suggestion '{region_name}' disappeared while scraping '{region}'")
+
+                if reused:
+                    mark_parcel_rows_seen(driver)
+                    # One attempt only: if the portal re-renders rows in place, the fresh-row check never
+                    # passes, and retrying with growing timeouts would cost more than starting over
+                    status = select_parcel_status(driver, wait, parcel, attempts=1,
+                                                  rows_selector=FRESH_PARCEL_ROW_SELECTOR)
+                    if status == "failed":
+                        # Inconclusive (maybe a table the portal re-used in place): confirm from scratch
+                        go_home(driver)
+                        selected = select_region(driver, wait, region, region_name, idx)
+                        status = select_parcel_status(driver, wait, parcel) if selected else "failed"
+                else:
+                    status = select_parcel_status(driver, wait, parcel)
+
+                if status == "selected":
+                    known = snapshots.known_holders(region_name, parcel) if snapshots is not None else None
+                    entry["parcels"] = extract_parcel_and_holders(driver, wait, holder_tabs=holder_tabs,
+                                                                  known_holders=known)
+                elif status == "no-options":
+                    entry["note"] = f"No parcel suggestions found for '{parcel}' in region '{region_name}'."
+                else:
+                    raise PortalTimeoutError(f"Parcel '{parcel}' in region '{region_name}' did not load in time")
+                if position == len(targets) - 1:
+                    done.append(parcel)
+    except (PortalTimeoutError, TimeoutException) as exc:
+        raise PortalTimeoutError(str(exc).strip() or type(exc).__name__,
+                                 completed={parcel: results[parcel] for parcel in done}) from exc
+
+    return results
 
 
 # -----------------------------
 # Input parsing (2 or 3 items per line)
 # -----------------------------
-def read_input_file(file_path: str) -> List[Tuple[str, Optional[str], str]]:
+def iter_input_file(file_path: str) -> Iterator[Tuple[str, Optional[str], str]]:
     """
     Accepts lines in one of two formats (comma/semicolon/tab separated):
       1) Region, Parcel
       2) Region, KatastarRegion, Parcel
 
     Ignores blank lines and lines starting with '#'.
-    Returns list of tuples: (region, katastar_region_or_None, parcel)
+    Yields tuples (region, katastar_region_or_None, parcel) one line at a time,
+    so arbitrarily long files are never held in memory.
     """
-    triples: List[Tuple[str, Optional[str], str]] = []
     with open(file_path, "r", encoding="utf-8") as f:
         for raw in f:
             line = raw.strip()
@@ -451,45 +813,308 @@ def read_input_file(file_path: str) -> List[Tuple[str, Optional[str], str]]:
             parts = [p.strip() for p in re.split(r"[,\t;]", line) if p.strip()]
             if len(parts) == 2:
                 region, parcel = parts
-                triples.append((region, None, parcel))
+                yield (region, None, parcel)
             elif len(parts) >= 3:
                 region, katastar, parcel = parts[0], parts[1], parts[2]
-                triples.append((region, katastar, parcel))
+                yield (region, katastar, parcel)
             # else: ignore malformed lines silently (or print warning if you prefer)
-    return triples
+
+
+def read_input_file(file_path: str) -> List[Tuple[str, Optional[str], str]]:
+    """
+    Same as iter_input_file(), as a list.
+    """
+    return list(iter_input_file(file_path))
 
 
 # -----------------------------
 # CLI
 # -----------------------------
+def add_scrape_arguments(parser: argparse.ArgumentParser):
+    """Options for how jobs are scraped, shared by this CLI and worker.py."""
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of browsers scraping in parallel (default: 1)")
+    parser.add_argument("--jobs-per-minute", type=float, default=None,
+                        help="Upper bound on jobs started per minute across all workers")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adapt concurrency to the portal: start with one worker, grow up to --workers "
+                             "while it keeps up, halve on timeouts/throttling and pause after repeated failures")
+    parser.add_argument("--max-requeues", type=int, default=3,
+                        help="How often parcels that time out are requeued before being reported (default: 3)")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium",
+                        help="selenium drives the portal UI; http calls its JSON endpoints directly")
+    parser.add_argument("--http-base-url", default=None,
+                        help="Base URL for the http backend (e.g. a local stub_portal.py)")
+    parser.add_argument("--http-endpoints", default=None,
+                        help="JSON file overriding the http backend's routes and field names")
+    parser.add_argument("--record", default=None,
+                        help="Save every http backend response to this file for stub_portal.py")
+    parser.add_argument("--cache", default="katastar_cache.sqlite3",
+                        help="SQLite result cache path (default: katastar_cache.sqlite3)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the result cache")
+    parser.add_argument("--cache-ttl", type=float, default=24,
+                        help="Hours a cached parcel stays valid (default: 24)")
+    parser.add_argument("--cache-max-mb", type=int, default=256,
+                        help="Evict least recently used parcels beyond this size (default: 256)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached results and re-scrape (fresh results are still cached)")
+    parser.add_argument("--holder-tabs", type=int, default=6,
+                        help="Load up to this many right-holder pages in parallel tabs (0 or 1 disables)")
+    parser.add_argument("--recycle-after", type=int, default=50,
+                        help="Restart the browser after this many jobs to keep memory in check (default: 50)")
+    parser.add_argument("--browser-profile", choices=["lean", "full"], default="lean",
+                        help="lean blocks images/fonts/media/analytics and loads pages eagerly; full is a plain browser")
+    parser.add_argument("--browser-cache", default=None,
+                        help="Persistent browser disk cache directory (default: katastar_browser_cache; '' disables)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print where the time went (phases, WebDriver commands, retries, timeouts, cache hits)")
+    parser.add_argument("--metrics-log", default=None,
+                        help="Append one JSON line of timings per job to this file")
+
+
+def build_backend(args, snapshots=None):
+    """The scrape backend described by the add_scrape_arguments() options (plus an optional SnapshotStore)."""
+    from backends import get_backend
+    if args.backend == "http":
+        from http_backend import HttpEndpoints
+        endpoints = HttpEndpoints.from_file(args.http_endpoints) if args.http_endpoints else None
+        return get_backend("http", base_url=args.http_base_url, endpoints=endpoints, record_to=args.record,
+                           snapshots=snapshots)
+
+    cache = None if args.no_cache else ResultCache(args.cache, ttl=args.cache_ttl * 3600,
+                                                   max_bytes=args.cache_max_mb * 1024 * 1024)
+    from dataclasses import replace
+    from driver_pool import get_profile
+    browser_profile = get_profile(args.browser_profile)
+    if args.browser_cache is not None:
+        browser_profile = replace(browser_profile, cache_dir=args.browser_cache or None)
+    return get_backend("selenium", pool=get_default_pool(max_drivers=args.workers,
+                                                         max_jobs_per_driver=args.recycle_after,
+                                                         profile=browser_profile),
+                       cache=cache, refresh=args.refresh or snapshots is not None, holder_tabs=args.holder_tabs,
+                       snapshots=snapshots)
+
+
+def build_scheduler(args):
+    """An AdaptiveScheduler with --adaptive, else None."""
+    if not args.adaptive:
+        return None
+    from throttle import AdaptiveScheduler
+    # With --adaptive the token bucket takes over --jobs-per-minute (as parcels per minute)
+    return AdaptiveScheduler(max_concurrency=args.workers, parcels_per_minute=args.jobs_per_minute)
+
+
+def collect_from_queue(args, jobs) -> Tuple[str, int, int, bool]:
+    """
+    --queue mode: enqueues `jobs` as a batch (or re-attaches to --batch-id), then
+    writes the results workers post back, in input order, as they arrive.
+    Returns (output path, entries written, input items, interrupted).
+    """
+    from output_formats import open_writer
+    from search_index import SearchIndex
+    from work_queue import open_queue
+
+    search = None if args.no_index else SearchIndex(args.index)
+    queue = open_queue(args.queue)
+    batch_id = args.batch_id
+    if batch_id is None or queue.progress(batch_id) is None:
+        if jobs is None:
+            queue.close()
+            if search is not None:
+                search.close()
+            raise SystemExit(f"Batch '{batch_id}' is not in {args.queue} and no input was given to enqueue.")
+        batch_id = queue.create_batch(jobs, batch_id=batch_id)
+        print(f"Queued batch {batch_id} ({queue.progress(batch_id)['total']} item(s)) in {args.queue}; "
+              f"start workers with: python worker.py --queue {args.queue}")
+    output = args.output or f"results.{args.format}"
+    writer = open_writer(args.format, output)
+    total = entries = 0
+    try:
+        for job, region_results in queue.wait_results(batch_id, poll=args.poll):
+            total += 1
+            if search is not None:
+                search.add(region_results)
+            for entry in region_results:
+                writer.write_entry(entry)
+                entries += 1
+            if hasattr(writer, "flush"):
+                writer.flush()
+    except KeyboardInterrupt:
+        print(f"Stopped collecting after {total} input item(s); workers keep draining the batch. "
+              f"Rerun with --queue {args.queue} --batch-id {batch_id} to collect the rest.")
+        return output, entries, total, True
+    finally:
+        writer.close()
+        queue.close()
+        if search is not None:
+            search.close()
+    return output, entries, total, False
+
+
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Scrape parcel/right-holder data from e-uslugi.katastar.gov.mk")
+    if sys.argv[1:2] == ["search"]:
+        # `scrape_katastar.py search ...` answers from the local index without touching the portal
+        from search_index import main as search_main
+        sys.exit(search_main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Scrape parcel/right-holder data from e-uslugi.katastar.gov.mk",
+                                     epilog="Search what was scraped so far: scrape_katastar.py search <words> "
+                                            "[--municipality M]")
     parser.add_argument("--input-file", "-i", help="Path to a file containing Region[,KatastarRegion],Parcel lines")
     parser.add_argument("region", nargs="?", help="Base region text to search (used if no --input-file)")
     parser.add_argument("parcel", nargs="?", help="Parcel to search (used if no --input-file)")
     parser.add_argument("--katastar", "-k", nargs="?", default=None,
                         help="Optional Katastar Region (e.g., 'Скопје'). If provided, only that dropdown option is scraped.")
+    add_scrape_arguments(parser)
+    parser.add_argument("--journal", default="results.journal.jsonl",
+                        help="Append-only log of finished jobs (default: results.journal.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip jobs already in --journal and rebuild the output from it")
+    parser.add_argument("--format", "-f", choices=["xlsx", "jsonl", "csv", "parquet"], default="xlsx",
+                        help="Output format: styled xlsx (default), nested jsonl, or flat csv/parquet (one row per holder)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Output file (default: results.<format>)")
+    parser.add_argument("--window", type=int, default=200,
+                        help="Input lines planned together; at most 4 windows are in flight (default: 200)")
+    parser.add_argument("--incremental", nargs="?", const="katastar_snapshots.sqlite3", default=None,
+                        metavar="SNAPSHOTS",
+                        help="Refresh mode: read every parcels table, but open right-holders only for rows that are "
+                             "new or changed since the last snapshot (default store: katastar_snapshots.sqlite3)")
+    parser.add_argument("--changes", default="changes.jsonl",
+                        help="With --incremental: JSON lines report of what changed (default: changes.jsonl)")
+    parser.add_argument("--queue", default=None,
+                        help="Coordinator mode: put the jobs on this shared queue (SQLite path or postgresql:// URL) "
+                             "for worker.py processes and write the output as they finish them")
+    parser.add_argument("--batch-id", default=None,
+                        help="With --queue: collect (or create) this batch instead of a new one")
+    parser.add_argument("--poll", type=float, default=2.0,
+                        help="With --queue: seconds between checks for finished jobs (default: 2)")
+    parser.add_argument("--index", default="katastar_index.sqlite3",
+                        help="Local search index the results are added to (default: katastar_index.sqlite3)")
+    parser.add_argument("--no-index", action="store_true", help="Do not add the results to --index")
     args = parser.parse_args()
 
-    jobs: List[Tuple[str, Optional[str], str]] = []
     if args.input_file:
-        jobs = read_input_file(args.input_file)
-        if not jobs:
+        jobs = iter_input_file(args.input_file)
+        first = next(jobs, None)
+        if first is None:
             print(f"No valid entries found in input file {args.input_file}")
             sys.exit(1)
+        jobs = itertools.chain([first], jobs)
+    elif args.region and args.parcel:
+        jobs = iter([(args.region, args.katastar, args.parcel)])
+    elif args.queue and args.batch_id:
+        jobs = None
     else:
-        if not args.region or not args.parcel:
-            parser.error("Either --input-file or both positional arguments <region> <parcel> are required.")
-        jobs = [(args.region, args.katastar, args.parcel)]
-
-    all_results = []
-    for region, katastar_region, parcel in jobs:
-        batch = scrape_katastar(region, parcel, katastar_region=katastar_region)
-        all_results.extend(batch)
-
-    if all_results:
-        write_results_to_excel(all_results, "results.xlsx")
-        print(f"Results written to results.xlsx for {len(all_results)} region suggestion(s) across {len(jobs)} input item(s).")
+        parser.error("Either --input-file or both positional arguments <region> <parcel> are required.")
+
+    from backends import BackendConfigError
+    from batch import job_outcome, stream_jobs
+    from journal import JobJournal, JournalIndex
+    from search_index import SearchIndex
+    import metrics
+
+    if args.metrics_log:
+        metrics.log_to(args.metrics_log)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+
+    if args.queue:
+        output, entries, total, interrupted = collect_from_queue(args, jobs)
+        if interrupted:
+            sys.exit(130)
+        if entries:
+            print(f"Results written to {output} for {entries} region suggestion(s) across {total} input item(s).")
+        else:
+            os.remove(output)
+            print("No results found.")
+        sys.exit(0)
+
+    snapshots = report = None
+    if args.incremental:
+        from refresh import ChangeReport, SnapshotStore
+        snapshots = SnapshotStore(args.incremental)
+        report = ChangeReport(args.changes)
+    search = None if args.no_index else SearchIndex(args.index)
+    backend = build_backend(args, snapshots=snapshots)
+    scheduler = build_scheduler(args)
+    index = JournalIndex(args.journal) if args.resume else None
+    if index is not None:
+        print(f"Resuming: {len(index)} finished job(s) in {args.journal} will not be scraped again.")
+    journal = JobJournal(args.journal, resume=args.resume)
+
+    from output_formats import open_writer
+    output = args.output or f"results.{args.format}"
+    writer = open_writer(args.format, output)
+    total = entries = skipped = 0
+    interrupted = False
+    config_error = None
+
+    def journal_result(job, region_results):
+        # Journaled as soon as the job finishes, however long the jobs before it take;
+        # timed-out jobs stay out of the journal so --resume tries them again
+        if job_outcome(region_results) != "timeout":
+            journal.record(job, region_results)
+
+    stream = stream_jobs(jobs, workers=args.workers, jobs_per_minute=args.jobs_per_minute, backend=backend,
+                         window=args.window, precomputed=index.get if index is not None else None,
+                         scheduler=scheduler, max_requeues=args.max_requeues, on_result=journal_result)
+    try:
+        # Each job is written out as soon as it and everything before it finished
+        for job, region_results, scraped in stream:
+            total += 1
+            if not scraped:
+                skipped += 1
+            if report is not None and scraped:
+                for change in snapshots.update(job, region_results):
+                    report.write(change)
+            if search is not None and scraped:
+                search.add(region_results)
+            for entry in region_results:
+                writer.write_entry(entry)
+                entries += 1
+            if hasattr(writer, "flush"):
+                writer.flush()
+    except KeyboardInterrupt:
+        interrupted = True
+    except BackendConfigError as exc:
+        config_error = exc
+    finally:
+        # Waits for the groups still running, which journal and use the backend, before closing them
+        stream.close()
+        writer.close()
+        journal.close()
+        if index is not None:
+            index.close()
+        backend.close()
+        close_default_pool()
+        if report is not None:
+            report.close()
+            snapshots.close()
+        if search is not None:
+            search.close()
+        if args.profile:
+            print(metrics.format_summary())
+
+    if config_error is not None:
+        print(f"Stopped after {total} input item(s): {config_error}")
+        sys.exit(2)
+    if report is not None:
+        print(f"Changes since the last snapshot: {report.summary()} (details in {args.changes}).")
+    if interrupted:
+        print(f"Interrupted after {total} input item(s); {output} has their results. "
+              f"Finished jobs are saved in {args.journal}; rerun with --resume to continue.")
+        sys.exit(130)
+    if args.resume:
+        print(f"Resumed {skipped} of {total} input item(s) from {args.journal}.")
+    if entries:
+        print(f"Results written to {output} for {entries} region suggestion(s) across {total} input item(s).")
     else:
+        os.remove(output)
         print("No results found.")
-# -----------------------------
\ No newline at end of file
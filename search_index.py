@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Local searchable index of everything scraped, so questions like "which parcels
+does X hold in municipality Y" are answered from disk in milliseconds instead of
+re-scraping the portal.
+
+Every scraped region entry is flattened (output_formats.flatten_entry: one row per
+right-holder) into a SQLite table, with an FTS5 index over Име и презиме, Место,
+Имотен лист and the municipality. Re-scraping a parcel replaces its rows, so the
+index always holds the latest known state.
+
+Text is indexed and queried in a normalised form: Macedonian Cyrillic transliterated
+to Latin, diacritics dropped and č/ch, š/sh, ž/zh, ǵ/gj, ḱ/kj folded together, so
+"Петровски", "Petrovski" and "PETROVSKI" all match, as do "Ќосе", "Ḱose" and "Kjose".
+
+    python scrape_katastar.py search "Петровски" --municipality Центар
+    GET /search?q=Петровски&municipality=Центар
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+from output_formats import FLAT_COLUMNS, flatten_entry
+
+DEFAULT_INDEX_PATH = "katastar_index.sqlite3"
+
+# Stored columns: output_formats.FLAT_COLUMNS without the note
+COLUMNS = [c for c in FLAT_COLUMNS if c != "note"]
+
+# Quoted: "right" is an SQL keyword
+_COLUMN_LIST = ", ".join(f'"{c}"' for c in COLUMNS)
+_SELECT_LIST = ", ".join(f'h."{c}"' for c in COLUMNS)
+
+# Searchable FTS5 columns, and the --field names that restrict a query to one of them
+FIELDS = {"name": "holder_name", "place": "place", "sheet": "property_sheet", "municipality": "region_name"}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS holdings (
+    id          INTEGER PRIMARY KEY,
+    {", ".join(f'"{c}" TEXT' for c in COLUMNS)},
+    indexed_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS holdings_parcel ON holdings (region_name, input_parcel);
+CREATE VIRTUAL TABLE IF NOT EXISTS holdings_fts USING fts5(
+    holder_name, place, property_sheet, region_name, tokenize = 'unicode61'
+);
+"""
+
+_CYRILLIC = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "ѓ": "g", "е": "e", "ж": "z", "з": "z", "ѕ": "dz",
+    "и": "i", "ј": "j", "к": "k", "л": "l", "љ": "lj", "м": "m", "н": "n", "њ": "nj", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "ќ": "k", "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "c", "џ": "dz",
+    "ш": "s",
+    # Serbian / Russian letters that turn up in names
+    "ђ": "g", "ћ": "c", "й": "j", "ы": "i", "э": "e", "ю": "ju", "я": "ja", "щ": "s", "ъ": "", "ь": "",
+}
+# Latin spellings of the same sounds, folded the way the table above folds the Cyrillic
+_DIGRAPHS = [("dzh", "dz"), ("ch", "c"), ("sh", "s"), ("zh", "z"), ("gj", "g"), ("kj", "k")]
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lower-case Latin ASCII key used for both indexing and querying."""
+    if not text:
+        return ""
+    text = "".join(_CYRILLIC.get(ch, ch) for ch in text.lower())
+    text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    for digraph, letter in _DIGRAPHS:
+        text = text.replace(digraph, letter)
+    return text
+
+
+def _match_expression(query: str, column: Optional[str] = None) -> str:
+    """FTS5 MATCH expression: every word of `query` as a prefix, all required."""
+    terms = [f'"{word}"*' for word in normalize(query).replace('"', " ").split() if word]
+    if not terms:
+        return ""
+    expression = " ".join(terms)
+    return f"{column} : ({expression})" if column else expression
+
+
+class SearchIndex:
+    """
+    The holdings table (one row per parcel and right-holder) plus its FTS5 index of
+    normalised names, places, property sheets and municipalities. add() replaces a
+    parcel's rows wholesale; search() never touches the portal.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, region_results: List[dict]):
+        """Indexes one job's region_results, replacing what was indexed for the same parcel before."""
+        now = time.time()
+        with self._lock:
+            for entry in region_results:
+                region_name = entry.get("region_name") or ""
+                if region_name.startswith("("):
+                    continue  # placeholders ("(error)", "(timeout)", ...) say nothing about the parcel
+                key = (region_name, entry.get("input_parcel"))
+                self._conn.execute("DELETE FROM holdings_fts WHERE rowid IN "
+                                   "(SELECT id FROM holdings WHERE region_name = ? AND input_parcel = ?)", key)
+                self._conn.execute("DELETE FROM holdings WHERE region_name = ? AND input_parcel = ?", key)
+                if not entry.get("parcels"):
+                    continue
+                for row in flatten_entry(entry):
+                    cursor = self._conn.execute(
+                        f"INSERT INTO holdings ({_COLUMN_LIST}, indexed_at) "
+                        f"VALUES ({', '.join('?' * len(COLUMNS))}, ?)",
+                        [row.get(c) for c in COLUMNS] + [now])
+                    sheets = " ".join(s for s in {row.get("property_sheet"), row.get("holder_property_sheet")} if s)
+                    self._conn.execute(
+                        "INSERT INTO holdings_fts (rowid, holder_name, place, property_sheet, region_name) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, normalize(row.get("holder_name")), normalize(row.get("place")),
+                         normalize(sheets), normalize(region_name)))
+            self._conn.commit()
+
+    def search(self, query: str = "", municipality: Optional[str] = None, field: Optional[str] = None,
+               limit: int = 50) -> List[dict]:
+        """
+        Rows (COLUMNS plus indexed_at) whose searchable text contains every word of
+        `query` as a prefix, best matches first. `field` (one of FIELDS) restricts the
+        query to that column; `municipality` adds a filter on the municipality name.
+        """
+        if field is not None and field not in FIELDS:
+            raise ValueError(f"Unknown field '{field}', expected one of {', '.join(FIELDS)}")
+        parts = [p for p in (_match_expression(query, FIELDS.get(field)),
+                             _match_expression(municipality or "", "region_name")) if p]
+        if not parts:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_SELECT_LIST}, h.indexed_at "
+                "FROM holdings_fts JOIN holdings h ON h.id = holdings_fts.rowid "
+                "WHERE holdings_fts MATCH ? ORDER BY bm25(holdings_fts) LIMIT ?",
+                (" AND ".join(parts), max(1, limit))).fetchall()
+        return [dict(zip(COLUMNS + ["indexed_at"], row)) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows, parcels = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT region_name || '|' || input_parcel) FROM holdings").fetchone()
+        return {"rows": rows, "parcels": parcels}
+
+
+def main(argv=None) -> int:
+    """`python scrape_katastar.py search ...` (or `python search_index.py ...`)."""
+    parser = argparse.ArgumentParser(prog="scrape_katastar.py search",
+                                     description="Search parcels and right-holders scraped so far (no portal access)")
+    parser.add_argument("query", nargs="?", default="", help="Words to find, e.g. a holder's name (any script)")
+    parser.add_argument("--municipality", "-m", default=None, help="Only parcels in municipalities matching this")
+    parser.add_argument("--field", choices=sorted(FIELDS), default=None,
+                        help="Search only this column (default: name, place, property sheet and municipality)")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum rows (default: 50)")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"Index path (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines instead of a table")
+    args = parser.parse_args(argv)
+    if not args.query and not args.municipality:
+        parser.error("give a query, --municipality, or both")
+
+    started = time.perf_counter()
+    with SearchIndex(args.index) as index:
+        rows = index.search(args.query, municipality=args.municipality, field=args.field, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return 0
+    for row in rows:
+        print(f"{row['holder_name'] or '-':<32} {row['region_name'] or '':<28} парцела {row['parcel_number'] or '':<12} "
+              f"ИЛ {row['property_sheet'] or '':<8} {row['place'] or '':<20} {row['holder_share'] or ''}")
+    print(f"{len(rows)} row(s) in {elapsed_ms:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
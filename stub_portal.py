@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Local stub of the portal's JSON API that replays recorded responses.
+
+Record once against the real portal:
+
+    python scrape_katastar.py -i jobs.txt --backend http --record recordings.json
+
+then replay offline:
+
+    python stub_portal.py recordings.json --port 8765
+    python scrape_katastar.py -i jobs.txt --backend http --http-base-url http://127.0.0.1:8765
+
+Unknown requests get a 404 with an empty JSON list, which HttpBackend reports as a
+BackendConfigError: record the missing request, or list its route in empty_on_404.
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from http_backend import request_key
+
+
+def load_recordings(path: str) -> Dict[str, dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_handler(recordings: Dict[str, dict], latency: float = 0.0):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real portal
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            key = request_key("GET", parts.path, dict(parse_qsl(parts.query, keep_blank_values=True)))
+            recorded = recordings.get(key, {"status": 404, "body": []})
+            if latency:
+                threading.Event().wait(latency)
+            payload = json.dumps(recorded["body"], ensure_ascii=False).encode("utf-8")
+            self.send_response(recorded.get("status", 200))
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def start_stub_server(recordings: Dict[str, dict], host: str = "127.0.0.1", port: int = 0,
+                      latency: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Starts the stub in a daemon thread. port=0 picks a free port.
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(recordings, latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded portal API responses")
+    parser.add_argument("recordings", help="JSON file written by HttpBackend(record_to=...)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay added to every response")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(load_recordings(args.recordings), args.latency))
+    print(f"Replaying {args.recordings} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
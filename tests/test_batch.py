@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+import batch
+from backends import ScrapeBackend
+from batch import run_jobs, stream_jobs
+from throttle import PortalTimeoutError
+
+
+class FakeBackend(ScrapeBackend):
+    """Answers every parcel with one entry after `delay` seconds; records which groups ran."""
+
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.groups = []
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def scrape_group(self, region, parcels, katastar_region=None):
+        with self._lock:
+            self.groups.append((region, list(parcels)))
+            self.running += 1
+        try:
+            time.sleep(self.delay)
+            return {p: [{"region_name": f"{region} - X", "parcels": [{"Број/дел": p}], "input_region": region,
+                         "input_katastar": katastar_region, "input_parcel": p}] for p in parcels}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def test_stream_close_waits_for_running_groups():
+    backend = FakeBackend(delay=0.2)
+    finished = []
+    jobs = [(f"r{i}", None, str(i)) for i in range(20)]
+    stream = stream_jobs(jobs, workers=4, backend=backend, window=20,
+                         on_result=lambda job, region_results: finished.append(job))
+    next(stream)
+    stream.close()
+    # Nothing runs (or reports) after close() returned, and the queued groups never started
+    assert backend.running == 0
+    count = len(finished)
+    time.sleep(0.3)
+    assert len(finished) == count
+    assert len(backend.groups) < len(jobs)
+
+
+def test_run_jobs_interrupted_waits_for_running_groups():
+    backend = FakeBackend(delay=0.2)
+    jobs = [(f"r{i}", None, str(i)) for i in range(20)]
+
+    def on_result(index, job, region_results):
+        if index == 0:
+            raise KeyboardInterrupt
+
+    try:
+        run_jobs(jobs, workers=4, backend=backend, on_result=on_result)
+    except KeyboardInterrupt:
+        pass
+    assert backend.running == 0
+    assert len(backend.groups) < len(jobs)
+
+
+class FlakyBackend(FakeBackend):
+    """scrape_group fails as configured; scrape() (the one-by-one fallback) can fail for single parcels."""
+
+    def __init__(self, group_error=None, timeouts=0, broken=()):
+        super().__init__()
+        self.group_error = group_error
+        self.timeouts = timeouts
+        self.broken = set(broken)
+
+    def scrape_group(self, region, parcels, katastar_region=None):
+        if self.timeouts:
+            self.timeouts -= 1
+            done = super().scrape_group(region, parcels[:1], katastar_region)
+            raise PortalTimeoutError("portal is slow", completed=done)
+        if self.group_error is not None:
+            raise self.group_error
+        return super().scrape_group(region, parcels, katastar_region)
+
+    def scrape(self, region, parcel, katastar_region=None):
+        if parcel in self.broken:
+            raise ValueError(f"cannot read {parcel}")
+        return super().scrape_group(region, [parcel], katastar_region)[parcel]
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(batch.random, "uniform", lambda a, b: 0.0)
+
+
+def test_failed_group_is_retried_parcel_by_parcel():
+    backend = FlakyBackend(group_error=RuntimeError("stale element"), broken=["2"])
+    results = run_jobs([("A", None, "1"), ("A", None, "2"), ("A", None, "3")], backend=backend)
+    assert [r[0]["region_name"] for r in results] == ["A - X", "(error)", "A - X"]
+    assert "cannot read 2" in results[1][0]["note"]
+    assert batch.job_outcome(results[1]) == "error"
+
+
+def test_timed_out_parcels_are_requeued(no_backoff):
+    backend = FlakyBackend(timeouts=2)
+    results = run_jobs([("A", None, "1"), ("A", None, "2"), ("A", None, "3")], backend=backend)
+    assert [r[0]["region_name"] for r in results] == ["A - X"] * 3
+    # Each attempt only sent what was still missing
+    assert [parcels for _, parcels in backend.groups] == [["1"], ["2"], ["3"]]
+
+
+def test_parcels_still_timing_out_after_the_requeues_are_reported(no_backoff):
+    backend = FlakyBackend(timeouts=10)
+    results = run_jobs([("A", None, "1"), ("A", None, "2"), ("A", None, "3")], backend=backend, max_requeues=1)
+    assert [r[0]["region_name"] for r in results] == ["A - X", "A - X", "(timeout)"]
+    assert batch.job_outcome(results[2]) == "timeout"
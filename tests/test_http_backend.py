@@ -0,0 +1,55 @@
+import pytest
+
+from backends import BackendConfigError
+from http_backend import HttpBackend, HttpEndpoints, request_key
+from stub_portal import start_stub_server
+
+ENDPOINTS = HttpEndpoints()
+
+
+def recording(path, params, body):
+    return {request_key("GET", path, params): {"status": 200, "body": body}}
+
+
+@pytest.fixture
+def stub():
+    """Starts stub_portal with `recordings` and yields an HttpBackend factory pointed at it."""
+    servers, backends = [], []
+
+    def start(recordings, endpoints=None):
+        server, url = start_stub_server(recordings)
+        servers.append(server)
+        backend = HttpBackend(base_url=url, endpoints=endpoints or HttpEndpoints())
+        backends.append(backend)
+        return backend
+
+    yield start
+    for backend in backends:
+        backend.close()
+    for server in servers:
+        server.shutdown()
+
+
+def test_scrape_from_recorded_responses(stub):
+    recordings = {}
+    recordings.update(recording(ENDPOINTS.municipalities, {"search": "Центар"}, [{"id": 7, "name": "ЦЕНТАР - СКОПЈЕ"}]))
+    recordings.update(recording(ENDPOINTS.parcel_suggestions, {"municipalityId": 7, "search": "12"},
+                                [{"id": 70, "number": "12"}]))
+    recordings.update(recording(ENDPOINTS.parcels, {"municipalityId": 7, "parcelId": 70},
+                                [{"id": 700, "parcelNumber": "12", "propertySheet": "5"}]))
+    recordings.update(recording(ENDPOINTS.right_holders, {"parcelRowId": 700}, [{"fullName": "Петар Петровски"}]))
+    [entry] = stub(recordings).scrape("Центар", "12")
+    assert entry["region_name"] == "ЦЕНТАР - СКОПЈЕ"
+    assert entry["parcels"][0]["Број/дел"] == "12"
+    assert entry["parcels"][0]["Носители на право"][0]["Име и презиме"] == "Петар Петровски"
+
+
+def test_unknown_route_is_a_configuration_error(stub):
+    with pytest.raises(BackendConfigError, match="404"):
+        stub({}).scrape("Центар", "12")
+
+
+def test_404_means_empty_only_on_listed_routes(stub):
+    backend = stub({}, HttpEndpoints(empty_on_404=[ENDPOINTS.municipalities]))
+    [entry] = backend.scrape("Центар", "12")
+    assert entry["region_name"] == "(no suggestions)"
@@ -0,0 +1,59 @@
+from journal import JobJournal, JournalIndex
+
+
+def results(parcel):
+    return [{"region_name": "ЦЕНТАР - СКОПЈЕ", "parcels": [], "input_parcel": parcel}]
+
+
+def test_record_and_load(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with JobJournal(path) as journal:
+        journal.record(("Центар", None, "1"), results("1"))
+        journal.record(("Центар", "Скопје", "2"), results("2"))
+        journal.record(("Центар", None, "3"), [{"region_name": "(error)", "note": "Scrape failed"}])
+    assert JobJournal.load(path) == {("Центар", None, "1"): results("1"), ("Центар", "Скопје", "2"): results("2")}
+
+
+def test_resume_cuts_a_torn_last_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with JobJournal(path) as journal:
+        journal.record(("Центар", None, "1"), results("1"))
+        journal.record(("Центар", None, "2"), results("2"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"job": ["Центар", null, "3"], "results": [{"region_na')  # killed mid-write
+
+    index = JournalIndex(path)
+    assert len(index) == 2
+    index.close()
+
+    with JobJournal(path, resume=True) as journal:
+        journal.record(("Центар", None, "4"), results("4"))
+    assert sorted(job[2] for job in JobJournal.load(path)) == ["1", "2", "4"]
+    with open(path, "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_index_returns_the_latest_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with JobJournal(path) as journal:
+        journal.record(("Центар", None, "1"), results("old"))
+        journal.record(("Центар", None, "1"), results("new"))
+    index = JournalIndex(path)
+    assert ("Центар", None, "1") in index
+    assert index.get(("Центар", None, "1")) == results("new")
+    assert index.get(("Центар", None, "2")) is None
+    index.close()
+
+
+def test_fresh_journal_truncates(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with JobJournal(path) as journal:
+        journal.record(("Центар", None, "1"), results("1"))
+    JobJournal(path).close()
+    assert JobJournal.load(path) == {}
+
+
+def test_record_after_close_is_ignored(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.jsonl"))
+    journal.close()
+    journal.record(("Центар", None, "1"), results("1"))
@@ -0,0 +1,40 @@
+from planner import fan_out, plan_jobs
+
+
+def test_groups_in_first_seen_order_and_dedupes_parcels():
+    jobs = [("Центар", None, "1"), ("Бутел", "Скопје", "2"), ("Центар", None, "3"), ("Центар", None, "1")]
+    groups = plan_jobs(jobs)
+    assert [(g.region, g.katastar_region, g.parcels, g.job_indexes) for g in groups] == [
+        ("Центар", None, ["1", "3"], [0, 2, 3]),
+        ("Бутел", "Скопје", ["2"], [1]),
+    ]
+
+
+def test_katastar_region_is_part_of_the_key():
+    groups = plan_jobs([("Центар", None, "1"), ("Центар", "Скопје", "1")])
+    assert [g.key for g in groups] == [("Центар", None), ("Центар", "Скопје")]
+
+
+def test_large_groups_are_split():
+    jobs = [("Центар", None, str(i)) for i in range(5)] + [("Центар", None, "0")]
+    groups = plan_jobs(jobs, max_parcels_per_group=2)
+    assert [g.parcels for g in groups] == [["0", "1"], ["2", "3"], ["4"]]
+    assert groups[0].job_indexes == [0, 1, 5]
+    assert len(plan_jobs(jobs, max_parcels_per_group=None)) == 1
+
+
+def test_fan_out_restores_input_order_with_own_copies():
+    jobs = [("A", None, "1"), ("B", None, "2"), ("A", None, "1")]
+    groups = plan_jobs(jobs)
+    results = [{"1": [{"region_name": "A - X"}]}, {"2": [{"region_name": "B - Y"}]}]
+    per_job = fan_out(jobs, groups, results)
+    assert [r[0]["region_name"] for r in per_job] == ["A - X", "B - Y", "A - X"]
+    per_job[0][0]["note"] = "edited"
+    assert "note" not in per_job[2][0]
+
+
+def test_fan_out_leaves_groups_that_never_ran_empty():
+    jobs = [("A", None, "1"), ("B", None, "2")]
+    per_job = fan_out(jobs, plan_jobs(jobs), [None, {"2": [{"region_name": "B - Y"}]}])
+    assert per_job[0] is None
+    assert per_job[1][0]["region_name"] == "B - Y"
@@ -0,0 +1,74 @@
+import pytest
+
+from refresh import CHANGED, GONE, NEW, UNCHANGED, SnapshotStore
+
+JOB = ("Центар", None, "12")
+HOLDERS = "Носители на право"
+
+
+def row(number, right="сопственост", holders=("Петар Петровски",)):
+    return {"Имотен лист": "55", "Број/дел": number, "Култура": "нива", "Површина m2": "100", "Место": "Водно",
+            "Право": right, HOLDERS: [{"Име и презиме": h} for h in holders]}
+
+
+def results(*rows, region_name="ЦЕНТАР - СКОПЈЕ"):
+    return [{"region_name": region_name, "parcels": list(rows), "input_region": "Центар",
+             "input_katastar": None, "input_parcel": "12"}]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_first_sighting_is_new_then_unchanged(store):
+    [change] = store.update(JOB, results(row("12/1")))
+    assert change["status"] == NEW
+    assert [r["Број/дел"] for r in change["added"]] == ["12/1"]
+    [change] = store.update(JOB, results(row("12/1")))
+    assert change["status"] == UNCHANGED
+
+
+def test_row_changes(store):
+    store.update(JOB, results(row("12/1"), row("12/2")))
+    [change] = store.update(JOB, results(row("12/1", right="закуп"), row("12/3")))
+    assert change["status"] == CHANGED
+    assert [m["key"] for m in change["modified"]] == ["12/1"]
+    assert [r["Број/дел"] for r in change["added"]] == ["12/3"]
+    assert [r["Број/дел"] for r in change["removed"]] == ["12/2"]
+
+
+def test_holder_change_with_the_same_table(store):
+    store.update(JOB, results(row("12/1"), row("12/2")))
+    [change] = store.update(JOB, results(row("12/1"), row("12/2", holders=["Марија Петровска"])))
+    assert change["status"] == CHANGED
+    assert change["holders_changed"] == ["12/2"]
+    assert change["modified"] == []
+
+
+def test_row_order_does_not_count_as_a_change(store):
+    store.update(JOB, results(row("12/1"), row("12/2")))
+    [change] = store.update(JOB, results(row("12/2"), row("12/1")))
+    assert change["status"] == UNCHANGED
+
+
+def test_gone(store):
+    store.update(JOB, results(row("12/1")))
+    [change] = store.update(JOB, results())
+    assert change["status"] == GONE
+
+
+def test_placeholders_are_reported_but_not_stored(store):
+    [change] = store.update(JOB, results(region_name="(timeout)"))
+    assert change["status"] is None
+    assert store.get("(timeout)", "12") is None
+
+
+def test_known_holders_only_for_identical_rows(store):
+    store.update(JOB, results(row("12/1")))
+    lookup = store.known_holders("ЦЕНТАР - СКОПЈЕ", "12")
+    fresh = {k: v for k, v in row("12/1").items() if k != HOLDERS}
+    assert lookup(fresh) == [{"Име и презиме": "Петар Петровски"}]
+    assert lookup(dict(fresh, Право="закуп")) is None
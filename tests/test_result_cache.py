@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def entry(region_name, parcel, parcels=(), note=None, katastar=None):
+    e = {"region_name": region_name, "parcels": list(parcels), "input_region": "Центар",
+         "input_katastar": katastar, "input_parcel": parcel}
+    if note:
+        e["note"] = note
+    return e
+
+
+ROWS = [{"Број/дел": "12", "Носители на право": [{"Име и презиме": "Петар Петровски"}]}]
+
+
+def test_lookup_rebuilds_what_was_stored(cache):
+    scraped = [entry("ЦЕНТАР - СКОПЈЕ", "12", ROWS), entry("ЦЕНТАР - ЖУПА", "12", note="No parcel suggestions")]
+    cache.put_suggestions("Центар", ["ЦЕНТАР - СКОПЈЕ", "ЦЕНТАР - ЖУПА"])
+    cache.store("12", scraped)
+    assert cache.lookup("Центар", "12") == scraped
+
+
+def test_lookup_filters_by_katastar_region(cache):
+    cache.put_suggestions("Центар", ["ЦЕНТАР - СКОПЈЕ", "ЦЕНТАР - ЖУПА"])
+    cache.store("12", [entry("ЦЕНТАР - СКОПЈЕ", "12", ROWS)])
+    assert cache.lookup("Центар", "12", "скопје") == [entry("ЦЕНТАР - СКОПЈЕ", "12", ROWS, katastar="скопје")]
+    [missing] = cache.lookup("Центар", "12", "Охрид")
+    assert missing["region_name"].startswith("(no match")
+
+
+def test_lookup_misses_unless_every_suggestion_is_cached(cache):
+    assert cache.lookup("Центар", "12") is None
+    cache.put_suggestions("Центар", ["ЦЕНТАР - СКОПЈЕ", "ЦЕНТАР - ЖУПА"])
+    cache.store("12", [entry("ЦЕНТАР - СКОПЈЕ", "12", ROWS)])
+    assert cache.lookup("Центар", "12") is None
+
+
+def test_no_suggestions_is_answered_from_the_cache(cache):
+    cache.put_suggestions("Непостоечко", [])
+    [e] = cache.lookup("Непостоечко", "1")
+    assert e["region_name"] == "(no suggestions)"
+
+
+def test_placeholders_are_not_stored(cache):
+    cache.store("12", [entry("(error)", "12", note="Scrape failed")])
+    assert cache.get_parcel("(error)", "12") is None
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl=0.001)
+    cache.put_suggestions("Центар", ["ЦЕНТАР - СКОПЈЕ"])
+    cache.store("12", [entry("ЦЕНТАР - СКОПЈЕ", "12", ROWS)])
+    time.sleep(0.01)
+    assert cache.lookup("Центар", "12") is None
+    cache.close()
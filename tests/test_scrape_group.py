@@ -0,0 +1,63 @@
+import pytest
+
+import scrape_katastar
+from throttle import PortalTimeoutError
+
+
+class FakeDriver:
+    def execute_script(self, script, *args):
+        return None
+
+    def get(self, url):
+        pass
+
+
+class FakeOption:
+    def __init__(self, text):
+        self.text = text
+
+
+@pytest.fixture
+def portal(monkeypatch):
+    """Patches the page helpers so _scrape_group_with_driver runs without a browser."""
+    state = {"fail_region": None}
+
+    def select_region(driver, wait, region, region_name, index):
+        if region_name == state["fail_region"]:
+            raise PortalTimeoutError(f"'{region_name}' did not load")
+        return True
+
+    monkeypatch.setattr(scrape_katastar, "get_region_suggestions",
+                        lambda driver, wait, region: [FakeOption("A - X"), FakeOption("B - Y")])
+    monkeypatch.setattr(scrape_katastar, "go_home", lambda driver: None)
+    monkeypatch.setattr(scrape_katastar, "select_region", select_region)
+    monkeypatch.setattr(scrape_katastar, "region_still_selected", lambda driver, name: False)
+    monkeypatch.setattr(scrape_katastar, "select_parcel_status", lambda driver, wait, parcel, **kw: "selected")
+    monkeypatch.setattr(scrape_katastar, "extract_parcel_and_holders",
+                        lambda driver, wait, **kw: [{"Број/дел": "1"}])
+    return state
+
+
+def test_all_targets_scraped(portal):
+    results = scrape_katastar._scrape_group_with_driver(FakeDriver(), "r", ["p1", "p2"], None)
+    assert {p: [e["region_name"] for e in entries] for p, entries in results.items()} == {
+        "p1": ["A - X", "B - Y"], "p2": ["A - X", "B - Y"]}
+
+
+def test_timeout_selecting_last_target_completes_nothing(portal):
+    portal["fail_region"] = "B - Y"
+    with pytest.raises(PortalTimeoutError) as info:
+        scrape_katastar._scrape_group_with_driver(FakeDriver(), "r", ["p1", "p2", "p3"], None)
+    # Earlier targets' parcels are not finished: none of them has its "B - Y" entry yet
+    assert info.value.completed == {}
+
+
+def test_timeout_on_last_target_completes_earlier_parcels(portal, monkeypatch):
+    def status(driver, wait, parcel, **kw):
+        return "failed" if parcel == "p3" else "selected"
+
+    monkeypatch.setattr(scrape_katastar, "select_parcel_status", status)
+    with pytest.raises(PortalTimeoutError) as info:
+        scrape_katastar._scrape_group_with_driver(FakeDriver(), "r", ["p1", "p2", "p3"], "Y")
+    assert sorted(info.value.completed) == ["p1", "p2"]
+    assert [e["region_name"] for e in info.value.completed["p1"]] == ["B - Y"]
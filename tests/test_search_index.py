@@ -0,0 +1,62 @@
+import pytest
+
+from search_index import SearchIndex, normalize
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Петровски", "petrovski"),
+    ("PETROVSKI", "petrovski"),
+    ("Ќосе", "kose"),
+    ("Ḱose", "kose"),
+    ("Kjose", "kose"),
+    ("Џамбаз", "dzambaz"),
+    ("Dzhambaz", "dzambaz"),
+    ("Шишков", "siskov"),
+    ("Šiškov", "siskov"),
+    ("Shishkov", "siskov"),
+    ("Љубица Њ", "ljubica nj"),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+def entry(parcel, holders, region_name="ЦЕНТАР - СКОПЈЕ"):
+    return {"region_name": region_name, "input_region": "Центар", "input_katastar": None, "input_parcel": parcel,
+            "parcels": [{"Имотен лист": "55", "Број/дел": parcel, "Место": "Водно",
+                         "Носители на право": [{"Име и презиме": h, "Дел на посед": "1/1"} for h in holders]}]}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "index.sqlite3"))
+    yield index
+    index.close()
+
+
+def test_search_across_scripts(index):
+    index.add([entry("12", ["Петар Петровски"])])
+    for query in ("Петровски", "petrovski", "PETR", "petar petrov"):
+        assert [r["holder_name"] for r in index.search(query)] == ["Петар Петровски"], query
+
+
+def test_filters_and_fields(index):
+    index.add([entry("12", ["Петар Петровски"]), entry("13", ["Марија Водна"], region_name="БУТЕЛ - СКОПЈЕ")])
+    assert [r["parcel_number"] for r in index.search("", municipality="Бутел")] == ["13"]
+    assert [r["parcel_number"] for r in index.search("vodn", field="name")] == ["13"]
+    assert {r["parcel_number"] for r in index.search("vodno", field="place")} == {"12", "13"}
+    with pytest.raises(ValueError):
+        index.search("x", field="nope")
+
+
+def test_rescraping_replaces_a_parcels_rows(index):
+    index.add([entry("12", ["Петар Петровски"])])
+    index.add([entry("12", ["Марија Петровска"])])
+    assert [r["holder_name"] for r in index.search("petrovsk")] == ["Марија Петровска"]
+    assert index.stats() == {"rows": 1, "parcels": 1}
+
+
+def test_placeholders_are_not_indexed(index):
+    index.add([{"region_name": "(timeout)", "input_parcel": "12", "parcels": []}])
+    assert index.stats() == {"rows": 0, "parcels": 0}
@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+
+import throttle
+from throttle import CLOSED, HALF_OPEN, OPEN, AdaptiveScheduler, AimdLimiter, CircuitBreaker, TokenBucket
+
+
+class FakeTime:
+    """Stands in for the time module inside throttle.py: monotonic() only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(throttle, "time", fake)
+    return fake
+
+
+def run_group(scheduler, clock, seconds, parcels=1, portal_work=True, status="ok"):
+    with scheduler.slot(parcels) as outcome:
+        clock.now += seconds
+        if status == "ok":
+            outcome.ok(portal_work)
+        else:
+            outcome.timeout()
+
+
+def test_aimd_increases_after_a_window_of_successes():
+    limiter = AimdLimiter(initial=1, maximum=3)
+    for expected in (2, 2, 3):
+        limiter.acquire()
+        limiter.release(True)
+        assert limiter.limit == expected
+
+
+def test_aimd_halves_once_per_cooldown(clock):
+    limiter = AimdLimiter(initial=4, maximum=4, cooldown=2.0)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(False)
+    assert limiter.limit == 2
+    clock.now += 2.0
+    limiter.acquire()
+    limiter.release(False)
+    assert limiter.limit == 1
+
+
+def test_aimd_acquire_gives_up_when_cancelled():
+    limiter = AimdLimiter(initial=1)
+    assert limiter.acquire()
+    cancel = threading.Event()
+    cancel.set()
+    assert not limiter.acquire(cancel)
+
+
+def test_token_bucket_paces_beyond_the_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=2.0)
+    bucket.acquire(2)
+    assert clock.slept == []
+    bucket.acquire(1)
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_token_bucket_disabled_without_rate(clock):
+    TokenBucket(rate=None).acquire(100)
+    assert clock.slept == []
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    clock.now += 10.0
+    assert breaker.wait()
+    assert breaker.state == HALF_OPEN
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_failed_probe_doubles_the_cool_down(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record(False)
+    clock.now += 10.0
+    assert breaker.wait()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.reset_timeout == 20.0
+
+
+def test_scheduler_grows_on_steady_groups(clock):
+    scheduler = AdaptiveScheduler(max_concurrency=4)
+    for _ in range(6):
+        run_group(scheduler, clock, 0.05)
+    assert scheduler.limiter.limit == 4
+
+
+def test_cache_hits_do_not_make_real_scrapes_look_slow(clock):
+    scheduler = AdaptiveScheduler(max_concurrency=4)
+    for _ in range(20):
+        run_group(scheduler, clock, 0.0012, portal_work=False)
+    for _ in range(8):
+        clock.now += 5.0  # past the limiter's cooldown, so every slow signal would count
+        run_group(scheduler, clock, 0.05)
+    assert scheduler.limiter.limit == 4
+
+
+def test_baseline_follows_the_portal(clock):
+    scheduler = AdaptiveScheduler(max_concurrency=4, latency_window=10)
+    for _ in range(10):
+        run_group(scheduler, clock, 0.01)
+    # The portal gets slower for good: after a window of slow groups they are the new normal
+    for _ in range(10):
+        run_group(scheduler, clock, 0.1)
+    assert scheduler.baseline() == pytest.approx(0.1)
+    assert not scheduler._is_slow(0.1)
+
+
+def test_timeout_halves_the_limit(clock):
+    scheduler = AdaptiveScheduler(max_concurrency=4, initial_concurrency=4)
+    run_group(scheduler, clock, 0.05, status="timeout")
+    assert scheduler.limiter.limit == 2
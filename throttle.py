@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Adaptive admission control for scrape groups, so a batch runs as fast as the
+portal sustains without tripping its limits.
+
+  - AimdLimiter: how many groups may scrape at once. +1 after a full window of
+    healthy groups, halved when a group times out, is throttled or runs much
+    slower than the recent baseline latency (additive increase, multiplicative decrease).
+  - TokenBucket: paces parcels per second with a small burst allowance.
+  - CircuitBreaker: after several failures in a row nothing is admitted for a
+    cool-down, then a single probe decides whether to resume.
+
+AdaptiveScheduler ties the three together:
+
+    scheduler = AdaptiveScheduler(max_concurrency=4, parcels_per_minute=120)
+    with scheduler.slot(parcels=len(group.parcels)) as outcome:
+        ...scrape...
+        outcome.ok()            # or outcome.timeout()
+
+Groups that time out raise PortalTimeoutError; batch.py sends their unfinished
+parcels back through the scheduler instead of reporting them as not found.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from metrics import METRICS
+
+
+class PortalTimeoutError(Exception):
+    """
+    The portal did not answer in time (or throttled us), so nothing can be said
+    about the parcel. `completed` holds {parcel: region_results} for the parcels
+    of the group that did finish before the timeout.
+    """
+
+    def __init__(self, message: str, completed: Optional[Dict[str, List[dict]]] = None):
+        super().__init__(message)
+        self.completed = completed or {}
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst` banked; rate None or 0 disables pacing."""
+
+    def __init__(self, rate: Optional[float] = None, burst: float = 5.0):
+        self.rate = rate or 0.0
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0, cancel: Optional[threading.Event] = None):
+        """Blocks until `tokens` are available (a request bigger than the burst just waits longer)."""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+class AimdLimiter:
+    """
+    Concurrency limit between `minimum` and `maximum`, starting at `initial`.
+    release(ok=True) counts towards +1 (one step per `limit` healthy releases);
+    release(ok=False) halves the limit, at most once per `cooldown` seconds so a
+    burst of failures from the same slowdown only counts once.
+    """
+
+    def __init__(self, initial: int = 1, minimum: int = 1, maximum: int = 4,
+                 decrease: float = 0.5, cooldown: float = 2.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, cancel: Optional[threading.Event] = None) -> bool:
+        """Waits for a free slot; False if `cancel` was set while waiting."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                if cancel is not None and cancel.is_set():
+                    return False
+                self._cond.wait(0.5)
+            self.in_flight += 1
+            return True
+
+    def release(self, ok: bool):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if ok:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            elif now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, int(self.limit * self.decrease))
+                self._successes = 0
+                self._last_decrease = now
+            self._cond.notify_all()
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures; while open, wait() blocks
+    for `reset_timeout` seconds, then lets one probe through (half-open). A
+    successful probe closes it; a failed one opens it again for twice as long
+    (capped at `max_reset_timeout`).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_out = False
+        self._cond = threading.Condition()
+
+    def wait(self, cancel: Optional[threading.Event] = None) -> bool:
+        """Blocks while the breaker is open (or a probe is out); False if cancelled."""
+        with self._cond:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return False
+                if self.state == CLOSED:
+                    return True
+                now = time.monotonic()
+                if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                    self.state = HALF_OPEN
+                    self._probe_out = False
+                if self.state == HALF_OPEN and not self._probe_out:
+                    self._probe_out = True
+                    return True
+                remaining = self._opened_at + self.reset_timeout - now if self.state == OPEN else 0.5
+                self._cond.wait(max(0.05, min(remaining, 1.0)))
+
+    def record(self, ok: bool):
+        with self._cond:
+            if ok:
+                self._failures = 0
+                if self.state != CLOSED:
+                    self.state = CLOSED
+                    self.reset_timeout = self.base_reset_timeout
+            else:
+                self._failures += 1
+                if self.state == HALF_OPEN:
+                    self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                    self._open_locked()
+                elif self.state == CLOSED and self._failures >= self.failure_threshold:
+                    self._open_locked()
+            self._probe_out = False
+            self._cond.notify_all()
+
+    def skip_probe(self):
+        """Gives back a half-open probe that was let through but never ran."""
+        with self._cond:
+            self._probe_out = False
+            self._cond.notify_all()
+
+    def _open_locked(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        METRICS.inc("katastar_circuit_opened_total")
+
+
+class Outcome:
+    """Handed out by AdaptiveScheduler.slot(); the block reports how the group went."""
+
+    def __init__(self):
+        self.status: Optional[str] = None
+        self.portal_work = True
+
+    def ok(self, portal_work: bool = True):
+        """The group finished; portal_work=False if it never reached the portal (its latency says nothing)."""
+        self.status = "ok"
+        self.portal_work = portal_work
+
+    def timeout(self):
+        self.status = "timeout"
+
+
+class AdaptiveScheduler:
+    """
+    Admission control shared by every worker talking to the portal.
+
+    - max_concurrency: ceiling for the AIMD limit (size the worker pool to this).
+    - parcels_per_minute: token bucket rate (None: unpaced, AIMD and the breaker still apply).
+    - slow_factor: a group whose per-parcel latency exceeds slow_factor x the baseline
+      counts as a congestion signal, like a timeout. The baseline is the 10th percentile
+      of the last `latency_window` groups that did portal work, so it follows the portal
+      instead of sticking to the fastest group ever seen; groups answered without
+      touching the portal (cache hits, coalesced results) are not sampled.
+    """
+
+    def __init__(self, max_concurrency: int = 4, initial_concurrency: int = 1,
+                 parcels_per_minute: Optional[float] = None, burst: float = 5.0,
+                 slow_factor: float = 3.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 latency_window: int = 50, min_samples: int = 5):
+        self.limiter = AimdLimiter(initial=initial_concurrency, maximum=max_concurrency)
+        self.bucket = TokenBucket(parcels_per_minute / 60.0 if parcels_per_minute else None, burst)
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.slow_factor = slow_factor
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.limiter.maximum
+
+    def baseline(self) -> Optional[float]:
+        """Per-parcel latency a healthy group is compared with, or None until `min_samples` groups ran."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            samples = sorted(self._latencies)
+        return samples[len(samples) // 10]
+
+    def _is_slow(self, per_parcel: float) -> bool:
+        baseline = self.baseline()
+        with self._lock:
+            self._latencies.append(per_parcel)
+        return baseline is not None and per_parcel > baseline * self.slow_factor
+
+    @contextmanager
+    def slot(self, parcels: int = 1, cancel: Optional[threading.Event] = None):
+        """
+        Admits one group: waits for the breaker, paces `parcels` tokens, then waits
+        for a concurrency slot. Yields an Outcome, or None if `cancel` was set while
+        waiting (the caller should then skip the group). An exception escaping the
+        block counts as a failure.
+        """
+        if not self.breaker.wait(cancel):
+            yield None
+            return
+        self.bucket.acquire(parcels, cancel)
+        if not self.limiter.acquire(cancel):
+            self.breaker.skip_probe()
+            yield None
+            return
+        outcome = Outcome()
+        started = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            healthy = outcome.status == "ok" and not (
+                outcome.portal_work and self._is_slow((time.monotonic() - started) / max(1, parcels)))
+            self.limiter.release(healthy)
+            self.breaker.record(outcome.status == "ok")
+            METRICS.set("katastar_concurrency_limit", self.limiter.limit)
+            if outcome.status == "timeout":
+                METRICS.inc("katastar_throttle_events_total", signal="timeout")
+            elif outcome.status == "ok" and not healthy:
+                METRICS.inc("katastar_throttle_events_total", signal="slow")
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Shared job queue, so worker processes on any number of machines can drain one batch.
+
+A coordinator enqueues a batch (one task per input line, numbered in input order);
+workers claim tasks under a lease, keep the lease alive with heartbeats while they
+scrape, and write each task's region_results back. A worker that dies simply
+stops heartbeating: once its lease runs out the tasks are claimable again. The
+coordinator reads finished tasks back in input order to write the output file.
+
+Two stores share one implementation:
+  - SQLite (a file path): for one host, or a few sharing a network drive. Claims
+    run in BEGIN IMMEDIATE transactions so two workers never take the same task.
+  - Postgres (a postgresql:// URL, needs psycopg or psycopg2): for real clusters.
+    Claims use SELECT ... FOR UPDATE SKIP LOCKED.
+
+    queue = open_queue("katastar_queue.sqlite3")
+    batch_id = queue.create_batch(jobs)
+    tasks = queue.claim("worker-1", limit=25)          # on each worker
+    queue.complete("worker-1", tasks[0], region_results)
+    for job, region_results in queue.wait_results(batch_id):   # on the coordinator
+        ...
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+Job = Tuple[str, Optional[str], str]
+
+DEFAULT_QUEUE_PATH = "katastar_queue.sqlite3"
+DEFAULT_LEASE_SECONDS = 120.0
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS batches (
+        id          TEXT PRIMARY KEY,
+        created_at  DOUBLE PRECISION NOT NULL,
+        total       INTEGER NOT NULL,
+        cancelled   INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS tasks (
+        batch_id     TEXT NOT NULL,
+        seq          INTEGER NOT NULL,
+        region       TEXT NOT NULL,
+        katastar     TEXT NOT NULL,
+        parcel       TEXT NOT NULL,
+        status       TEXT NOT NULL DEFAULT 'pending',
+        worker       TEXT,
+        lease_until  DOUBLE PRECISION NOT NULL DEFAULT 0,
+        attempts     INTEGER NOT NULL DEFAULT 0,
+        results      TEXT,
+        enqueued_at  DOUBLE PRECISION NOT NULL,
+        finished_at  DOUBLE PRECISION,
+        PRIMARY KEY (batch_id, seq)
+    )""",
+    "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, enqueued_at, seq)",
+]
+
+# Claimable: pending, or leased by a worker that stopped heartbeating
+_CLAIMABLE = ("(status = 'pending' OR (status = 'leased' AND lease_until < ?))"
+              " AND batch_id NOT IN (SELECT id FROM batches WHERE cancelled = 1)")
+
+
+class Task:
+    """One claimed input line: batch, position in the batch, the job and how often it was tried."""
+
+    __slots__ = ("batch_id", "seq", "job", "attempts")
+
+    def __init__(self, batch_id: str, seq: int, job: Job, attempts: int):
+        self.batch_id = batch_id
+        self.seq = seq
+        self.job = job
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Task({self.batch_id}#{self.seq} {self.job}, attempts={self.attempts})"
+
+
+class WorkQueue:
+    """
+    Batches and their tasks in SQLite: claim() leases pending or lease-expired tasks of
+    one region (oldest batch first), heartbeats extend a worker's leases and complete()
+    stores a task's region_results. PostgresWorkQueue only swaps the connection and the SQL dialect.
+    """
+
+    placeholder = "?"
+    lock_clause = ""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._lock:
+            for statement in _SCHEMA:
+                self._execute(statement)
+            self._commit()
+
+    # -----------------------------
+    # Dialect
+    # -----------------------------
+    def _connect(self):
+        # Autocommit mode so _begin() decides when the write lock is taken
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _begin(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def _commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def _rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def _execute(self, sql: str, params: tuple = ()):
+        cursor = self._conn.cursor()
+        cursor.execute(sql.replace("?", self.placeholder), params)
+        return cursor
+
+    def _executemany(self, sql: str, rows: list):
+        cursor = self._conn.cursor()
+        cursor.executemany(sql.replace("?", self.placeholder), rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -----------------------------
+    # Coordinator side
+    # -----------------------------
+    def create_batch(self, jobs: Iterable[Job], batch_id: Optional[str] = None, chunk: int = 1000) -> str:
+        """Enqueues `jobs` (any iterable, read `chunk` at a time) as a new batch; returns its id."""
+        batch_id = batch_id or uuid.uuid4().hex
+        now = time.time()
+        source = iter(jobs)
+        total = 0
+        with self._lock:
+            try:
+                self._begin()
+                self._execute("INSERT INTO batches (id, created_at, total) VALUES (?, ?, 0)", (batch_id, now))
+                while True:
+                    rows = [(batch_id, total + i, region, katastar_region or "", parcel, now)
+                            for i, (region, katastar_region, parcel) in enumerate(islice(source, chunk))]
+                    if not rows:
+                        break
+                    self._executemany("INSERT INTO tasks (batch_id, seq, region, katastar, parcel, enqueued_at)"
+                                      " VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    total += len(rows)
+                self._execute("UPDATE batches SET total = ? WHERE id = ?", (total, batch_id))
+                self._commit()
+            except BaseException:
+                self._rollback()
+                raise
+        return batch_id
+
+    def progress(self, batch_id: str) -> Optional[dict]:
+        """{"total", "pending", "leased", "done", "cancelled", "created_at"}, or None for an unknown batch."""
+        with self._lock:
+            batch = self._execute("SELECT total, cancelled, created_at FROM batches WHERE id = ?",
+                                  (batch_id,)).fetchone()
+            if batch is None:
+                self._commit()
+                return None
+            counts = dict(self._execute("SELECT status, COUNT(*) FROM tasks WHERE batch_id = ? GROUP BY status",
+                                        (batch_id,)).fetchall())
+            self._commit()
+        return {"total": batch[0], "pending": counts.get(PENDING, 0), "leased": counts.get(LEASED, 0),
+                "done": counts.get(DONE, 0), "cancelled": bool(batch[1]), "created_at": batch[2]}
+
+    def cancel(self, batch_id: str):
+        """Stops handing out the batch's tasks; tasks already leased finish normally."""
+        with self._lock:
+            self._execute("UPDATE batches SET cancelled = 1 WHERE id = ?", (batch_id,))
+            self._commit()
+
+    def tasks(self, batch_id: str, since: int = 0, limit: int = 1000) -> List[dict]:
+        """Tasks from position `since` on: {"seq", "job", "status", "worker", "attempts", "results"}."""
+        with self._lock:
+            rows = self._execute(
+                "SELECT seq, region, katastar, parcel, status, worker, attempts, results FROM tasks"
+                " WHERE batch_id = ? AND seq >= ? ORDER BY seq LIMIT ?", (batch_id, since, limit)).fetchall()
+            self._commit()
+        return [{"seq": seq, "job": (region, katastar or None, parcel), "status": status, "worker": worker,
+                 "attempts": attempts, "results": json.loads(results) if results is not None else None}
+                for seq, region, katastar, parcel, status, worker, attempts, results in rows]
+
+    def wait_results(self, batch_id: str, poll: float = 1.0, page: int = 500,
+                     cancel: Optional[threading.Event] = None) -> Iterator[Tuple[Job, List[dict]]]:
+        """
+        Yields (job, region_results) in input order, waiting (polling every `poll`
+        seconds) for tasks the workers have not finished yet. Ends when the batch is
+        complete, or early if `cancel` is set or the batch was cancelled.
+        """
+        next_seq = 0
+        while True:
+            progress = self.progress(batch_id)
+            if progress is None:
+                raise KeyError(f"Unknown batch '{batch_id}'")
+            if next_seq >= progress["total"]:
+                return
+            waiting = True
+            for task in self.tasks(batch_id, since=next_seq, limit=page):
+                if task["status"] != DONE:
+                    break
+                yield task["job"], task["results"]
+                next_seq += 1
+                waiting = False
+            if waiting:
+                if progress["cancelled"] and progress["leased"] == 0:
+                    return
+                if cancel is None:
+                    time.sleep(poll)
+                elif cancel.wait(poll):
+                    return
+
+    # -----------------------------
+    # Worker side
+    # -----------------------------
+    def claim(self, worker: str, limit: int = 25, lease_seconds: Optional[float] = None) -> List[Task]:
+        """
+        Leases up to `limit` claimable tasks to `worker`, all of the same
+        (region, katastar_region) and batch so they scrape as one group (oldest batch first).
+        """
+        now = time.time()
+        lease_until = now + (lease_seconds or self.lease_seconds)
+        with self._lock:
+            try:
+                self._begin()
+                first = self._execute(
+                    f"SELECT batch_id, region, katastar FROM tasks WHERE {_CLAIMABLE}"
+                    f" ORDER BY enqueued_at, seq LIMIT 1{self.lock_clause}", (now,)).fetchone()
+                if first is None:
+                    self._commit()
+                    return []
+                batch_id, region, katastar = first
+                rows = self._execute(
+                    f"SELECT seq, parcel, attempts FROM tasks WHERE batch_id = ? AND region = ? AND katastar = ?"
+                    f" AND {_CLAIMABLE} ORDER BY seq LIMIT ?{self.lock_clause}",
+                    (batch_id, region, katastar, now, limit)).fetchall()
+                self._executemany(
+                    "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1"
+                    " WHERE batch_id = ? AND seq = ?",
+                    [(worker, lease_until, batch_id, seq) for seq, _, _ in rows])
+                self._commit()
+            except BaseException:
+                self._rollback()
+                raise
+        return [Task(batch_id, seq, (region, katastar or None, parcel), attempts + 1)
+                for seq, parcel, attempts in rows]
+
+    def heartbeat(self, worker: str, lease_seconds: Optional[float] = None) -> int:
+        """Extends every lease `worker` holds; returns how many."""
+        with self._lock:
+            cursor = self._execute(
+                "UPDATE tasks SET lease_until = ? WHERE worker = ? AND status = 'leased'",
+                (time.time() + (lease_seconds or self.lease_seconds), worker))
+            self._commit()
+            return cursor.rowcount
+
+    def complete(self, worker: str, task: Task, region_results: List[dict]) -> bool:
+        """
+        Stores a task's results. The first result wins: if the lease had expired and
+        another worker already finished the task, this one is dropped (returns False).
+        """
+        payload = json.dumps(region_results, ensure_ascii=False)
+        with self._lock:
+            cursor = self._execute(
+                "UPDATE tasks SET status = 'done', worker = ?, results = ?, finished_at = ?"
+                " WHERE batch_id = ? AND seq = ? AND status <> 'done'",
+                (worker, payload, time.time(), task.batch_id, task.seq))
+            self._commit()
+            return cursor.rowcount == 1
+
+    def release(self, worker: str, task: Task):
+        """Hands a leased task back (e.g. the portal timed out) so any worker can try it again."""
+        with self._lock:
+            self._execute(
+                "UPDATE tasks SET status = 'pending', worker = NULL, lease_until = 0"
+                " WHERE batch_id = ? AND seq = ? AND status = 'leased' AND worker = ?",
+                (task.batch_id, task.seq, worker))
+            self._commit()
+
+
+class PostgresWorkQueue(WorkQueue):
+    """The same queue on Postgres; concurrent claims skip each other's locked rows."""
+
+    placeholder = "%s"
+    lock_clause = " FOR UPDATE SKIP LOCKED"
+
+    def _connect(self):
+        try:
+            import psycopg
+            conn = psycopg.connect(self.path)
+        except ImportError:
+            try:
+                import psycopg2
+            except ImportError:
+                raise RuntimeError("A postgresql:// queue needs psycopg (pip install psycopg)") from None
+            conn = psycopg2.connect(self.path)
+        return conn
+
+    def _begin(self):
+        pass  # the driver opens a transaction on the first statement
+
+    def _commit(self):
+        self._conn.commit()
+
+    def _rollback(self):
+        self._conn.rollback()
+
+
+def open_queue(target: str = DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> WorkQueue:
+    """A PostgresWorkQueue for postgres:// or postgresql:// URLs, else a SQLite queue at the path."""
+    if target.startswith(("postgres://", "postgresql://")):
+        return PostgresWorkQueue(target, lease_seconds=lease_seconds)
+    return WorkQueue(target, lease_seconds=lease_seconds)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Queue worker: claims jobs from a shared work_queue, scrapes them and posts the
+results back. Run as many as you like, on as many machines as can reach the queue:
+
+    python scrape_katastar.py -i jobs.txt --queue postgresql://host/katastar   # coordinator
+    python worker.py --queue postgresql://host/katastar --workers 3            # on every node
+
+Every worker thread claims one region group at a time (up to --group-size jobs of
+the same region), scrapes it with the usual backend options and completes each job
+as it finishes. A heartbeat thread keeps the leases alive; if the process dies,
+its jobs become claimable again once the lease (--lease seconds) runs out.
+Jobs that still time out after the in-process requeues go back on the shared
+queue until they have been tried --max-attempts times.
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+from typing import List
+
+from work_queue import DEFAULT_LEASE_SECONDS, Task, WorkQueue, open_queue
+
+
+def run_worker(queue: WorkQueue, backend, worker_id: str, threads: int = 1, group_size: int = 25,
+               scheduler=None, max_requeues: int = 3, max_attempts: int = 3, poll: float = 5.0,
+               exit_when_idle: bool = False, stop: threading.Event = None) -> int:
+    """
+    Drains `queue` with `threads` claim-scrape-complete loops sharing `backend`.
+    Returns the number of jobs completed. Stops when `stop` is set, or, with
+    exit_when_idle, as soon as nothing is left to claim.
+    """
+    from batch import job_outcome, run_jobs
+
+    stop = stop or threading.Event()
+    completed = [0]
+    lock = threading.Lock()
+
+    def heartbeat():
+        while not stop.wait(queue.lease_seconds / 3):
+            queue.heartbeat(worker_id)
+
+    def loop():
+        while not stop.is_set():
+            tasks: List[Task] = queue.claim(worker_id, limit=group_size)
+            if not tasks:
+                if exit_when_idle:
+                    return
+                stop.wait(poll)
+                continue
+
+            handled = set()
+
+            def on_result(index, job, region_results):
+                task = tasks[index]
+                handled.add(index)
+                if job_outcome(region_results) == "timeout" and task.attempts < max_attempts:
+                    queue.release(worker_id, task)  # let another node (or a calmer moment) try it
+                    return
+                if queue.complete(worker_id, task, region_results):
+                    with lock:
+                        completed[0] += 1
+
+            try:
+                run_jobs([task.job for task in tasks], workers=1, backend=backend, on_result=on_result,
+                         max_parcels_per_group=group_size, cancel=stop, scheduler=scheduler,
+                         max_requeues=max_requeues)
+            finally:
+                # Stopped before they ran, or the backend turned out to be misconfigured (BackendConfigError)
+                for index, task in enumerate(tasks):
+                    if index not in handled:
+                        queue.release(worker_id, task)
+
+    beat = threading.Thread(target=heartbeat, name="katastar-heartbeat", daemon=True)
+    beat.start()
+    workers = [threading.Thread(target=loop, name=f"katastar-worker-{i}") for i in range(max(1, threads))]
+    for thread in workers:
+        thread.start()
+    try:
+        for thread in workers:
+            while thread.is_alive():
+                thread.join(0.5)
+    finally:
+        # On Ctrl-C: no new claims; groups in progress finish and hand back what never started
+        stop.set()
+        for thread in workers:
+            thread.join()
+    return completed[0]
+
+
+if __name__ == "__main__":
+    from scrape_katastar import add_scrape_arguments, build_backend, build_scheduler
+    from driver_pool import close_default_pool
+    import metrics
+
+    parser = argparse.ArgumentParser(description="Scrape jobs from a shared queue filled by scrape_katastar.py --queue")
+    parser.add_argument("--queue", required=True, help="SQLite path or postgresql:// URL of the shared queue")
+    add_scrape_arguments(parser)
+    parser.add_argument("--group-size", type=int, default=25,
+                        help="Jobs of one region claimed and scraped together (default: 25)")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f"Seconds a claim stays valid without a heartbeat (default: {DEFAULT_LEASE_SECONDS:g})")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="Times a job may time out on workers before its timeout is reported (default: 3)")
+    parser.add_argument("--poll", type=float, default=5.0, help="Seconds to wait when the queue is empty (default: 5)")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Exit once there is nothing left to claim")
+    parser.add_argument("--worker-id", default=None, help="Name in the queue (default: <hostname>-<pid>)")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.metrics_log:
+        metrics.log_to(args.metrics_log)
+
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = open_queue(args.queue, lease_seconds=args.lease)
+    backend = build_backend(args)
+    print(f"Worker {worker_id} draining {args.queue} with {args.workers} browser(s)/thread(s).")
+    done = 0
+    try:
+        done = run_worker(queue, backend, worker_id, threads=args.workers, group_size=args.group_size,
+                          scheduler=build_scheduler(args), max_requeues=args.max_requeues,
+                          max_attempts=args.max_attempts, poll=args.poll, exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        print("Stopping after the groups in progress; jobs not started go back on the queue.")
+        sys.exit(130)
+    finally:
+        backend.close()
+        close_default_pool()
+        queue.close()
+        if args.profile:
+            print(metrics.format_summary())
+    print(f"Worker {worker_id} finished {done} job(s).")